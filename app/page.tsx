@@ -2,7 +2,7 @@
 
 import type React from "react"
 
-import { useState } from "react"
+import { useEffect, useState } from "react"
 import { Tabs, TabsContent, TabsList, TabsTrigger } from "@/components/ui/tabs"
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card"
 import { Button } from "@/components/ui/button"
@@ -18,12 +18,28 @@ import { BuyerIntentDiscovery } from "@/components/buyer-intent-discovery"
 import { AdvocateIdentification } from "@/components/advocate-identification"
 import { Progress } from "@/components/ui/progress"
 
+const BACKEND_URL = "http://localhost:5000"
+const RECOMMENDATIONS_POLL_MS = 2000
+
+// Response section shown by each tab. Only the first tab's section comes with the analysis;
+// the others are fetched from the stored dataset when their tab is first opened.
+const TAB_SECTIONS: Record<string, string> = {
+  engagement: "engagement_metrics",
+  "buyer-intent": "buyer_intent_discovery",
+  advocates: "advocate_identification",
+  publishing: "publishing_recommendations",
+  diagnostics: "diagnostic_metrics",
+  sentiment: "sentiment_analysis",
+  virality: "virality_score",
+}
+
 export default function Dashboard() {
   const [uploadedFile, setUploadedFile] = useState<File | null>(null)
   const [isAnalyzing, setIsAnalyzing] = useState(false)
   const [dataLoaded, setDataLoaded] = useState(false)
   const [socialMediaData, setSocialMediaData] = useState<any>(null)
   const [progress, setProgress] = useState(0) // Add this line
+  const [progressStage, setProgressStage] = useState<string | null>(null)
 
   const handleFileUpload = (event: React.ChangeEvent<HTMLInputElement>) => {
     const file = event.target.files?.[0]
@@ -37,28 +53,27 @@ export default function Dashboard() {
 
     setIsAnalyzing(true)
     setProgress(0) // Reset progress at the start
-
-    let currentProgress = 0
-    const interval = setInterval(() => {
-      currentProgress += 5 // Increment progress
-      if (currentProgress <= 90) {
-        // Stop at 90% to indicate it's still processing
-        setProgress(currentProgress)
-      } else {
-        clearInterval(interval)
-      }
-    }, 100) // Update every 100ms
+    setProgressStage(null)
 
     try {
-      const fileContent = await uploadedFile.text()
-      const response = await fetch("http://localhost:5000/analyze", {
+      // Send the file as the raw request body so the browser streams it from disk
+      // instead of reading it into a string and wrapping it in JSON.
+      const submitResponse = await fetch(`${BACKEND_URL}/jobs?sections=${TAB_SECTIONS.engagement}`, {
         method: "POST",
         headers: {
-          "Content-Type": "application/json",
+          "Content-Type": uploadedFile.name.endsWith(".gz") ? "application/gzip" : "text/csv",
         },
-        body: JSON.stringify({ csv_data: fileContent }),
+        body: uploadedFile,
       })
 
+      if (!submitResponse.ok) {
+        throw new Error(`HTTP error! status: ${submitResponse.status}`)
+      }
+
+      const job = await submitResponse.json()
+      await waitForJob(job.events_url)
+
+      const response = await fetch(`${BACKEND_URL}${job.result_url}`)
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`)
       }
@@ -74,11 +89,88 @@ export default function Dashboard() {
       )
       setProgress(0) // Reset on error
     } finally {
-      clearInterval(interval) // Clear interval regardless of success or failure
       setIsAnalyzing(false)
     }
   }
 
+  // Recommendations start as the mock ones; swap in the LLM's once its background generation finishes
+  const recommendations = socialMediaData?.publishing_recommendations
+  useEffect(() => {
+    if (recommendations?.ai_recommendations_status !== "pending") return
+
+    let cancelled = false
+    const poll = async () => {
+      while (!cancelled) {
+        const response = await fetch(`${BACKEND_URL}/recommendations/${recommendations.ai_recommendations_id}`)
+        if (response.status === 200) {
+          const generated = await response.json()
+          if (!cancelled) {
+            setSocialMediaData((data: any) => ({
+              ...data,
+              publishing_recommendations: {
+                ...data.publishing_recommendations,
+                ai_recommendations: generated.recommendations,
+                ai_recommendations_status: generated.status,
+              },
+            }))
+          }
+          return
+        }
+        if (response.status !== 202) return // Unknown or evicted: keep the mock recommendations
+        await new Promise((resolve) => setTimeout(resolve, RECOMMENDATIONS_POLL_MS))
+      }
+    }
+    poll().catch((error) => console.error("Error loading recommendations:", error))
+    return () => {
+      cancelled = true
+    }
+  }, [recommendations?.ai_recommendations_id, recommendations?.ai_recommendations_status])
+
+  // Fetches a tab's section on first open. Without a stored dataset the analysis holds every section.
+  const handleTabChange = async (tab: string) => {
+    const section = TAB_SECTIONS[tab]
+    if (!socialMediaData?.dataset_id || socialMediaData[section] !== undefined) return
+
+    try {
+      const response = await fetch(`${BACKEND_URL}/datasets/${socialMediaData.dataset_id}/sections/${section}`)
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`)
+      }
+      const sectionData = await response.json()
+      setSocialMediaData((data: any) => ({ ...data, [section]: sectionData[section] }))
+    } catch (error) {
+      console.error(`Error loading ${section}:`, error)
+    }
+  }
+
+  // Shows a tab's component once its section has loaded
+  const renderSection = (tab: string, render: (data: any) => React.ReactNode) => {
+    const data = socialMediaData[TAB_SECTIONS[tab]]
+    return data === undefined ? <p className="text-sm text-muted-foreground text-center py-12">Loading...</p> : render(data)
+  }
+
+  // Follows the job's Server-Sent Events, mirroring its stage and progress, until it finishes
+  const waitForJob = (eventsUrl: string) =>
+    new Promise<void>((resolve, reject) => {
+      const events = new EventSource(`${BACKEND_URL}${eventsUrl}`)
+      events.onmessage = (event) => {
+        const status = JSON.parse(event.data)
+        setProgress(Math.floor(status.progress))
+        setProgressStage(status.stage)
+        if (status.status === "done") {
+          events.close()
+          resolve()
+        } else if (status.status === "failed") {
+          events.close()
+          reject(new Error(status.error))
+        }
+      }
+      events.onerror = () => {
+        events.close()
+        reject(new Error("Lost connection to the analysis job"))
+      }
+    })
+
   return (
     <div className="min-h-screen bg-background">
       <div className="container mx-auto p-6">
@@ -108,7 +200,7 @@ export default function Dashboard() {
             <CardContent className="space-y-4">
               <div className="grid w-full max-w-sm items-center gap-1.5">
                 <Label htmlFor="file">Data File</Label>
-                <Input id="file" type="file" accept=".csv" onChange={handleFileUpload} />
+                <Input id="file" type="file" accept=".csv,.gz" onChange={handleFileUpload} />
               </div>
               {uploadedFile && (
                 <div className="flex items-center gap-2 text-sm text-muted-foreground">
@@ -122,14 +214,16 @@ export default function Dashboard() {
                 <div className="w-full">
                   <Progress value={progress} className="h-2" />
                   <p className="text-xs text-muted-foreground mt-1 text-center">
-                    {progress < 100 ? `Processing data... ${progress}%` : "Analysis complete!"}
+                    {progress < 100
+                      ? `Processing data${progressStage ? ` (${progressStage.replace("_", " ")})` : ""}... ${progress}%`
+                      : "Analysis complete!"}
                   </p>
                 </div>
               )}
             </CardContent>
           </Card>
         ) : (
-          <Tabs defaultValue="engagement" className="space-y-6">
+          <Tabs defaultValue="engagement" onValueChange={handleTabChange} className="space-y-6">
             <TabsList className="grid w-full grid-cols-3 lg:grid-cols-7">
               <TabsTrigger value="engagement" className="flex items-center gap-2">
                 <BarChart3 className="h-4 w-4" />
@@ -162,31 +256,31 @@ export default function Dashboard() {
             </TabsList>
 
             <TabsContent value="engagement">
-              <EngagementMetrics data={socialMediaData.engagement_metrics} />
+              {renderSection("engagement", (data) => <EngagementMetrics data={data} />)}
             </TabsContent>
 
             <TabsContent value="buyer-intent">
-              <BuyerIntentDiscovery data={socialMediaData.buyer_intent_discovery} />
+              {renderSection("buyer-intent", (data) => <BuyerIntentDiscovery data={data} />)}
             </TabsContent>
 
             <TabsContent value="advocates">
-              <AdvocateIdentification data={socialMediaData.advocate_identification} />
+              {renderSection("advocates", (data) => <AdvocateIdentification data={data} />)}
             </TabsContent>
 
             <TabsContent value="publishing">
-              <PublishingRecommendations data={socialMediaData.publishing_recommendations} />
+              {renderSection("publishing", (data) => <PublishingRecommendations data={data} />)}
             </TabsContent>
 
             <TabsContent value="diagnostics">
-              <DiagnosticMetrics data={socialMediaData.diagnostic_metrics} />
+              {renderSection("diagnostics", (data) => <DiagnosticMetrics data={data} />)}
             </TabsContent>
 
             <TabsContent value="sentiment">
-              <SentimentAnalysis data={socialMediaData.sentiment_analysis} />
+              {renderSection("sentiment", (data) => <SentimentAnalysis data={data} />)}
             </TabsContent>
 
             <TabsContent value="virality">
-              <ViralityScore data={socialMediaData.virality_score} />
+              {renderSection("virality", (data) => <ViralityScore data={data} />)}
             </TabsContent>
           </Tabs>
         )}
@@ -82,7 +82,7 @@ export function AdvocateIdentification({ data }: AdvocateIdentificationProps) {
               <CardContent>
                 <div className="text-2xl font-bold">{metric.value}</div>
                 <p className="text-xs text-muted-foreground">
-                  <span className="text-green-500">{metric.change}</span> from last month (simulated)
+                  <span className="text-green-500">{metric.change}</span>
                 </p>
               </CardContent>
             </Card>
@@ -142,15 +142,15 @@ export function AdvocateIdentification({ data }: AdvocateIdentificationProps) {
                     <div className="grid grid-cols-3 gap-4 text-sm">
                       <div className="text-center">
                         <div className="font-bold text-blue-600">{advocate.ugcCount}</div>
-                        <div className="text-muted-foreground">UGCs</div>
+                        <div className="text-muted-foreground">Comments</div>
                       </div>
                       <div className="text-center">
                         <div className="font-bold text-green-600">{advocate.engagement.toLocaleString()}</div>
-                        <div className="text-muted-foreground">Engagement</div>
+                        <div className="text-muted-foreground">Active Days</div>
                       </div>
                       <div className="text-center">
                         <div className="font-bold text-purple-600">{advocate.influence.toLocaleString()}</div>
-                        <div className="text-muted-foreground">Influence</div>
+                        <div className="text-muted-foreground">Buyer Intent</div>
                       </div>
                     </div>
 
@@ -38,6 +38,9 @@ interface DiagnosticMetricsProps {
       description: string
       action: string
       icon: string
+      z_score?: number
+      start?: string
+      end?: string | null
     }[]
     audience_insights: { metric: string; percentage: number; change: string }[]
   }
@@ -32,6 +32,15 @@ interface SentimentAnalysisProps {
       neutral_pct: number
     }[]
     keyword_performance: { keyword: string; mentions: number }[]
+    topics?: {
+      topic: string
+      terms: string[]
+      comments: number
+      share: number
+      positive: number
+      neutral: number
+      negative: number
+    }[]
     top_mentions: { text: string; sentiment: string; engagement: number; platform: string }[]
     feature_sentiment: { feature: string; positive: number; negative: number; neutral: number }[]
     customer_feedback_categories: { category: string; positive: number; negative: number; neutral: number }[]
@@ -53,6 +62,7 @@ export function SentimentAnalysis({ data }: SentimentAnalysisProps) {
     sentiment_trends,
     advocacy_keywords,
     keyword_performance,
+    topics = [],
     top_mentions,
     feature_sentiment,
     customer_feedback_categories,
@@ -296,6 +306,35 @@ export function SentimentAnalysis({ data }: SentimentAnalysisProps) {
         </CardContent>
       </Card>
 
+      {topics.length > 0 && (
+        <Card>
+          <CardHeader>
+            <CardTitle>Discussion Topics</CardTitle>
+            <CardDescription>Themes the comments cluster into, with their volume and sentiment</CardDescription>
+          </CardHeader>
+          <CardContent>
+            <div className="space-y-4">
+              {topics.map((topic, index) => (
+                <div key={index} className="p-4 border rounded-lg space-y-2">
+                  <div className="flex items-center justify-between">
+                    <p className="text-sm font-medium">{topic.topic}</p>
+                    <Badge variant="outline">
+                      {topic.comments.toLocaleString()} comments ({topic.share}%)
+                    </Badge>
+                  </div>
+                  <p className="text-xs text-muted-foreground">{topic.terms.join(", ")}</p>
+                  <div className="flex items-center justify-between text-xs text-muted-foreground">
+                    <span>Positive: {topic.positive}%</span>
+                    <span>Negative: {topic.negative}%</span>
+                    <span>Neutral: {topic.neutral}%</span>
+                  </div>
+                </div>
+              ))}
+            </div>
+          </CardContent>
+        </Card>
+      )}
+
       <Card>
         <CardHeader>
           <CardTitle>Customer Feedback Categories</CardTitle>
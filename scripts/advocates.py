@@ -0,0 +1,123 @@
+"""
+Advocate ranking over the author rollup of AnalysisAggregates.
+
+Each author gets an advocacy score from 0 to 100, computed for all authors at once from
+their rollup row: how much they comment (log-scaled, full marks at ADVOCATE_FULL_COMMENTS),
+how positive their comments are, and on how many days they were active (full marks at
+ADVOCATE_FULL_DAYS). The score only depends on the author's own row, so it doesn't change
+when other authors are added. Tier counts are threshold counts and the top advocates come
+from a partial sort (np.partition), so neither sorts every author. One author's history is
+a hash lookup into the rollup plus a binary search into their per-day comment counts.
+"""
+import numpy as np
+import pandas as pd
+
+from rollups import day_string, period_start
+
+ADVOCATE_FULL_COMMENTS = 20 # Comments that earn the full activity component
+ADVOCATE_FULL_DAYS = 7 # Active days that earn the full consistency component
+SCORE_WEIGHTS = {"activity": 0.4, "positivity": 0.35, "consistency": 0.25}
+TIERS = [("Champion", 80, "#FFD700"), ("Advocate", 60, "#C0C0C0"), ("Supporter", 40, "#CD7F32")] # Minimum score per tier, best first
+LOYALTY_POINTS_PER_COMMENT = 50 # As in the loyalty program's points distribution
+
+class AdvocateIndex:
+  def __init__(self, authors, author_days, intent_scores):
+    """authors and author_days are the author rollup of AnalysisAggregates; intent_scores maps intent masks to scores."""
+    self.authors = authors
+    comments = authors['comments'].to_numpy(dtype=np.int64)
+    labeled = authors[['positive', 'neutral', 'negative']].to_numpy(dtype=np.int64)
+    total_labeled = labeled.sum(axis=1)
+    self.components = {
+        "activity": np.minimum(1.0, np.log1p(comments) / np.log1p(ADVOCATE_FULL_COMMENTS)),
+        # Share of positive comments, neutral ones counting half; unlabeled authors sit in the middle
+        "positivity": np.divide(labeled[:, 0] + 0.5 * labeled[:, 1], total_labeled, out=np.full(len(comments), 0.5), where=total_labeled > 0),
+        "consistency": np.minimum(1.0, authors['active_days'].to_numpy(dtype=np.int64) / ADVOCATE_FULL_DAYS),
+    }
+    self.scores = np.rint(100 * sum(weight * self.components[name] for name, weight in SCORE_WEIGHTS.items())).astype(np.int64)
+    self.intent = intent_scores(authors['intent_mask'].to_numpy(dtype=np.int64))
+
+    self.author_days = author_days
+    self._history = None # author_days sorted by author, built on the first lookup
+
+  def __len__(self):
+    return len(self.authors)
+
+  def top(self, k=5):
+    """Returns the positions of the k best authors: by score, then comments, then first appearance."""
+    if len(self) == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64)
+    key = self.scores * (1 << 32) + np.minimum(self.authors['comments'].to_numpy(dtype=np.int64), (1 << 32) - 1)
+    k = min(k, len(key))
+    kth = -np.partition(-key, k - 1)[k - 1] # The k-th largest key
+    above = np.flatnonzero(key > kth)
+    tied = np.flatnonzero(key == kth)[:k - len(above)] # Ties at the boundary go to the first authors, like ties above it
+    candidates = np.concatenate([above, tied])
+    return candidates[np.lexsort((candidates, -key[candidates]))]
+
+  def tiers(self):
+    """Returns [(tier, authors, color)] for TIERS; each author counts in the best tier their score reaches."""
+    counts = []
+    upper = None
+    for tier, threshold, color in TIERS:
+        in_tier = self.scores >= threshold
+        if upper is not None:
+            in_tier &= self.scores < upper
+        counts.append((tier, int(np.count_nonzero(in_tier)), color))
+        upper = threshold
+    return counts
+
+  def tier(self, score):
+    return next((tier for tier, threshold, _ in TIERS if score >= threshold), None)
+
+  def history(self, author):
+    """Returns [(day, comments)] of the days the author was active, in day order."""
+    if self._history is None:
+        # One sort of the per-day rows, so each author's days are a contiguous slice found by binary search
+        authors = self.author_days['author'].to_numpy(dtype=object)
+        days = self.author_days['day'].to_numpy(dtype=np.int64)
+        order = np.lexsort((days, authors))
+        self._history = (authors[order], days[order], self.author_days['comments'].to_numpy(dtype=np.int64)[order])
+    authors, days, comments = self._history
+    start, end = np.searchsorted(authors, author, side='left'), np.searchsorted(authors, author, side='right')
+    return list(zip(days[start:end].tolist(), comments[start:end].tolist()))
+
+  def weekly_comments(self):
+    """Returns [(week start day, comments by authors)] in week order."""
+    if len(self.author_days) == 0:
+        return []
+    days = self.author_days['day'].to_numpy(dtype=np.int64)
+    weeks = self.author_days['comments'].groupby(period_start(days, 'week')).sum()
+    return list(zip(weeks.index.tolist(), weeks.tolist()))
+
+  def new_authors(self, days=7):
+    """Returns the number of authors first active in the last `days` days of activity."""
+    first = self.authors['first_activity']
+    if first.notna().sum() == 0:
+        return 0
+    return int((first > self.authors['last_activity'].max() - pd.Timedelta(days=days)).sum())
+
+  def describe(self, i):
+    """Returns the rollup of the author at position i as a JSON-serializable dict."""
+    row = self.authors.iloc[i]
+    first, last = row['first_activity'], row['last_activity']
+    return {
+        "author": self.authors.index[i],
+        "score": int(self.scores[i]),
+        "tier": self.tier(self.scores[i]),
+        "rows": int(row['rows']),
+        "comments": int(row['comments']),
+        "sentiment": {label: int(row[label]) for label in ('positive', 'neutral', 'negative')},
+        "intent_score": int(self.intent[i]),
+        "intent_comments": int(row['intent_comments']),
+        "active_days": int(row['active_days']),
+        "first_activity": first.isoformat() if pd.notna(first) else None,
+        "last_activity": last.isoformat() if pd.notna(last) else None,
+        "components": {name: round(float(values[i]), 3) for name, values in self.components.items()},
+    }
+
+  def lookup(self, author):
+    """Returns describe() of one author with their comments per active day, or None for unknown authors."""
+    position = self.authors.index.get_indexer([author])[0]
+    if position < 0:
+        return None
+    return {**self.describe(position), "daily": [{"date": day_string(day), "comments": count} for day, count in self.history(author)]}
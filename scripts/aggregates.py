@@ -0,0 +1,440 @@
+"""
+Mergeable analysis aggregates.
+
+AnalysisAggregates holds what the dashboard sections are computed from: per-post comment
+counts and captions, daily and hourly activity, sentiment label counts, comment keyword
+counts, buyer-intent groups, an hourly rollup cube and, for exports with a username column,
+a per-author rollup. Every part merges exactly: the aggregates of a batch of rows
+merged with the aggregates of the rows that follow it equal the aggregates of all the rows.
+A stored analysis can therefore absorb new comments by aggregating only the new rows.
+The topic model is the exception: it is fitted online in row order (see topics.py), so a
+batch's aggregates carry the model continued with the batch's comments, and merging keeps it.
+
+Buyer intent is kept as groups of rows with the same post and comment keyword mask, because
+a row's intent also includes its post's caption keywords, and a post's caption can arrive
+with a later batch. Each group keeps its first few rows so the top signals can be recovered.
+The rollup cube keeps the same (post, comment mask) split per hour and sentiment label, so
+date-range queries can resolve intent categories against the posts' current captions.
+
+The author rollup holds one row per commenter (comment count, sentiment mix, the union of the
+intent keywords they used, first and last activity, active days) plus their comments per day,
+so advocates can be ranked and one author's history looked up without rescanning rows.
+
+Comments mentioning the tracked alert keywords are counted per hour and keyword mask, so
+spike alerts can be replayed over the whole history from the aggregates (see alerts.py).
+"""
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from keywords import KeywordCounter
+from topics import TopicModel
+
+AGGREGATES_VERSION = 5 # Bump when the stored layout or the meaning of a field changes
+INTENT_FIRST_ROWS = 5 # Rows kept per intent group; the top signals are always among them
+
+POST_COLUMNS = ['media_caption', 'timestamp', 'comments', 'caption_sentiment', 'caption_mask']
+ROLLUP_KEYS = ['hour', 'media_id', 'sentiment', 'mask']
+AUTHOR_SUMS = ['rows', 'comments', 'positive', 'neutral', 'negative', 'intent_comments']
+AUTHOR_COLUMNS = [*AUTHOR_SUMS, 'intent_mask', 'first_activity', 'last_activity', 'active_days']
+
+def sum_rollup(rows):
+  """Sums rollup rows with equal ROLLUP_KEYS into one row each."""
+  return rows.groupby(ROLLUP_KEYS, dropna=False, sort=False)[['rows', 'comments']].sum().reset_index()
+
+def combine_authors(frame, author_days):
+  """
+  Combines author rows (indexed by author) into one row per author, in order of first
+  appearance: counts are summed, intent masks OR-ed, first and last activity kept. active_days
+  is counted from author_days (author, day, comments, one row per pair). The rows are grouped
+  by one sort of the author codes and reduced with ufunc.reduceat, so no per-author Python runs.
+  """
+  codes, authors = pd.factorize(frame.index.to_numpy(dtype=object))
+  order = np.argsort(codes, kind='stable')
+  starts = np.flatnonzero(np.diff(codes[order], prepend=-1)) # First row of each author
+  def reduce(ufunc, column):
+      return ufunc.reduceat(frame[column].to_numpy()[order], starts) if len(starts) else frame[column].to_numpy()[:0]
+  combined = pd.DataFrame({
+      **{column: reduce(np.add, column) for column in AUTHOR_SUMS},
+      'intent_mask': reduce(np.bitwise_or, 'intent_mask'),
+      'first_activity': reduce(np.fmin, 'first_activity'), # fmin/fmax skip rows without a timestamp
+      'last_activity': reduce(np.fmax, 'last_activity'),
+  }, index=pd.Index(authors, name='author', dtype=object))
+  combined['active_days'] = author_days.groupby('author', sort=False).size().reindex(combined.index, fill_value=0).to_numpy(dtype=np.int64)
+  return combined
+
+def sum_alert_hours(alert_hours):
+  """Sums alert_hours rows with the same (hour, mask)."""
+  return alert_hours.groupby(['hour', 'mask'], sort=False)['comments'].sum().reset_index()
+
+def sum_author_days(author_days):
+  """Sums author_days rows of the same (author, day)."""
+  return author_days.groupby(['author', 'day'], sort=False)['comments'].sum().reset_index()
+
+def match_keys(table, other):
+  """
+  Returns, for each row of other, the position of the row of table with the same values in
+  every column, or -1. Both are DataFrames of the key columns; table has no repeated rows.
+  Only other's values are hashed: table's columns, numeric ones first, are probed against
+  them to narrow the candidates, and the full keys are matched among the rows that remain.
+  None matches None.
+  """
+  candidates = np.arange(len(table))
+  for column in sorted(table.columns, key=lambda column: table[column].dtype == object):
+      candidates = candidates[pd.Index(other[column].unique()).get_indexer(table[column].to_numpy()[candidates]) >= 0]
+  if not len(candidates) or not len(other):
+      return np.full(len(other), -1)
+  found = pd.MultiIndex.from_frame(table.iloc[candidates]).get_indexer(pd.MultiIndex.from_frame(other))
+  return np.where(found >= 0, candidates[found], -1)
+
+def merge_keyed(table, other, found, columns, combine=None):
+  """
+  Returns table with other's rows merged in, given found (see match_keys): rows of other with
+  a match update that row's `columns` with combine[column] (a ufunc, np.add if not given), the
+  others are appended in their order. That is the order grouping the rows of both tables
+  together would give, without regrouping the rows table already holds.
+  """
+  matched = found >= 0
+  merged = pd.concat([table, other[~matched]], ignore_index=isinstance(table.index, pd.RangeIndex)) if not matched.all() else table.copy()
+  if matched.any():
+      for column in columns:
+          values = merged[column].to_numpy(copy=True)
+          values[found[matched]] = (combine or {}).get(column, np.add)(values[found[matched]], other[column].to_numpy()[matched])
+          merged[column] = values
+  return merged
+
+class AnalysisAggregates:
+  def __init__(self, posts, daily, day_posts, hourly, intent_groups, intent_first, keywords, sentiment_counts, rollup, authors, author_days, alert_hours, topics=None, rows=0, comments=0, texts=0):
+    self.posts = posts # Indexed by media_id, POST_COLUMNS, in order of first appearance
+    self.daily = daily # Indexed by day (days since 1970-01-01): rows, comments
+    self.day_posts = day_posts # Distinct (day, media_id) pairs
+    self.hourly = hourly # Rows per hour of day, length 24
+    self.intent_groups = intent_groups # media_id (None without a post), mask, count
+    self.intent_first = intent_first # media_id, mask, position, timestamp of each group's first rows
+    self.keywords = keywords # KeywordCounter over comment texts, bucketed by week
+    self.sentiment_counts = sentiment_counts # Counter of comment sentiment labels
+    self.rollup = rollup # Timestamped rows and comments per ROLLUP_KEYS (hour: hours since 1970-01-01)
+    self.authors = authors # Indexed by author (username), AUTHOR_COLUMNS, in order of first appearance
+    self.author_days = author_days # author, day, comments: rows per author and active day
+    self.alert_hours = alert_hours # hour, mask, comments: timestamped comments per alert keyword mask
+    self.topics = topics # TopicModel fitted on every comment so far, or None
+    self.rows = rows # Comment rows
+    self.comments = comments # Rows with a non-empty comment
+    self.texts = texts # Rows with a comment text
+
+  @classmethod
+  def from_dataset(cls, dataset, keywords, offset=0, topics=None):
+    """
+    Aggregates a Dataset whose tables carry the per-row results: comments.sentiment and
+    comments.comment_mask, comments.alert_mask, posts.sentiment and posts.caption_mask. Rows with a
+    comments.username are rolled up per author. keywords is the
+    KeywordCounter of its comment texts and topics the TopicModel continued with them (or
+    None). offset is the position of its first row among all rows aggregated so far.
+    """
+    comments = dataset.comments
+    features = dataset.features()
+    has_comment = features['has_comment'].to_numpy()
+    day = features['day'].to_numpy()
+    hour = features['hour'].to_numpy()
+    post = features['post'].to_numpy()
+    media_ids = dataset.posts['media_id'].to_numpy(dtype=object)
+    with_post = post >= 0
+
+    posts = pd.DataFrame({
+        'media_caption': dataset.posts['media_caption'].to_numpy(dtype=object),
+        'timestamp': dataset.posts['timestamp'].to_numpy(dtype='datetime64[ns]'),
+        'comments': np.bincount(post[with_post], weights=has_comment[with_post], minlength=len(media_ids)).astype(np.int64),
+        'caption_sentiment': dataset.posts['sentiment'].to_numpy(dtype=object),
+        'caption_mask': dataset.posts['caption_mask'].to_numpy(dtype=np.int64),
+    }, index=pd.Index(media_ids, name='media_id', dtype=object))
+
+    valid = day >= 0
+    daily = pd.DataFrame({'day': day[valid].astype(np.int64), 'rows': 1, 'comments': has_comment[valid].astype(np.int64)}).groupby('day').sum()
+    day_posts = pd.DataFrame({'day': day[valid & with_post].astype(np.int64), 'media_id': media_ids[post[valid & with_post]]}).drop_duplicates(ignore_index=True)
+
+    row_media = np.full(len(post), None, dtype=object)
+    row_media[with_post] = media_ids[post[with_post]]
+    masks = comments['comment_mask'].to_numpy(dtype=np.int64)
+    rows = pd.DataFrame({
+        'media_id': row_media,
+        'mask': masks,
+        'position': offset + np.arange(len(post), dtype=np.int64),
+        'timestamp': comments['timestamp'].to_numpy(dtype='datetime64[ns]'),
+    })
+    rows = rows[with_post | (masks != 0)] # A row without a post only has its own keywords
+    groups = rows.groupby(['media_id', 'mask'], dropna=False, sort=False)
+    intent_groups = groups.size().rename('count').reset_index()
+    intent_first = groups.head(INTENT_FIRST_ROWS).reset_index(drop=True)
+
+    sentiments = comments['sentiment'].to_numpy(dtype=object)
+    rollup = pd.DataFrame({
+        'hour': day[valid].astype(np.int64) * 24 + hour[valid],
+        'media_id': row_media[valid],
+        'sentiment': np.where(pd.isna(sentiments[valid]), None, sentiments[valid]),
+        'mask': masks[valid],
+        'rows': 1,
+        'comments': has_comment[valid].astype(np.int64),
+    })
+
+    alert_masks = comments['alert_mask'].to_numpy(dtype=np.int64)
+    alerting = valid & (alert_masks != 0)
+    alert_hours = sum_alert_hours(pd.DataFrame({'hour': day[alerting].astype(np.int64) * 24 + hour[alerting], 'mask': alert_masks[alerting], 'comments': 1}))
+
+    authored = comments['username'].notna().to_numpy()
+    row_authors = comments['username'].to_numpy(dtype=object)[authored]
+    timestamps = comments['timestamp'].to_numpy(dtype='datetime64[ns]')[authored]
+    author_days = pd.DataFrame({'author': row_authors[valid[authored]], 'day': day[authored & valid].astype(np.int64), 'comments': 1})
+    author_days = sum_author_days(author_days)
+    author_rows = pd.DataFrame({
+        'rows': np.ones(len(row_authors), dtype=np.int64),
+        'comments': has_comment[authored].astype(np.int64),
+        **{label: (sentiments[authored] == label).astype(np.int64) for label in ('positive', 'neutral', 'negative')},
+        'intent_comments': (masks[authored] != 0).astype(np.int64),
+        'intent_mask': masks[authored],
+        'first_activity': timestamps,
+        'last_activity': timestamps,
+    }, index=pd.Index(row_authors, name='author', dtype=object))
+
+    return cls(
+        posts=posts,
+        daily=daily,
+        day_posts=day_posts,
+        hourly=np.bincount(hour[hour >= 0], minlength=24).astype(np.int64),
+        intent_groups=intent_groups,
+        intent_first=intent_first,
+        keywords=keywords,
+        sentiment_counts=Counter(comments['sentiment'].dropna().astype(str).value_counts().to_dict()),
+        rollup=sum_rollup(rollup),
+        authors=combine_authors(author_rows, author_days),
+        author_days=author_days,
+        alert_hours=alert_hours,
+        topics=topics,
+        rows=len(comments),
+        comments=int(has_comment.sum()),
+        texts=int(comments['comment_text'].notna().sum()),
+    )
+
+  def merge(self, other):
+    """
+    Returns the aggregates of this batch's rows followed by other's rows. other's topic model,
+    if any, continued this batch's, so it replaces it.
+    """
+    old, new = self.posts, other.posts
+    shared = new.index.intersection(old.index, sort=False)
+    posts = pd.concat([old, new.loc[new.index.difference(old.index, sort=False)]])
+    posts.loc[shared, 'comments'] += new.loc[shared, 'comments'].to_numpy()
+    posts.loc[shared, 'timestamp'] = pd.concat([old.loc[shared, 'timestamp'], new.loc[shared, 'timestamp']], axis=1).min(axis=1).to_numpy()
+    # A post keeps its first caption; posts first captioned in the new batch take the new caption's results
+    gains_caption = shared[old.loc[shared, 'media_caption'].isna().to_numpy() & new.loc[shared, 'media_caption'].notna().to_numpy()]
+    for column in ('media_caption', 'caption_sentiment', 'caption_mask'):
+        posts.loc[gains_caption, column] = new.loc[gains_caption, column].to_numpy()
+
+    # Grouped tables are merged by updating the keys they share and appending the new ones (see merge_keyed)
+    group_keys = ['media_id', 'mask']
+    found = match_keys(self.intent_groups[group_keys], other.intent_groups[group_keys])
+    intent_groups = merge_keyed(self.intent_groups, other.intent_groups, found, ['count'])
+    # A group's first rows come from this batch while it has fewer than INTENT_FIRST_ROWS rows
+    stored_counts = np.append(self.intent_groups['count'].to_numpy(), 0)[found] # 0 for new groups (found -1)
+    first_group = match_keys(other.intent_groups[group_keys], other.intent_first[group_keys])
+    rank = other.intent_first.groupby(group_keys, dropna=False, sort=False).cumcount().to_numpy()
+    intent_first = pd.concat([self.intent_first, other.intent_first[stored_counts[first_group] + rank < INTENT_FIRST_ROWS]], ignore_index=True)
+
+    author_days_found = match_keys(self.author_days[['author', 'day']], other.author_days[['author', 'day']])
+    author_days = merge_keyed(self.author_days, other.author_days, author_days_found, ['comments'])
+    new_days = other.author_days['author'][author_days_found < 0].value_counts()
+    other_authors = other.authors.assign(active_days=new_days.reindex(other.authors.index, fill_value=0).to_numpy(dtype=np.int64)) # Days this batch adds
+    authors = merge_keyed(self.authors, other_authors, match_keys(self.authors.index.to_frame(index=False), other_authors.index.to_frame(index=False)), AUTHOR_COLUMNS, {'intent_mask': np.bitwise_or, 'first_activity': np.fmin, 'last_activity': np.fmax})
+
+    day_posts = pd.concat([self.day_posts, other.day_posts[match_keys(self.day_posts, other.day_posts) < 0]], ignore_index=True)
+    rollup = merge_keyed(self.rollup, other.rollup, match_keys(self.rollup[ROLLUP_KEYS], other.rollup[ROLLUP_KEYS]), ['rows', 'comments'])
+    alert_hours = merge_keyed(self.alert_hours, other.alert_hours, match_keys(self.alert_hours[['hour', 'mask']], other.alert_hours[['hour', 'mask']]), ['comments'])
+    return AnalysisAggregates(
+        posts=posts,
+        daily=pd.concat([self.daily, other.daily]).groupby(level=0).sum(),
+        day_posts=day_posts,
+        hourly=self.hourly + other.hourly,
+        intent_groups=intent_groups,
+        intent_first=intent_first,
+        keywords=self.keywords.copy().merge(other.keywords),
+        sentiment_counts=self.sentiment_counts + other.sentiment_counts,
+        rollup=rollup,
+        authors=authors,
+        author_days=author_days,
+        alert_hours=alert_hours,
+        topics=other.topics if other.topics is not None else self.topics,
+        rows=self.rows + other.rows,
+        comments=self.comments + other.comments,
+        texts=self.texts + other.texts,
+    )
+
+  def ordered_posts(self):
+    """Returns the posts table in post-code order (the category order of media_id), as a fresh upload orders them."""
+    return self.posts.reindex(pd.Categorical(self.posts.index.to_numpy(dtype=object)).categories)
+
+  def captions(self):
+    """Returns the posts with a caption, in post-code order."""
+    posts = self.ordered_posts()
+    return posts[posts['media_caption'].notna()]
+
+  def text_count(self):
+    """Number of analyzed texts: comment texts plus each caption once."""
+    return self.texts + len(self.captions())
+
+  def total_sentiment_counts(self):
+    """Sentiment label counts over comments and captions."""
+    return self.sentiment_counts + Counter(self.captions()['caption_sentiment'].dropna().tolist())
+
+  def engagement(self):
+    """Returns the engagement, publishing and diagnostic aggregates."""
+    engagement_over_time = []
+    if len(self.daily):
+        posts_per_day = self.day_posts.groupby('day').size().reindex(self.daily.index, fill_value=0)
+        dates = (np.datetime64('1970-01-01', 'D') + self.daily.index.to_numpy(dtype=np.int64)).astype(str)
+        engagement_over_time = [
+            {"date": date, "posts": int(posts), "comments": int(comments)}
+            for date, posts, comments in zip(dates, posts_per_day.to_numpy(), self.daily['comments'].to_numpy())
+        ]
+
+    hourly_activity = [(f"{h:02d}:00", int(self.hourly[h])) for h in np.flatnonzero(self.hourly)] # Format as HH:00
+
+    posts = self.ordered_posts()
+    top_posts = np.argsort(-posts['comments'].to_numpy(), kind='stable')[:5]
+    media_ids = posts.index.tolist() # Native Python values, so they serialize to JSON
+    captions = posts['media_caption'].to_numpy()
+    top_performing_posts = [
+        {"media_id": media_ids[i], "comments": int(posts['comments'].iat[i]), "media_caption": captions[i] if pd.notna(captions[i]) else None} # Posts without a caption serialize as null
+        for i in top_posts
+    ]
+
+    return {
+        "total_comments": int(self.comments),
+        "total_posts": len(posts),
+        "engagement_over_time": engagement_over_time,
+        "peak_engagement_hours": [{"hour": label, "activity": count} for label, count in hourly_activity],
+        "best_posting_times": [{"time": label, "engagement": count} for label, count in hourly_activity],
+        "top_performing_posts": top_performing_posts,
+    }
+
+  def intent(self, intent_scores, category_masks, top=5):
+    """
+    Resolves the intent groups against their posts' caption masks. intent_scores maps masks to
+    scores and category_masks is {category: mask}. Returns the number of users with a score of
+    at least 10, the number of users with any intent, {category: rows} ordered by first
+    appearance, and the top signals as (user, score, mask, timestamp) ordered by score, then row.
+    Rows with a post count as that post's user; rows without one are each their own user.
+    """
+    caption_masks = self.posts['caption_mask']
+    def resolve(frame):
+        has_post = frame['media_id'].notna().to_numpy()
+        masks = frame['mask'].to_numpy(dtype=np.int64).copy()
+        masks[has_post] |= caption_masks.reindex(frame['media_id'][has_post].to_numpy(dtype=object)).to_numpy(dtype=np.int64)
+        return masks, intent_scores(masks), has_post
+
+    masks, scores, has_post = resolve(self.intent_groups)
+    counts = self.intent_groups['count'].to_numpy()
+    active = scores > 0
+    user_scores = pd.Series(scores[active & has_post]).groupby(self.intent_groups['media_id'].to_numpy(dtype=object)[active & has_post]).max()
+    high_intent_users = int((user_scores >= 10).sum() + counts[active & ~has_post & (scores >= 10)].sum())
+    active_users = int(len(user_scores) + counts[active & ~has_post].sum())
+
+    first_masks, first_scores, first_has_post = resolve(self.intent_first)
+    positions = self.intent_first['position'].to_numpy()
+    categories = []
+    for category, category_mask in category_masks.items():
+        has_category = (masks & category_mask) != 0
+        if has_category.any():
+            first_position = positions[(first_masks & category_mask) != 0].min()
+            categories.append((first_position, category, int(counts[has_category].sum())))
+    category_counts = Counter({category: count for _, category, count in sorted(categories)})
+
+    candidates = np.flatnonzero(first_scores > 0)
+    order = np.lexsort((positions[candidates], -np.minimum(100, first_scores[candidates] * 5)))[:top]
+    timestamps = self.intent_first['timestamp'].to_numpy()
+    media_ids = self.intent_first['media_id'].to_numpy(dtype=object)
+    signals = [
+        (media_ids[j] if first_has_post[j] else f"post_{positions[j]}", int(first_scores[j]), int(first_masks[j]), timestamps[j])
+        for j in candidates[order]
+    ]
+    return high_intent_users, active_users, category_counts, signals
+
+  def to_tables(self):
+    """Returns {name: DataFrame or JSON-serializable dict} for storage."""
+    keywords = [{"bucket": None, "gram": gram, "count": count} for gram, count in self.keywords.counts.items()]
+    for bucket, counts in self.keywords.bucket_counts.items():
+        keywords.extend({"bucket": bucket, "gram": gram, "count": count} for gram, count in counts.items())
+    topic_tables = {}
+    topic_scalars = None
+    if self.topics is not None:
+        topic_tables["topic_terms"], topic_tables["topics"], topic_scalars = self.topics.to_tables()
+    return {
+        **topic_tables,
+        "posts": self.posts,
+        "daily": self.daily,
+        "day_posts": self.day_posts,
+        "intent_groups": self.intent_groups,
+        "intent_first": self.intent_first,
+        "rollup": self.rollup,
+        "authors": self.authors,
+        "author_days": self.author_days,
+        "alert_hours": self.alert_hours,
+        "keywords": pd.DataFrame(keywords, columns=["bucket", "gram", "count"]),
+        "aggregates": {
+            "version": AGGREGATES_VERSION,
+            "hourly": self.hourly.tolist(),
+            "sentiment_counts": dict(self.sentiment_counts),
+            "keyword_texts": self.keywords.texts,
+            "rows": self.rows,
+            "comments": self.comments,
+            "texts": self.texts,
+            "topics": topic_scalars,
+        },
+    }
+
+  @classmethod
+  def from_tables(cls, tables):
+    """Rebuilds aggregates from the tables returned by to_tables. Returns None if they use another layout version."""
+    scalars = tables["aggregates"]
+    if scalars.get("version") != AGGREGATES_VERSION:
+        return None
+    keywords = KeywordCounter()
+    keywords.texts = scalars["keyword_texts"]
+    frame = tables["keywords"]
+    for bucket, gram, count in zip(frame["bucket"].to_numpy(dtype=object), frame["gram"].tolist(), frame["count"].tolist()):
+        (keywords.counts if pd.isna(bucket) else keywords.bucket_counts[bucket])[gram] = count
+    posts = tables["posts"]
+    posts.index = posts.index.astype(object)
+    posts['timestamp'] = posts['timestamp'].astype('datetime64[ns]')
+    posts['media_caption'] = posts['media_caption'].astype(object).where(posts['media_caption'].notna(), None)
+    posts['caption_sentiment'] = posts['caption_sentiment'].astype(object).where(posts['caption_sentiment'].notna(), None)
+    intent_groups = tables["intent_groups"]
+    intent_first = tables["intent_first"]
+    rollup = tables["rollup"]
+    rollup['sentiment'] = rollup['sentiment'].astype(object).where(rollup['sentiment'].notna(), None)
+    for frame in (tables["day_posts"], intent_groups, intent_first, rollup):
+        frame['media_id'] = frame['media_id'].astype(object).where(frame['media_id'].notna(), None)
+    intent_first['timestamp'] = intent_first['timestamp'].astype('datetime64[ns]')
+    authors = tables["authors"]
+    authors.index = authors.index.astype(object)
+    for column in ('first_activity', 'last_activity'):
+        authors[column] = authors[column].astype('datetime64[ns]')
+    author_days = tables["author_days"]
+    author_days['author'] = author_days['author'].astype(object)
+    return cls(
+        posts=posts,
+        daily=tables["daily"],
+        day_posts=tables["day_posts"],
+        hourly=np.array(scalars["hourly"], dtype=np.int64),
+        intent_groups=intent_groups,
+        intent_first=intent_first,
+        keywords=keywords,
+        sentiment_counts=Counter(scalars["sentiment_counts"]),
+        rollup=rollup,
+        authors=authors,
+        author_days=author_days,
+        alert_hours=tables["alert_hours"],
+        topics=TopicModel.from_tables(tables["topic_terms"], tables["topics"], scalars["topics"]) if scalars.get("topics") else None,
+        rows=scalars["rows"],
+        comments=scalars["comments"],
+        texts=scalars["texts"],
+    )
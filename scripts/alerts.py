@@ -0,0 +1,288 @@
+"""
+Streaming spike alerts over sliding time windows.
+
+AlertEngine consumes comment results in timestamp order, one event at a time (add) or as
+per-bucket counts (add_bucket, replay). Events fall into fixed time buckets (an hour by
+default). For each series (comment volume, each sentiment label and each tracked keyword)
+the engine keeps:
+  - the counts of the buckets in a sliding window, in a ring buffer with running sums
+  - an exponentially weighted baseline, fed with each bucket as it leaves the window, so the
+    window is always compared with the history before it
+Adding an event is O(1): a few counter increments. Closing a bucket updates every series at
+once with a handful of array operations, so a month of hourly buckets replays in
+milliseconds.
+
+Volume is tested as a count against its baseline rate. Labels and keywords are tested as a
+share of the window's comments against their baseline share (a binomial z-score), so a busy
+giveaway post doesn't make every series spike at once. An alert opens when a series' z-score
+reaches the threshold with at least min_count events in the window, and closes when the
+z-score falls below half the threshold.
+
+The backend replays the alerts over an analysis' hourly aggregates. To backtest settings on
+an export:
+
+  python alerts.py export.csv --window-hours 6 --threshold 3
+"""
+import numpy as np
+import pandas as pd
+
+SENTIMENT_LABELS = ('positive', 'neutral', 'negative')
+NANOSECONDS_PER_SECOND = 10**9
+
+class Alert:
+  def __init__(self, series, start, z, count, expected, volume):
+    self.series = series # e.g. "volume", "sentiment:negative", "keyword:damaged"
+    self.start = start # Start of the window that first crossed the threshold
+    self.end = None # End of the last window above the recovery level; None while the spike lasts
+    self.peak_z = z
+    self.peak_count = count
+    self.expected = expected # Events the baseline expected in the peak window
+    self.volume = volume # Comments in the peak window
+
+  @property
+  def kind(self):
+    return self.series.split(":", 1)[0]
+
+  @property
+  def name(self):
+    return self.series.split(":", 1)[-1]
+
+  def update(self, z, count, expected, volume):
+    if z > self.peak_z:
+        self.peak_z, self.peak_count, self.expected, self.volume = z, count, expected, volume
+
+  def to_dict(self):
+    return {
+        "series": self.series,
+        "kind": self.kind,
+        "name": self.name,
+        "start": self.start.isoformat(),
+        "end": self.end.isoformat() if self.end is not None else None,
+        "peak_z": round(self.peak_z, 2),
+        "peak_count": self.peak_count,
+        "expected": round(self.expected, 1),
+        "volume": self.volume,
+    }
+
+class AlertEngine:
+  def __init__(self, keywords=(), bucket_seconds=3600, window_buckets=6, halflife_buckets=72, threshold=3.0, min_count=5, warmup_buckets=None):
+    """
+    keywords are the tracked keywords, in the bit order of the keyword masks passed to add.
+    A window covers window_buckets buckets of bucket_seconds; the baseline forgets half its
+    weight every halflife_buckets buckets and alerts start once warmup_buckets buckets
+    (default: one window) have entered the baseline.
+    """
+    self.series = ["volume", *(f"sentiment:{label}" for label in SENTIMENT_LABELS), *(f"keyword:{keyword}" for keyword in keywords)]
+    self.bucket_ns = int(bucket_seconds * NANOSECONDS_PER_SECOND)
+    self.window_buckets = window_buckets
+    self.threshold = threshold
+    self.min_count = min_count
+    self.warmup_buckets = window_buckets if warmup_buckets is None else warmup_buckets
+    self._alpha = 1 - 0.5 ** (1 / halflife_buckets)
+    self._label_index = {label: 1 + i for i, label in enumerate(SENTIMENT_LABELS)}
+    self._keyword_offset = 1 + len(SENTIMENT_LABELS)
+
+    n = len(self.series)
+    self._ring = np.zeros((window_buckets, n), dtype=np.int64) # Bucket counts in the window
+    self._position = 0 # Ring slot of the next closed bucket
+    self._window = np.zeros(n, dtype=np.int64) # Running sums over the ring
+    self._current = np.zeros(n, dtype=np.int64) # Counts of the open bucket
+    self._bucket = None # Index of the open bucket (bucket_ns units since 1970-01-01)
+    self._closed = 0 # Buckets closed so far
+    self._mean = np.zeros(n) # Exponentially weighted mean count per bucket
+    self._var = np.zeros(n) # ... and its variance
+    self._baseline_buckets = 0
+    self._open = {} # {series index: Alert} of spikes in progress
+    self.alerts = [] # Every alert, in opening order
+    self.events = 0
+    self.late_events = 0 # Events older than the open bucket; not counted
+
+  def _bucket_of(self, timestamp):
+    return int(pd.Timestamp(timestamp).value // self.bucket_ns)
+
+  def add(self, timestamp, sentiment=None, keyword_mask=0):
+    """Adds one comment: its timestamp, sentiment label (or None) and tracked keyword mask."""
+    if pd.isna(timestamp):
+        return
+    bucket = self._bucket_of(timestamp)
+    if not self._advance(bucket):
+        self.late_events += 1
+        return
+    self.events += 1
+    current = self._current
+    current[0] += 1
+    if sentiment is not None:
+        current[self._label_index[sentiment]] += 1
+    while keyword_mask:
+        bit = keyword_mask & -keyword_mask # Lowest set bit
+        current[self._keyword_offset + bit.bit_length() - 1] += 1
+        keyword_mask ^= bit
+
+  def add_bucket(self, bucket, counts):
+    """Adds the counts of every series (in self.series order) of one bucket, e.g. from hourly aggregates."""
+    if not self._advance(bucket):
+        self.late_events += int(counts[0])
+        return
+    self.events += int(counts[0])
+    self._current += counts
+
+  def replay(self, buckets, counts):
+    """Adds per-bucket counts (one row per bucket, in self.series order) in bucket order, then closes the last bucket."""
+    order = np.argsort(buckets, kind='stable')
+    for bucket, row in zip(np.asarray(buckets)[order].tolist(), np.asarray(counts, dtype=np.int64)[order]):
+        self.add_bucket(bucket, row)
+    self.flush()
+    return self
+
+  def flush(self):
+    """Closes the open bucket, e.g. at the end of a replay. Later events continue from the next bucket."""
+    if self._bucket is not None:
+        self._close()
+
+  def _advance(self, bucket):
+    """Moves the open bucket forward to `bucket`, closing the buckets in between. False for late events."""
+    if self._bucket is None:
+        self._bucket = bucket
+    if bucket < self._bucket:
+        return False
+    gap = bucket - self._bucket
+    if gap:
+        self._close()
+        # Empty buckets slide the window; past a full window, only the baseline keeps decaying
+        empty = min(gap - 1, self.window_buckets + 1)
+        for _ in range(empty):
+            self._close()
+        if gap - 1 > empty:
+            self._decay(gap - 1 - empty)
+        self._bucket = bucket
+    return True
+
+  def _close(self):
+    """Closes the open bucket: slides the window, feeds the bucket leaving it to the baseline and evaluates."""
+    leaving = self._ring[self._position].copy()
+    self._ring[self._position] = self._current
+    self._position = (self._position + 1) % self.window_buckets
+    self._window += self._current - leaving
+    self._current = np.zeros_like(self._current)
+    self._closed += 1
+    if self._closed > self.window_buckets:
+        self._learn(leaving)
+    self._bucket += 1 # The window now ends where the next bucket starts
+    if self._baseline_buckets >= self.warmup_buckets:
+        self._evaluate()
+
+  def _learn(self, counts):
+    # Until the baseline has seen about a half-life, weigh its buckets equally (a running mean and
+    # variance); otherwise its first bucket alone would set the expectation for days
+    alpha = max(self._alpha, 1 / (self._baseline_buckets + 1))
+    diff = counts - self._mean
+    increment = alpha * diff
+    self._mean += increment
+    self._var = (1 - alpha) * (self._var + diff * increment)
+    self._baseline_buckets += 1
+
+  def _decay(self, buckets):
+    """Feeds `buckets` empty buckets to the baseline at once."""
+    for _ in range(min(buckets, 3)): # The first updates move the variance; after that zeros only shrink both
+        self._learn(np.zeros_like(self._window))
+    if buckets > 3:
+        factor = (1 - self._alpha) ** (buckets - 3)
+        self._mean *= factor
+        self._var *= factor
+        self._baseline_buckets += buckets - 3
+
+  def z_scores(self):
+    """Returns (z, expected) of the current window for every series."""
+    w = self.window_buckets
+    volume = self._window[0]
+    expected = np.empty(len(self.series))
+    z = np.zeros(len(self.series))
+    # A young baseline is itself uncertain: scale the noise by the windows it has seen (two-sample z-scores)
+    baseline_windows = min(self._baseline_buckets, (2 - self._alpha) / self._alpha) / w # Effective buckets of the weighted mean
+    uncertainty = 1 + 1 / max(baseline_windows, 1e-9)
+    # Volume: count against the baseline rate, with at least Poisson noise
+    expected[0] = w * self._mean[0]
+    z[0] = (volume - expected[0]) / np.sqrt(max((w * self._var[0] + expected[0]) * uncertainty, 1.0))
+    # Labels and keywords: share of the window's comments against the baseline share
+    share = np.clip(self._mean[1:] / self._mean[0], 0.0, 1.0) if self._mean[0] > 0 else np.zeros(len(self.series) - 1)
+    expected[1:] = volume * share
+    z[1:] = (self._window[1:] - expected[1:]) / np.sqrt(np.maximum(volume * share * (1 - share) * uncertainty, 1.0))
+    return z, expected
+
+  def _evaluate(self):
+    z, expected = self.z_scores()
+    window_start = pd.Timestamp((self._bucket - self.window_buckets) * self.bucket_ns)
+    window_end = pd.Timestamp(self._bucket * self.bucket_ns)
+    volume = int(self._window[0])
+    firing = np.flatnonzero((z >= self.threshold) & (self._window >= self.min_count))
+    for i in firing.tolist():
+        alert = self._open.get(i)
+        if alert is None:
+            alert = self._open[i] = Alert(self.series[i], window_start, float(z[i]), int(self._window[i]), float(expected[i]), volume)
+            self.alerts.append(alert)
+        else:
+            alert.update(float(z[i]), int(self._window[i]), float(expected[i]), volume)
+    for i in [i for i in self._open if z[i] < self.threshold / 2]:
+        self._open.pop(i).end = window_end
+
+  def active(self):
+    """Returns the alerts still in progress."""
+    return list(self._open.values())
+
+  def stats(self):
+    return {"events": self.events, "late_events": self.late_events, "buckets": self._closed, "alerts": len(self.alerts), "active": len(self._open)}
+
+def hourly_counts(rollup, alert_hours, keywords):
+  """
+  Returns (hours, counts) for AlertEngine.replay with hourly buckets, from the rollup cube and
+  the alert keyword counts of AnalysisAggregates: one row per hour with activity, holding the
+  comment volume, comments per sentiment label and comments per keyword (bit i of the alert
+  masks is keywords[i]).
+  """
+  hours = np.union1d(rollup['hour'].to_numpy(dtype=np.int64), alert_hours['hour'].to_numpy(dtype=np.int64))
+  counts = np.zeros((len(hours), 1 + len(SENTIMENT_LABELS) + len(keywords)), dtype=np.int64)
+  position = np.searchsorted(hours, rollup['hour'].to_numpy(dtype=np.int64))
+  counts[:, 0] = np.bincount(position, weights=rollup['comments'].to_numpy(), minlength=len(hours))
+  sentiments = rollup['sentiment'].to_numpy(dtype=object)
+  rows = rollup['rows'].to_numpy()
+  for i, label in enumerate(SENTIMENT_LABELS):
+      labeled = sentiments == label
+      counts[:, 1 + i] = np.bincount(position[labeled], weights=rows[labeled], minlength=len(hours))
+  position = np.searchsorted(hours, alert_hours['hour'].to_numpy(dtype=np.int64))
+  masks = alert_hours['mask'].to_numpy(dtype=np.int64)
+  comments = alert_hours['comments'].to_numpy()
+  for i in range(len(keywords)):
+      matched = (masks & (1 << i)) != 0
+      counts[:, 1 + len(SENTIMENT_LABELS) + i] = np.bincount(position[matched], weights=comments[matched], minlength=len(hours))
+  return hours, counts
+
+if __name__ == '__main__':
+  import argparse
+  import os
+  import time
+
+  parser = argparse.ArgumentParser(description="Backtest spike alerts on a comment export with the backend's analysis.")
+  parser.add_argument("csv", help="CSV export to replay")
+  parser.add_argument("--window-hours", type=int, default=None, help="Sliding window (default: SCROLLMARK_ALERT_WINDOW_HOURS)")
+  parser.add_argument("--baseline-hours", type=float, default=None, help="Half-life of the baseline (default: SCROLLMARK_ALERT_BASELINE_HOURS)")
+  parser.add_argument("--threshold", type=float, default=None, help="z-score that opens an alert (default: SCROLLMARK_ALERT_THRESHOLD)")
+  parser.add_argument("--min-count", type=int, default=None, help="Comments a series needs in the window (default: SCROLLMARK_ALERT_MIN_COUNT)")
+  args = parser.parse_args()
+
+  os.environ.setdefault("SCROLLMARK_DATASET_DIR", "") # A backtest doesn't store the export
+  import backend # Reads the environment at import
+
+  started = time.perf_counter()
+  aggregates = None
+  with open(args.csv, "rb") as f:
+      for rows in backend.read_csv_chunks(f):
+          chunk = backend.build_aggregates(backend.normalize_export(rows), offset=aggregates.rows if aggregates else 0)
+          aggregates = chunk if aggregates is None else aggregates.merge(chunk)
+  analyzed = time.perf_counter()
+  engine = backend.replay_alerts(aggregates, args.window_hours, args.baseline_hours, args.threshold, args.min_count)
+  replayed = time.perf_counter()
+
+  for alert in engine.alerts:
+      end = alert.end.isoformat() if alert.end is not None else "ongoing"
+      print(f"{alert.start.isoformat()} - {end}  {alert.series:<28} z={alert.peak_z:5.1f}  {alert.peak_count} of {alert.volume} comments, {alert.expected:.1f} expected")
+  print(f"{engine.stats()} - analyzed in {analyzed - started:.2f}s, replayed in {(replayed - analyzed) * 1000:.1f} ms")
@@ -1,44 +1,243 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import pandas as pd
+import numpy as np
 import io
+import json
+import logging
+import tempfile
+import threading
+import time
+import gzip
+import os
+import atexit
+import contextlib
+import functools
+import gc
+import hashlib
+import itertools
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 import random
 from collections import Counter
 import re
-from tqdm import tqdm # Import tqdm
-
-# Hugging Face Transformers imports
-from transformers import pipeline, set_seed
+import sys
+from dataclasses import dataclass, field
+from sentiment_cache import SentimentCache, cache_key, normalize_text
+from dataset_store import DatasetChanged, DatasetStore
+from aggregates import AGGREGATES_VERSION, AnalysisAggregates
+from jobs import JobManager, JobStore, report_progress
+from keywords import KeywordCounter
+from topics import DocumentTerms, TopicModel
+from rollups import RollupIndex, day_string, parse_day, sentiment_summary
+from advocates import LOYALTY_POINTS_PER_COMMENT, SCORE_WEIGHTS, TIERS, AdvocateIndex
+from alerts import AlertEngine, hourly_counts
+from response_cache import ResponseCache, content_hash
+from recommendations import RecommendationService
+from serving import InferenceLimiter, Overloaded
+from telemetry import begin_trace, current_trace, end_trace, log, span
+import telemetry
+from models import SENTIMENT_MODEL_LABEL, SENTIMENT_THRESHOLD, map_sentiment_label, sentiment_model, generation_model, MODELS, models_status, predict_sentiment, warm_up, ModelUnavailable
+from sentiment_pool import get_sentiment_pool, sentiment_pool_status
 
 app = Flask(__name__)
 CORS(app) # Enable CORS for all routes
 
-# Initialize NLP models
-# Sentiment Analysis Model
+# Sentiment settings
+SENTIMENT_BATCH_SIZE = int(os.environ.get("SCROLLMARK_SENTIMENT_BATCH_SIZE", 64)) # Texts per forward pass
+SENTIMENT_WORKERS = int(os.environ.get("SCROLLMARK_SENTIMENT_WORKERS", 0)) # Inference worker processes, 0 scores in-process
+SENTIMENT_CACHE_PATH = os.environ.get("SCROLLMARK_SENTIMENT_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "sentiment.sqlite3"))
+SENTIMENT_CACHE_SIZE = int(os.environ.get("SCROLLMARK_SENTIMENT_CACHE_SIZE", 500000)) # Max cached labels, 0 disables the cache
+SENTIMENT_CACHE_MODEL_KEY = f"{SENTIMENT_MODEL_LABEL}|{SENTIMENT_THRESHOLD}" # Part of every cache key
+
+# NLP models are loaded lazily by models.py, on first use or by the warm-up thread
+try:
+  sentiment_cache = SentimentCache(SENTIMENT_CACHE_PATH, SENTIMENT_CACHE_SIZE) if SENTIMENT_CACHE_SIZE > 0 else None
+except Exception as e:
+  log.warning(f"Could not open sentiment cache at {SENTIMENT_CACHE_PATH}: {e}. Sentiment results will not be cached.")
+  sentiment_cache = None
+
+# Uploads are kept as datasets so their analysis can be reopened without re-parsing or re-scoring
+DATASET_DIR = os.environ.get("SCROLLMARK_DATASET_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data", "datasets")) # Empty disables the store
 try:
-  sentiment_analyzer = pipeline("sentiment-analysis", model="distilbert-base-uncased-finetuned-sst-2-english")
+  dataset_store = DatasetStore(DATASET_DIR, key_column='row_key') if DATASET_DIR else None
 except Exception as e:
-  print(f"Could not load sentiment model: {e}. Falling back to mock sentiment.")
-  sentiment_analyzer = None
+  log.warning(f"Could not open dataset store at {DATASET_DIR}: {e}. Uploads will not be stored.")
+  dataset_store = None
 
-# Text Generation Model for recommendations
+# Serialized analysis responses, keyed by the upload's content hash and the pipeline version
+RESPONSE_CACHE_BYTES = int(os.environ.get("SCROLLMARK_RESPONSE_CACHE_BYTES", 64 << 20)) # 0 disables the cache
+RESPONSE_VERSION = 4 # Bump when the response payload changes
+response_cache = ResponseCache(RESPONSE_CACHE_BYTES)
+
+# Analysis jobs and LLM recommendations are shared with the other server workers through this file,
+# so any worker can answer a poll for them (see shared_state.py)
+STATE_PATH = os.environ.get("SCROLLMARK_STATE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "state.sqlite3")) or None # Empty keeps them per process
 try:
-  generator = pipeline('text-generation', model='distilgpt2')
-  set_seed(42) # for reproducibility
+  job_store = JobStore(STATE_PATH)
 except Exception as e:
-  print(f"Could not load text generation model: {e}. Falling back to mock recommendations.")
-  generator = None
-
-def parse_csv_data(csv_string):
-  """Parses CSV string into a pandas DataFrame."""
-  print("Parsing CSV data...")
-  df = pd.read_csv(io.StringIO(csv_string))
-  # Ensure timestamp is datetime object
-  if 'timestamp' in df.columns:
-      df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce', utc=True).dt.tz_localize(None)
-  print("CSV data parsed successfully.")
-  return df
+  log.warning(f"Could not open the shared state at {STATE_PATH}: {e}. Jobs and recommendations are only visible to the worker that started them.")
+  STATE_PATH = None
+  job_store = JobStore()
+
+RECOMMENDATION_SECONDS = float(os.environ.get("SCROLLMARK_RECOMMENDATION_SECONDS", 20)) # Time budget per LLM generation
+RECOMMENDATION_CACHE_SIZE = int(os.environ.get("SCROLLMARK_RECOMMENDATION_CACHE_SIZE", 256)) # Memoized generations
+recommendation_service = RecommendationService(generation_model, max_seconds=RECOMMENDATION_SECONDS, max_entries=RECOMMENDATION_CACHE_SIZE, path=STATE_PATH)
+
+CSV_COLUMNS = ['timestamp', 'media_id', 'media_caption', 'comment_text', 'username'] # username (the commenter) is optional
+# Exports are read and aggregated in chunks of rows, so memory is bounded by the chunk size rather than the export size
+CHUNK_ROWS = int(os.environ.get("SCROLLMARK_CHUNK_ROWS", 250000))
+CHUNK_WORKERS = int(os.environ.get("SCROLLMARK_CHUNK_WORKERS", os.cpu_count() or 1)) # Processes preparing chunks, 0 prepares them in-process
+SENTIMENT_LABELS = ['positive', 'neutral', 'negative']
+GZIP_MAGIC = b'\x1f\x8b'
+UPLOAD_BUFFER_SIZE = 1 << 20 # Read uploads in 1 MiB blocks
+NANOSECONDS_PER_HOUR = 3600 * 10**9
+
+# Analysis stages in pipeline order, weighted by their rough share of the total run time
+ANALYSIS_STAGES = [
+    ("parse", 0.05),
+    ("engagement", 0.05),
+    ("sentiment", 0.61),
+    ("keywords", 0.08),
+    ("buyer_intent", 0.10),
+    ("topics", 0.04),
+    ("publishing", 0.01),
+    ("diagnostics", 0.01),
+    ("virality", 0.01),
+    ("advocates", 0.04),
+]
+JOB_WORKERS = int(os.environ.get("SCROLLMARK_JOB_WORKERS", 2)) # Analyses that may run concurrently
+analysis_jobs = JobManager(ANALYSIS_STAGES, workers=JOB_WORKERS, store=job_store)
+
+# Synchronous analyses (/analyze, /analyze/upload, append) admitted at once per server process;
+# jobs are bounded by their own worker pool instead
+MAX_CONCURRENT_ANALYSES = int(os.environ.get("SCROLLMARK_MAX_CONCURRENT_ANALYSES", 1))
+MAX_QUEUED_ANALYSES = int(os.environ.get("SCROLLMARK_MAX_QUEUED_ANALYSES", 8))
+ANALYSIS_QUEUE_TIMEOUT = float(os.environ.get("SCROLLMARK_ANALYSIS_QUEUE_TIMEOUT", 60)) # Seconds a request may wait for a slot
+inference_limiter = InferenceLimiter(MAX_CONCURRENT_ANALYSES, MAX_QUEUED_ANALYSES, ANALYSIS_QUEUE_TIMEOUT)
+PORT = int(os.environ.get("SCROLLMARK_PORT", 5000))
+
+logging.basicConfig(level=os.environ.get("SCROLLMARK_LOG_LEVEL", "INFO").upper(), format="[%(asctime)s] %(levelname)s %(message)s")
+
+# Prometheus metrics, served on /metrics; stage latencies come from telemetry.span
+HTTP_REQUESTS = telemetry.Counter("scrollmark_http_requests_total", "HTTP requests by route, method and status.", ["route", "method", "status"])
+HTTP_SECONDS = telemetry.Histogram("scrollmark_http_request_duration_seconds", "HTTP request latency by route.", ["route"])
+CACHE_REQUESTS = telemetry.Counter("scrollmark_cache_requests_total", "Cache lookups by cache and result (hit or miss); sentiment counts texts.", ["cache", "result"])
+telemetry.Gauge("scrollmark_response_cache_bytes", "Size of the cached analysis responses.", lambda: response_cache.stats()["bytes"])
+telemetry.Gauge("scrollmark_analyses", "Synchronous analyses admitted by the inference limiter, by state.", lambda: {("running",): inference_limiter.stats()["active"], ("queued",): inference_limiter.stats()["queued"]}, ["state"])
+telemetry.Gauge("scrollmark_recommendations_pending", "LLM recommendation generations queued or running, in any worker.", lambda: recommendation_service.stats()["pending"])
+
+@dataclass
+class Dataset:
+  """
+  Parsed export split into two tables so post-level fields are stored once per post.
+  posts: one row per media_id (media_id, media_caption, timestamp of first activity), indexed by post code.
+  comments: one row per CSV row (media_id as a categorical over posts.media_id, timestamp, comment_text).
+  Per-row analysis results are added as columns once computed (comments.sentiment,
+  comments.comment_mask and comments.alert_mask, posts.sentiment and posts.caption_mask), or come with the tables
+  when the dataset is loaded from the dataset store.
+  """
+  posts: pd.DataFrame
+  comments: pd.DataFrame
+  dataset_id: str = None # Set once the dataset is stored
+  sentiment_model: str = None # Model key of the sentiment columns; None while they are missing or mocked
+  _features: pd.DataFrame = field(default=None, repr=False)
+
+  def caption_texts(self):
+    """Returns the non-empty captions, one per post."""
+    return self.posts['media_caption'].dropna().tolist()
+
+  def texts(self):
+    """Returns all comment texts followed by each post's caption once."""
+    return self.comments['comment_text'].dropna().tolist() + self.caption_texts()
+
+  def post_codes(self):
+    """Returns each comment row's integer post code (-1 when the row has no media_id)."""
+    return self.comments['media_id'].cat.codes.to_numpy()
+
+  def features(self):
+    """Returns the per-row feature frame, building it on first use."""
+    if self._features is None:
+        self._features = build_feature_frame(self)
+    return self._features
+
+def build_feature_frame(dataset):
+  """
+  Builds the integer features every aggregate is computed from, once per upload:
+  has_comment (non-empty comment text), day (days since 1970-01-01), hour (0-23) and
+  post (post code). day and hour are -1 for rows without a valid timestamp, post is -1
+  for rows without a media_id.
+  """
+  comments = dataset.comments
+  texts = comments['comment_text']
+  has_comment = np.zeros(len(comments), dtype=bool)
+  present = texts.notna().to_numpy()
+  has_comment[present] = texts[present].astype(str).str.strip().str.len().to_numpy() > 0
+
+  nanoseconds = comments['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+  valid = comments['timestamp'].notna().to_numpy()
+  hours_since_epoch = nanoseconds // NANOSECONDS_PER_HOUR
+  day = np.where(valid, hours_since_epoch // 24, -1).astype(np.int32)
+  hour = np.where(valid, hours_since_epoch % 24, -1).astype(np.int8)
+  return pd.DataFrame({'has_comment': has_comment, 'day': day, 'hour': hour, 'post': dataset.post_codes().astype(np.int32)}, index=comments.index)
+
+def normalize_usernames(usernames):
+  """Returns the commenters' handles without a leading '@' and lowercased (Instagram handles are case-insensitive); empty ones as None."""
+  if usernames.isna().all():
+      return pd.Series(np.full(len(usernames), None, dtype=object), index=usernames.index)
+  handles = usernames.astype('string').str.strip().str.lstrip('@').str.lower()
+  handles = handles.mask(handles == '')
+  return handles.astype(object).where(handles.notna(), None)
+
+def normalize_export(df):
+  """Splits a flat export DataFrame (one row per comment, caption repeated) into a Dataset."""
+  for column in CSV_COLUMNS:
+      if column not in df.columns:
+          df[column] = pd.NaT if column == 'timestamp' else None
+  media_id = df['media_id'].astype('category')
+  by_post = df.groupby(media_id, observed=True)
+  posts = pd.DataFrame({
+      'media_id': media_id.cat.categories,
+      'media_caption': by_post['media_caption'].first().reindex(media_id.cat.categories).to_numpy(), # First non-empty caption
+      'timestamp': by_post['timestamp'].min().reindex(media_id.cat.categories).to_numpy(),
+  })
+  comments = pd.DataFrame({'media_id': media_id, 'timestamp': df['timestamp'], 'comment_text': df['comment_text'], 'username': normalize_usernames(df['username'])})
+  return Dataset(posts=posts, comments=comments)
+
+class CSVParseError(ValueError):
+  """The uploaded CSV could not be read."""
+
+def read_csv_chunks(csv_source, chunk_rows=CHUNK_ROWS):
+  """
+  Reads a CSV string or file-like object (text or binary) as flat export DataFrames of at most
+  chunk_rows rows each. Read errors are raised as CSVParseError.
+  """
+  if isinstance(csv_source, str):
+      csv_source = io.StringIO(csv_source)
+  try:
+      # media_id is an identifier: keep it as text so long numeric ids stay exact and every upload agrees on its type
+      reader = pd.read_csv(csv_source, usecols=lambda column: column in CSV_COLUMNS, dtype={'media_id': str, 'username': str}, chunksize=chunk_rows)
+      for df in reader:
+          # Ensure timestamp is datetime object
+          if 'timestamp' in df.columns:
+              df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce', utc=True).dt.tz_localize(None)
+          yield df
+  except Exception as e:
+      raise CSVParseError(str(e)) from e
+
+def read_csv_export(csv_source):
+  """Reads a whole CSV string or file-like object into one flat export DataFrame."""
+  return pd.concat(list(read_csv_chunks(csv_source)), ignore_index=True)
+
+def parse_csv_data(csv_source):
+  """Parses a CSV string or file-like object (text or binary) into a Dataset of posts and comments."""
+  report_progress("parse")
+  with span("parse") as parsed:
+      dataset = normalize_export(read_csv_export(csv_source))
+      parsed.set(rows=len(dataset.comments), posts=len(dataset.posts))
+  return dataset
 
 def generate_mock_trends(start_date, num_days, base_value, fluctuation):
   """Generates mock trend data for charts."""
@@ -50,193 +249,309 @@ def generate_mock_trends(start_date, num_days, base_value, fluctuation):
       current_date += timedelta(days=1)
   return trends
 
-def get_sentiment(text):
-  """Analyzes sentiment of a given text using Hugging Face model."""
-  if not sentiment_analyzer or not text or not isinstance(text, str) or text.strip() == "":
-      return "neutral" # Default to neutral if model not loaded or text is empty/invalid
-  try:
-      result = sentiment_analyzer(text)
-      label = result[0]['label']
-      score = result[0]['score']
-      
-      # distilbert-base-uncased-finetuned-sst-2-english outputs 'POSITIVE' and 'NEGATIVE'
-      if label == 'POSITIVE' and score > 0.7: # Use a threshold for strong sentiment
-          return "positive"
-      elif label == 'NEGATIVE' and score > 0.7: # Use a threshold for strong sentiment
-          return "negative"
+def _score_texts(texts, batch_size):
+  """
+  Scores texts with the sentiment process pool when SCROLLMARK_SENTIMENT_WORKERS is set, or
+  in-process otherwise. Returns one label (or None on failure) per text.
+  """
+  on_progress = lambda fraction: report_progress("sentiment", fraction)
+  predictions = None
+  if SENTIMENT_WORKERS > 0:
+      try:
+          predictions = get_sentiment_pool().predict(texts, batch_size, on_progress=on_progress)
+      except Exception as e:
+          log.warning(f"Sentiment process pool failed: {e}. Scoring in-process instead.")
+  if predictions is None:
+      analyzer = sentiment_model.get()
+      if analyzer is None:
+          return [None] * len(texts)
+      predictions = predict_sentiment(analyzer, texts, batch_size, on_progress=on_progress)
+  return [map_sentiment_label(p['label'], p['score']) if p is not None else None for p in predictions]
+
+def get_sentiments(texts, batch_size=SENTIMENT_BATCH_SIZE, stats=None):
+  """
+  Analyzes sentiment of a list of texts using the Hugging Face model.
+  Identical texts are scored once, previously seen texts are served from the sentiment cache,
+  and the rest are scored in batches of similar token length to keep padding small.
+  Returns one label per input text, in input order. If `stats` is a dict, it is filled with
+  text, unique text and cache hit/miss counts.
+  """
+  sentiments = ["neutral"] * len(texts) # Default to neutral if model not loaded or text is empty/invalid
+  positions = {} # {normalized text: [indices of texts that normalize to it]}
+  for i, text in enumerate(texts):
+      if isinstance(text, str) and text.strip() != "":
+          positions.setdefault(normalize_text(text), []).append(i)
+  unique_texts = list(positions)
+  if stats is not None:
+      stats.update({"texts": len(texts), "unique_texts": len(unique_texts), "cache_hits": 0, "cache_misses": 0})
+  if sentiment_model.is_mocked() or not unique_texts:
+      return sentiments
+
+  labels = {}
+  keys = {}
+  if sentiment_cache:
+      keys = {text: cache_key(text, SENTIMENT_CACHE_MODEL_KEY) for text in unique_texts}
+      cached = sentiment_cache.get_many(list(keys.values()))
+      labels = {text: cached[key] for text, key in keys.items() if key in cached}
+      CACHE_REQUESTS.labels("sentiment", "hit").inc(len(labels))
+      CACHE_REQUESTS.labels("sentiment", "miss").inc(len(unique_texts) - len(labels))
+      if stats is not None:
+          stats.update({"cache_hits": len(labels), "cache_misses": len(unique_texts) - len(labels)})
+
+  to_score = [text for text in unique_texts if text not in labels] # Fully cached requests never load the model
+  if to_score:
+      with span("sentiment_inference", texts=len(to_score)):
+          scored = dict(zip(to_score, _score_texts(to_score, batch_size)))
+  else:
+      scored = {}
+  if sentiment_cache:
+      sentiment_cache.put_many({keys[text]: label for text, label in scored.items() if label is not None}) # Never cache failures
+  labels.update(scored)
+
+  for text, indices in positions.items():
+      label = labels.get(text) or "neutral"
+      for i in indices:
+          sentiments[i] = label
+  return sentiments
+
+def dataset_sentiments(dataset, stats=None):
+  """
+  Returns one sentiment label per text of dataset.texts(). Labels stored with the dataset are
+  reused as they are; the others are computed and added to the dataset's tables as a
+  `sentiment` column.
+  """
+  comments = dataset.comments
+  posts = dataset.posts
+  has_text = comments['comment_text'].notna().to_numpy()
+  has_caption = posts['media_caption'].notna().to_numpy()
+  to_score = [] # (table, rows with text, texts)
+  stored = 0
+  for table, column, has_value in ((comments, 'comment_text', has_text), (posts, 'media_caption', has_caption)):
+      if 'sentiment' in table.columns:
+          stored += int(has_value.sum())
       else:
-          return "neutral" # If score is not high enough for strong positive/negative, or if it's truly neutral
-  except Exception as e:
-      print(f"Error during sentiment analysis for text '{text[:50]}...': {e}")
-      return "neutral"
+          to_score.append((table, has_value, table[column].to_numpy(dtype=object)[has_value].tolist()))
+
+  if to_score:
+      texts = [text for _, _, texts in to_score for text in texts]
+      with span("sentiment", texts=len(texts)):
+          scored = get_sentiments(texts, stats=stats)
+      for table, has_value, texts in to_score:
+          labels = np.full(len(table), None, dtype=object)
+          labels[has_value] = scored[:len(texts)]
+          scored = scored[len(texts):]
+          table['sentiment'] = pd.Categorical(labels, categories=SENTIMENT_LABELS)
+      # Mock labels are placeholders: they are used for this response but never stored
+      dataset.sentiment_model = None if sentiment_model.is_mocked() else SENTIMENT_CACHE_MODEL_KEY
+  elif stats is not None:
+      stats.update({"texts": stored})
+  if stats is not None:
+      stats["stored_labels"] = stored
+  return comments['sentiment'].to_numpy(dtype=object)[has_text].tolist() + posts['sentiment'].to_numpy(dtype=object)[has_caption].tolist()
 
+def get_sentiment(text):
+  """Analyzes sentiment of a single text. Prefer get_sentiments for more than one text."""
+  return get_sentiments([text])[0]
+
+def week_buckets(timestamps):
+  """Returns the Monday (YYYY-MM-DD) starting each timestamp's week, or None for missing timestamps."""
+  weeks = pd.Series(pd.to_datetime(timestamps)).dt.to_period('W-SUN').dt.start_time.dt.strftime('%Y-%m-%d')
+  return weeks.astype(object).where(weeks.notna(), None).tolist()
+
+def count_keywords(texts, buckets=None):
+  """Counts unigram and bigram keywords of all texts, and per bucket if buckets are given, in one pass."""
+  report_progress("keywords")
+  counter = KeywordCounter()
+  buckets = buckets if buckets is not None else [None] * len(texts)
+  report_every = max(1, len(texts) // 50)
+  with span("keywords", texts=len(texts)):
+      for i, (text, bucket) in enumerate(zip(texts, buckets)):
+          if i % report_every == 0:
+              report_progress("keywords", i / len(texts))
+          counter.add(text, bucket)
+  return counter
+
+def comment_terms(dataset):
+  """Tokenizes the comments with a text, in row order, into a sparse document-term matrix (see topics.py)."""
+  texts = dataset.comments['comment_text'].dropna()
+  report_progress("keywords")
+  with span("keywords", texts=len(texts)) as tokenized:
+      terms = DocumentTerms.from_texts(texts)
+      tokenized.set(terms=len(terms.terms), entries=len(terms.indices))
+  return terms
+
+def count_comment_keywords(dataset, terms=None):
+  """Counts keywords of every comment, bucketed by week, from their document-term matrix (default: comment_terms)."""
+  comments = dataset.comments.dropna(subset=['comment_text'])
+  if terms is None:
+      terms = comment_terms(dataset)
+  return terms.keyword_counter(week_buckets(comments['timestamp']))
+
+# Topics of the comment texts (see topics.py), fitted online as chunks and appends arrive
+TOPIC_COUNT = int(os.environ.get("SCROLLMARK_TOPICS", 8)) # 0 disables topic modeling
+TOPIC_VOCABULARY = int(os.environ.get("SCROLLMARK_TOPIC_VOCABULARY", 5000)) # Terms kept, the most frequent first
+TOPIC_BATCH_SIZE = int(os.environ.get("SCROLLMARK_TOPIC_BATCH_SIZE", 2048)) # Comments per mini-batch
+
+def update_topics(dataset, terms, model=None):
+  """
+  Continues a copy of `model` with the dataset's comments (terms: their comment_terms), or
+  starts a model on them, counting each comment's sentiment under its topic. Returns None when
+  topic modeling is disabled.
+  """
+  if TOPIC_COUNT <= 0:
+      return None
+  report_progress("topics")
+  with span("topics", texts=len(terms)) as fitted:
+      model = model.copy() if model is not None else TopicModel.from_terms(terms, TOPIC_COUNT, TOPIC_VOCABULARY)
+      has_text = dataset.comments['comment_text'].notna().to_numpy()
+      model.partial_fit(terms, dataset.comments['sentiment'].to_numpy(dtype=object)[has_text], TOPIC_BATCH_SIZE)
+      fitted.set(vocabulary=len(model.vocabulary), matrix_bytes=terms.nbytes(), model_bytes=model.nbytes())
+  return model
 
+def aggregate_keywords(aggregates):
+  """Returns the keyword counts of every comment and each caption once, bucketed by week."""
+  counter = aggregates.keywords.copy()
+  captions = aggregates.captions()
+  for caption, bucket in zip(captions['media_caption'], week_buckets(captions['timestamp'])):
+      counter.add(caption, bucket)
+  return counter
 
 def extract_keywords(text_list, num_keywords=5):
   """Extracts top keywords from a list of texts."""
-  print("Extracting keywords...")
-  if not text_list:
-      return []
-  all_words = []
-  for text in tqdm(text_list, desc="Processing texts for keywords"): # Added tqdm
-      if isinstance(text, str):
-          # Simple tokenization and lowercasing, remove non-alphabetic
-          words = re.findall(r'\b[a-z]{3,}\b', text.lower())
-          all_words.extend(words)
-  
-  # Filter out common stopwords (can be expanded)
-  stopwords = set(['the', 'and', 'is', 'in', 'it', 'to', 'of', 'for', 'on', 'with', 'a', 'an', 'that', 'this', 'are', 'be', 'as', 'by', 'at', 'from', 'or', 'was', 'has', 'had', 'not', 'but', 'what', 'when', 'where', 'who', 'how', 'why', 'which', 'you', 'we', 'they', 'i', 'me', 'he', 'she', 'it', 'us', 'them', 'my', 'your', 'his', 'her', 'its', 'our', 'their', 'can', 'will', 'would', 'should', 'could', 'do', 'did', 'done', 'get', 'got', 'go', 'goes', 'went', 'make', 'made', 'making', 'say', 'says', 'said', 'see', 'sees', 'saw', 'take', 'takes', 'took', 'come', 'comes', 'came', 'know', 'knows', 'knew', 'think', 'thinks', 'thought', 'look', 'looks', 'looked', 'want', 'wants', 'wanted', 'use', 'uses', 'used', 'find', 'finds', 'found', 'give', 'gives', 'gave', 'tell', 'tells', 'told', 'ask', 'asks', 'asked', 'work', 'works', 'worked', 'seem', 'seems', 'seemed', 'feel', 'feels', 'felt', 'try', 'tries', 'tried', 'leave', 'leaves', 'left', 'call', 'calls', 'called', 'good', 'great', 'new', 'just', 'like', 'very', 'much', 'also', 'about', 'into', 'through', 'down', 'up', 'out', 'back', 'over', 'under', 'then', 'than', 'there', 'here', 'when', 'where', 'why', 'how', 'all', 'any', 'both', 'each', 'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'only', 'own', 'same', 'so', 'too', 'very', 's', 't', 'don', 've', 'm', 'd', 'll', 're', 'y', 'ain', 'aren', 'couldn', 'didn', 'doesn', 'hadn', 'hasn', 'haven', 'isn', 'ma', 'mightn', 'mustn', 'needn', 'shan', 'shouldn', 'wasn', 'weren', 'won', 'wouldn'])
-  filtered_words = [word for word in all_words if word not in stopwords]
-
-  word_counts = Counter(filtered_words)
-  print("Keywords extracted.")
-  return [{"topic": word, "engagement": count} for word, count in word_counts.most_common(num_keywords)]
-
-def generate_llm_recommendation(summary_data):
-  """Generates AI-powered recommendations using a text generation model."""
-  print("Generating LLM recommendations...")
-  if not generator:
-      print("LLM generator not loaded, returning mock recommendations.")
-      return [
-          {"type": "Optimal Timing", "title": "Post between 2-4 PM on weekdays", "description": "Schedule posts for peak audience activity to maximize visibility.", "priority": "High", "icon": "Clock", "color": "text-blue-500", "action": "Schedule post for 3:00 PM today"},
-          {"type": "Content Type", "title": "Incorporate short-form video content", "description": "Short videos generate 2.3x more engagement than images. Use trending audio.", "priority": "Medium", "icon": "Target", "color": "text-green-500", "action": "Create a TikTok-style video about a recent product update"},
-      ]
-  
-  prompt = f"""Based on the following social media analytics data, provide 3 actionable recommendations to improve engagement and reach:
-  Total Posts: {summary_data.get('total_posts', 'N/A')}
-  Total Comments: {summary_data.get('total_comments', 'N/A')}
-  Top Performing Posts (by comments): {', '.join([p['media_caption'] or p['media_id'] for p in summary_data.get('top_performing_posts', [])[:2]])}
-  Overall Sentiment: {summary_data.get('overall_sentiment', {}).get('overall', 'N/A')}
-  
-  Recommendations:
+  counter = count_keywords(text_list)
+  return [{"topic": word, "engagement": count} for word, count in counter.top(num_keywords)]
+
+# Buyer intent keywords, their score weight and the intent category each one signals
+INTENT_KEYWORDS = {
+    "high": ["buy", "price", "cost", "demo", "trial", "subscribe", "plan", "quote", "integrate", "how to get", "purchase", "pricing"],
+    "medium": ["feature", "solution", "problem", "help", "support", "learn more", "interested", "compare"],
+    "low": ["question", "feedback", "review", "thoughts", "what is"]
+}
+INTENT_WEIGHTS = {"high": 10, "medium": 5, "low": 1}
+INTENT_KEYWORD_CATEGORIES = {
+    "price": "Pricing Questions", "pricing": "Pricing Questions", "cost": "Pricing Questions", "quote": "Pricing Questions",
+    "demo": "Demo/Purchase Intent", "trial": "Demo/Purchase Intent", "subscribe": "Demo/Purchase Intent", "buy": "Demo/Purchase Intent", "purchase": "Demo/Purchase Intent",
+    "integrate": "Integration Inquiry",
+    "feature": "Feature Requests", "solution": "Feature Requests",
+    "help": "Support Inquiry", "support": "Support Inquiry",
+    "question": "General Inquiry/Feedback", "feedback": "General Inquiry/Feedback", "review": "General Inquiry/Feedback",
+}
+
+# Each keyword owns one bit of a row's intent mask
+INTENT_KEYWORD_LIST = [keyword for keywords in INTENT_KEYWORDS.values() for keyword in keywords]
+INTENT_KEYWORD_BITS = {keyword: 1 << i for i, keyword in enumerate(INTENT_KEYWORD_LIST)}
+INTENT_KEYWORD_WEIGHTS = {keyword: INTENT_WEIGHTS[level] for level, keywords in INTENT_KEYWORDS.items() for keyword in keywords}
+INTENT_CATEGORY_MASKS = {}
+for _keyword, _category in INTENT_KEYWORD_CATEGORIES.items():
+  INTENT_CATEGORY_MASKS[_category] = INTENT_CATEGORY_MASKS.get(_category, 0) | INTENT_KEYWORD_BITS[_keyword]
+
+def compile_keyword_pattern(keywords):
   """
-  try:
-      # Generate text, limiting length to avoid overly long responses
-      generated_text = generator(prompt, max_new_tokens=150, num_return_sequences=1, truncation=True)[0]['generated_text']
-      
-      # Parse the generated text into structured recommendations
-      recommendations = []
-      # Simple parsing: split by line and try to extract title/description
-      lines = generated_text.split('\n')
-      for line in lines:
-          line = line.strip()
-          if line and not line.startswith("Recommendations:"):
-              # Attempt to extract a title and description
-              if ':' in line:
-                  parts = line.split(':', 1)
-                  title = parts[0].strip()
-                  description = parts[1].strip()
-              else:
-                  title = line
-                  description = "No specific description provided by AI."
-              
-              # Assign a random priority, icon, and color for demonstration
-              priorities = ["High", "Medium", "Low"]
-              icons = ["Clock", "Target", "Lightbulb", "Wand2", "Calendar"]
-              colors = ["text-blue-500", "text-green-500", "text-orange-500", "text-teal-500", "text-purple-500"]
-              
-              recommendations.append({
-                  "type": "AI Insight",
-                  "title": title,
-                  "description": description,
-                  "priority": random.choice(priorities),
-                  "icon": random.choice(icons),
-                  "color": random.choice(colors),
-                  "action": f"Implement '{title}'"
-              })
-              if len(recommendations) >= 3: # Limit to 3 recommendations
-                  break
-      print("LLM recommendations generated.")
-      return recommendations if recommendations else generate_llm_recommendation({}) # Fallback if parsing fails
-  except Exception as e:
-      print(f"Error during LLM recommendation generation: {e}")
-      return generate_llm_recommendation({}) # Fallback to mock if LLM fails
+  Compiles all keywords into one regex that reports every (possibly overlapping) substring match.
+  The lookahead lets findall try every start position, so keywords inside or overlapping other
+  keywords are still found, matching plain `keyword in text` checks.
+  """
+  for keyword in keywords:
+      for other in keywords:
+          if keyword != other and other.startswith(keyword):
+              raise ValueError(f"Keyword '{keyword}' is a prefix of '{other}' and would be shadowed in the combined pattern.")
+  alternatives = "|".join(re.escape(keyword) for keyword in sorted(keywords, key=len, reverse=True))
+  return re.compile(f"(?=({alternatives}))")
+
+INTENT_PATTERN = compile_keyword_pattern(INTENT_KEYWORD_LIST)
 
-def analyze_buyer_intent(df):
+def parse_alert_keywords(setting):
   """
-  Analyzes buyer intent from comments and captions based on keywords.
-  Returns structured data for the buyer intent discovery section.
+  Parses the comma-separated SCROLLMARK_ALERT_KEYWORDS. A keyword that starts with another one
+  (e.g. 'leaking' after 'leak') can't share the combined pattern, so it is dropped with a
+  warning rather than failing startup; comments containing it still count for the shorter one.
   """
-  print("Analyzing buyer intent...")
-  intent_keywords = {
-      "high": ["buy", "price", "cost", "demo", "trial", "subscribe", "plan", "quote", "integrate", "how to get", "purchase", "pricing"],
-      "medium": ["feature", "solution", "problem", "help", "support", "learn more", "interested", "compare"],
-      "low": ["question", "feedback", "review", "thoughts", "what is"]
-  }
+  keywords = list(dict.fromkeys(keyword.strip().lower() for keyword in setting.split(",") if keyword.strip()))
+  kept = []
+  for keyword in keywords:
+      prefix = next((other for other in keywords if other != keyword and keyword.startswith(other)), None)
+      if prefix is None:
+          kept.append(keyword)
+      else:
+          log.warning(f"Ignoring alert keyword '{keyword}': it starts with alert keyword '{prefix}', which already matches it.")
+  return kept
 
-  all_texts = []
-  if 'comment_text' in df.columns:
-      all_texts.extend(df['comment_text'].dropna().tolist())
-  if 'media_caption' in df.columns:
-      all_texts.extend(df['media_caption'].dropna().tolist())
+# Spike alerts track these keywords' share of comments (see alerts.py); each owns one bit of a comment's alert mask
+ALERT_KEYWORDS = parse_alert_keywords(os.environ.get("SCROLLMARK_ALERT_KEYWORDS", "shipping,damaged,broken,refund,missing,never arrived,leak,rash,allergic"))
+ALERT_KEYWORD_BITS = {keyword: 1 << i for i, keyword in enumerate(ALERT_KEYWORDS)}
+ALERT_PATTERN = compile_keyword_pattern(ALERT_KEYWORDS) if ALERT_KEYWORDS else None
+ALERT_WINDOW_HOURS = int(os.environ.get("SCROLLMARK_ALERT_WINDOW_HOURS", 6)) # Sliding window compared with the baseline
+ALERT_BASELINE_HOURS = float(os.environ.get("SCROLLMARK_ALERT_BASELINE_HOURS", 72)) # Half-life of the baseline
+ALERT_THRESHOLD = float(os.environ.get("SCROLLMARK_ALERT_THRESHOLD", 3.0)) # z-score that opens an alert
+ALERT_MIN_COUNT = int(os.environ.get("SCROLLMARK_ALERT_MIN_COUNT", 5)) # Comments a series needs in the window to alert
 
-  intent_signals_raw = []
-  intent_categories_counts = Counter()
-  
+def match_keywords(texts, pattern, bits):
+  """Returns an int64 array with the keyword mask (see bits) of each text in a Series, in one pass of pattern."""
+  texts = pd.Series(texts, dtype=object).reset_index(drop=True)
+  masks = np.zeros(len(texts), dtype=np.int64)
+  if pattern is None:
+      return masks
+  found = texts.fillna('').astype(str).str.lower().str.findall(pattern).explode().dropna()
+  if not found.empty:
+      matches = pd.DataFrame({'row': found.index, 'bit': found.map(bits).astype(np.int64)}).drop_duplicates()
+      row_masks = matches.groupby('row')['bit'].sum() # Bits are distinct per row, so the sum is the bitwise OR
+      masks[row_masks.index.to_numpy()] = row_masks.to_numpy()
+  return masks
+
+def match_intent_keywords(texts):
+  """Returns an int64 array with the intent keyword mask of each text in a Series."""
+  return match_keywords(texts, INTENT_PATTERN, INTENT_KEYWORD_BITS)
+
+def intent_scores(masks):
+  """Returns the summed keyword weights for an array of intent masks."""
+  scores = np.zeros(len(masks), dtype=np.int64)
+  for keyword, bit in INTENT_KEYWORD_BITS.items():
+      scores += ((masks & bit) != 0) * INTENT_KEYWORD_WEIGHTS[keyword]
+  return scores
+
+def intent_signals(mask):
+  """Returns the signal list for one intent mask."""
+  return [f"Keyword: '{keyword}'" for keyword, bit in INTENT_KEYWORD_BITS.items() if mask & bit]
+
+def match_dataset_intent(dataset):
+  """
+  Matches intent keywords once per comment and once per caption, as the comment_mask and
+  caption_mask columns (kept when already present, e.g. for a stored dataset).
+  A row's intent is its comment_mask combined with its post's caption_mask.
+  """
+  report_progress("buyer_intent")
+  with span("buyer_intent", rows=len(dataset.comments)):
+      if 'comment_mask' not in dataset.comments.columns:
+          dataset.comments['comment_mask'] = match_intent_keywords(dataset.comments['comment_text'])
+      if 'caption_mask' not in dataset.posts.columns:
+          dataset.posts['caption_mask'] = match_intent_keywords(dataset.posts['media_caption'])
+
+def match_dataset_alerts(dataset):
+  """Matches the alert keywords once per comment, as the alert_mask column (kept when already present)."""
+  with span("alert_keywords", rows=len(dataset.comments)):
+      if 'alert_mask' not in dataset.comments.columns:
+          dataset.comments['alert_mask'] = match_keywords(dataset.comments['comment_text'], ALERT_PATTERN, ALERT_KEYWORD_BITS)
+
+def analyze_buyer_intent(aggregates):
+  """
+  Analyzes buyer intent from the intent groups of the aggregates.
+  Returns structured data for the buyer intent discovery section.
+  """
   # Use media_id as a proxy for user for high_intent_users_count
-  user_intent_scores = {} # {media_id: score}
-  user_last_activity = {} # {media_id: timestamp}
-
-  for index, row in tqdm(df.iterrows(), total=df.shape[0], desc="Analyzing buyer intent signals"): # Added tqdm
-      media_id = row.get('media_id', f"post_{index}")
-      comment_text = str(row.get('comment_text', '')).lower()
-      media_caption = str(row.get('media_caption', '')).lower()
-      timestamp = row.get('timestamp')
-
-      current_score = 0
-      signals_found = []
-      categories_found = set()
-
-      # Check for high intent keywords
-      for keyword in intent_keywords["high"]:
-          if keyword in comment_text or keyword in media_caption:
-              current_score += 10
-              signals_found.append(f"Keyword: '{keyword}'")
-              if keyword in ["price", "pricing", "cost", "quote"]: categories_found.add("Pricing Questions")
-              elif keyword in ["demo", "trial", "subscribe", "buy", "purchase"]: categories_found.add("Demo/Purchase Intent")
-              elif keyword in ["integrate"]: categories_found.add("Integration Inquiry")
-
-      # Check for medium intent keywords
-      for keyword in intent_keywords["medium"]:
-          if keyword in comment_text or keyword in media_caption:
-              current_score += 5
-              signals_found.append(f"Keyword: '{keyword}'")
-              if keyword in ["feature", "solution"]: categories_found.add("Feature Requests")
-              elif keyword in ["help", "support"]: categories_found.add("Support Inquiry")
-
-      # Check for low intent keywords
-      for keyword in intent_keywords["low"]:
-          if keyword in comment_text or keyword in media_caption:
-              current_score += 1
-              signals_found.append(f"Keyword: '{keyword}'")
-              if keyword in ["question", "feedback", "review"]: categories_found.add("General Inquiry/Feedback")
-
-      if current_score > 0:
-          # Aggregate score per user (media_id)
-          user_intent_scores[media_id] = max(user_intent_scores.get(media_id, 0), current_score)
-          if pd.notna(timestamp):
-              user_last_activity[media_id] = max(user_last_activity.get(media_id, timestamp), timestamp)
-
-          # Add to raw signals for detailed list
-          if signals_found:
-              text_sample = comment_text if comment_text else media_caption
-              intent_signals_raw.append({
-                  "user": f"@{str(media_id)[:8]}...", # Use a truncated media_id as user handle
-                  "intent": "High" if current_score >= 10 else ("Medium" if current_score >= 5 else "Low"),
-                  "score": min(100, current_score * 5), # Scale score to 0-100
-                  "signals": list(set(signals_found)), # Unique signals
-                  "lastActivity": (datetime.now() - timestamp).days, # Days ago (both are now naive)
-                  "predictedValue": f"${int(min(100, current_score * 5) * 15 + random.uniform(-50, 50)):,}" # Scale score to 0-100 and then calculate value
-              })
-          
-          for cat in categories_found:
-              intent_categories_counts[cat] += 1
-
-  # Sort intent signals by score
-  intent_signals_raw.sort(key=lambda x: x['score'], reverse=True)
-  
-  high_intent_users_count = sum(1 for score in user_intent_scores.values() if score >= 10) # Users with score >= 10
-  active_prospects = len(user_intent_scores) # All users with any intent signal
+  high_intent_users_count, active_prospects, intent_categories_counts, signals = aggregates.intent(intent_scores, INTENT_CATEGORY_MASKS)
+
+  # Top signals by scaled score, ties kept in row order
+  intent_signals_raw = []
+  for user, score, mask, timestamp in signals:
+      scaled_score = min(100, score * 5) # Scale score to 0-100
+      intent_signals_raw.append({
+          "user": f"@{str(user)[:8]}...", # Use a truncated media_id as user handle
+          "intent": "High" if score >= 10 else ("Medium" if score >= 5 else "Low"),
+          "score": int(scaled_score),
+          "signals": intent_signals(mask),
+          "lastActivity": (datetime.now() - pd.Timestamp(timestamp)).days if pd.notna(timestamp) else None, # Days ago (both are now naive)
+          "predictedValue": f"${int(scaled_score * 15 + random.uniform(-50, 50)):,}" # Calculate value from the 0-100 score
+      })
 
   # Dynamic predicted revenue and conversion rate based on high intent users
   predicted_revenue = f"${int(high_intent_users_count * 250 + random.uniform(0, 5000)):,}" if high_intent_users_count > 0 else "$0"
@@ -271,13 +586,12 @@ def analyze_buyer_intent(df):
   elif not next_best_actions: # Default if no intent detected
       next_best_actions.append({"action": "Engage with top posts", "users": 0, "priority": "Low", "expectedLift": "+5-10% engagement"})
 
-  print("Buyer intent analysis complete.")
   return {
       "high_intent_users_count": int(high_intent_users_count),
       "predicted_revenue": predicted_revenue,
       "conversion_rate": conversion_rate,
       "active_prospects": int(active_prospects),
-      "intent_signals": intent_signals_raw[:5], # Limit to top 5 for display
+      "intent_signals": intent_signals_raw, # Top 5 for display
       "conversion_predictions": conversion_predictions,
       "intent_categories": intent_categories_data,
       "intent_signal_trends": generate_mock_trends(datetime.now() - timedelta(days=30), 5, int(high_intent_users_count / 2), int(high_intent_users_count / 10)),
@@ -285,324 +599,1438 @@ def analyze_buyer_intent(df):
   }
 
 
+def analysis_fingerprint():
+  """
+  Describes how stored results were produced. Stored per-row results and aggregates are only
+  reused while it matches the running code and models.
+  """
+  return {"sentiment_model": SENTIMENT_CACHE_MODEL_KEY, "intent_keywords": INTENT_KEYWORD_LIST, "alert_keywords": ALERT_KEYWORDS, "topics": [TOPIC_COUNT, TOPIC_VOCABULARY, TOPIC_BATCH_SIZE], "aggregates": AGGREGATES_VERSION}
+
+def row_keys(rows):
+  """Returns a 64-bit hash of each row's (media_id, timestamp, comment_text), the key appended rows are deduplicated by."""
+  return pd.util.hash_pandas_object(pd.DataFrame({
+      'media_id': rows['media_id'].astype(object).fillna('').astype(str).to_numpy(dtype=object),
+      'timestamp': rows['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64),
+      'comment_text': rows['comment_text'].astype(object).fillna('').astype(str).to_numpy(dtype=object),
+  }), index=False).to_numpy()
+
+def stored_rows(dataset):
+  """Returns the dataset's rows as they are stored: the export columns plus the dedupe key and per-row results."""
+  comments = dataset.comments
+  stored = pd.DataFrame({
+      'timestamp': comments['timestamp'],
+      'media_id': comments['media_id'].astype(object),
+      'media_caption': np.append(dataset.posts['media_caption'].to_numpy(dtype=object), None)[dataset.post_codes()], # The post's caption, as in the export (None without a post)
+      'comment_text': comments['comment_text'],
+      'username': comments['username'],
+      'row_key': row_keys(comments),
+      'comment_mask': comments['comment_mask'],
+      'alert_mask': comments['alert_mask'],
+  })
+  if dataset.sentiment_model is not None:
+      stored['sentiment'] = comments['sentiment'].astype(object)
+  return stored
+
+def dataset_meta(sentiment_model):
+  """Returns the meta stored with a dataset whose sentiment labels came from sentiment_model (None if mocked)."""
+  return {**analysis_fingerprint(), "sentiment_model": sentiment_model} # Mocked labels leave the dataset to be rescored
+
+def store_dataset(dataset, aggregates, append=False):
+  """
+  Saves the dataset's rows with their per-row results, and the aggregates, to the dataset store.
+  A dataset that was loaded from the store replaces its stored rows, or adds to them with append.
+  Returns the dataset id, or None if the store is disabled or the save fails.
+  """
+  if dataset_store is None:
+      return None
+  try:
+      with span("store", rows=len(dataset.comments)):
+          dataset.dataset_id = dataset_store.save(aggregates.to_tables(), stored_rows(dataset), dataset_meta(dataset.sentiment_model), dataset.dataset_id, append=append)
+  except Exception as e:
+      log.error(f"Could not store dataset: {e}")
+      return None
+  return dataset.dataset_id
+
+def load_dataset(dataset_id, meta=None):
+  """
+  Loads a stored dataset's rows, with the per-row results that are still valid for the current
+  models and keywords. Raises KeyError for unknown ids.
+  """
+  meta = meta or dataset_store.meta(dataset_id)
+  stored = dataset_store.load_comments(dataset_id, meta=meta)
+  rows = stored.reindex(columns=CSV_COLUMNS) # Datasets stored before the username column have no username
+  rows['timestamp'] = rows['timestamp'].astype('datetime64[ns]')
+  dataset = normalize_export(rows)
+  dataset.dataset_id = dataset_id
+  fingerprint = analysis_fingerprint()
+  if meta.get("sentiment_model") == fingerprint["sentiment_model"] and 'sentiment' in stored.columns:
+      dataset.comments['sentiment'] = pd.Categorical(stored['sentiment'].astype(object), categories=SENTIMENT_LABELS)
+      dataset.sentiment_model = meta["sentiment_model"]
+  if meta.get("intent_keywords") == fingerprint["intent_keywords"]:
+      dataset.comments['comment_mask'] = stored['comment_mask'].to_numpy(dtype=np.int64)
+  if meta.get("alert_keywords") == fingerprint["alert_keywords"] and 'alert_mask' in stored.columns:
+      dataset.comments['alert_mask'] = stored['alert_mask'].to_numpy(dtype=np.int64)
+  return dataset
+
+def is_stale(meta):
+  """True if a stored dataset's results were produced by other models, keywords or aggregate layouts."""
+  return any(meta.get(key) != value for key, value in analysis_fingerprint().items())
+
+def load_aggregates(dataset_id):
+  """
+  Returns (aggregates, meta) of a stored dataset. aggregates is None if they are stale and have to
+  be rebuilt from the rows. Raises KeyError for unknown ids.
+  """
+  meta = dataset_store.meta(dataset_id)
+  if is_stale(meta):
+      return None, meta
+  return AnalysisAggregates.from_tables(dataset_store.load_tables(dataset_id, meta)), meta
+
+def dataset_mentions(dataset):
+  """Returns a function giving the (text, sentiment) of comment texts by position, for sample_mentions."""
+  comments = dataset.comments[dataset.comments['comment_text'].notna()]
+  texts = comments['comment_text'].to_numpy(dtype=object)
+  labels = comments['sentiment'].to_numpy(dtype=object)
+  return lambda positions: [(texts[i], labels[i]) for i in positions]
+
+def stored_mentions(dataset_id, meta):
+  """Like dataset_mentions, reading only the sampled rows of a stored dataset."""
+  return lambda positions: dataset_store.take_texts(dataset_id, positions, 'comment_text', ['comment_text', 'sentiment'], meta)
+
+def analyze_dataset(dataset, sections=None):
+  """
+  Runs the analysis, stores the dataset with its results and aggregates, and returns the response
+  data with the given sections (default: all, see ANALYSIS_SECTIONS).
+  """
+  sentiment_stats = {}
+  aggregates = build_aggregates(dataset, stats=sentiment_stats)
+  response_data = render_analysis(aggregates, sample_mentions(aggregates, dataset_mentions(dataset)), sentiment_stats, sections)
+  store_dataset(dataset, aggregates)
+  response_data["dataset_id"] = dataset.dataset_id
+  return response_data
+
+def analyze_stored_dataset(dataset_id):
+  """
+  Returns the analysis of a stored dataset from its stored aggregates (see load_dataset_sections),
+  rebuilding (and storing again) aggregates that are stale. Raises KeyError for unknown ids.
+  """
+  meta = dataset_store.meta(dataset_id)
+  if is_stale(meta):
+      log.info(f"Stored results of dataset {dataset_id} are stale; rebuilding them.")
+      return analyze_dataset(load_dataset(dataset_id, meta))
+  response_data = load_dataset_sections(dataset_id).all()
+  response_data["dataset_id"] = dataset_id
+  return response_data
+
+def append_to_dataset(dataset_id, csv_source):
+  """
+  Adds the rows of a CSV export to a stored dataset, skipping rows already stored (same media_id,
+  timestamp and comment text). Only the new rows are scored and aggregated; their aggregates are
+  merged into the stored ones. Returns the updated analysis. Raises KeyError for unknown ids.
+  """
+  with dataset_store.lock(dataset_id): # Appends read, merge and rewrite the aggregates; other workers wait
+      meta = dataset_store.meta(dataset_id)
+      rows = read_csv_export(csv_source)
+      for column in CSV_COLUMNS:
+          if column not in rows.columns:
+              rows[column] = pd.NaT if column == 'timestamp' else None
+      is_new = ~dataset_store.contains(dataset_id, row_keys(rows), meta) # Searches each part's sorted key file, not every stored key
+      rows = rows[is_new].reset_index(drop=True)
+      log.info(f"Appending {len(rows)} new rows to dataset {dataset_id} ({int((~is_new).sum())} already stored).")
+
+      aggregates, meta = load_aggregates(dataset_id)
+      if len(rows) == 0:
+          response_data = analyze_stored_dataset(dataset_id)
+      elif aggregates is None:
+          # Stale aggregates can't be extended; rebuild them over the stored and new rows together
+          combined = pd.concat([dataset_store.load_comments(dataset_id, columns=CSV_COLUMNS, meta=meta), rows], ignore_index=True)
+          combined['timestamp'] = combined['timestamp'].astype('datetime64[ns]')
+          dataset = normalize_export(combined)
+          dataset.dataset_id = dataset_id
+          response_data = analyze_dataset(dataset)
+      else:
+          dataset = normalize_export(rows)
+          dataset.dataset_id = dataset_id
+          sentiment_stats = {}
+          aggregates = aggregates.merge(build_aggregates(dataset, offset=aggregates.rows, stats=sentiment_stats, topics=aggregates.topics))
+          store_dataset(dataset, aggregates, append=True)
+          response_data = render_analysis(aggregates, sample_mentions(aggregates, stored_mentions(dataset_id, dataset_store.meta(dataset_id))), sentiment_stats)
+          response_data["dataset_id"] = dataset_id
+  response_data["appended_rows"] = len(rows)
+  response_data["duplicate_rows"] = int((~is_new).sum())
+  return response_data
+
+def open_upload_stream(stream, content_encoding=None):
+  """Returns a binary stream over an uploaded CSV body, transparently decompressing gzip."""
+  if isinstance(stream, io.RawIOBase):
+      stream = io.BufferedReader(stream, buffer_size=UPLOAD_BUFFER_SIZE)
+  if content_encoding == 'gzip':
+      is_gzip = True
+  elif hasattr(stream, 'peek'):
+      is_gzip = stream.peek(2)[:2] == GZIP_MAGIC
+  elif stream.seekable():
+      is_gzip = stream.read(2) == GZIP_MAGIC
+      stream.seek(0)
+  else:
+      is_gzip = False
+  return gzip.GzipFile(fileobj=stream) if is_gzip else stream
+
+def prepare_chunk(rows):
+  """
+  Chunk worker: splits a chunk of export rows into a Dataset and computes everything that
+  doesn't need the sentiment model: features, the comments' document-term matrix and keyword
+  counts, intent and alert masks.
+  """
+  dataset = normalize_export(rows)
+  dataset.features()
+  terms = comment_terms(dataset)
+  keywords = count_comment_keywords(dataset, terms)
+  match_dataset_intent(dataset)
+  match_dataset_alerts(dataset)
+  return dataset, keywords, terms
+
+_chunk_executor = None
+_chunk_executor_lock = threading.Lock()
+
+def get_chunk_executor():
+  """Returns the process pool preparing chunks, started on first use, or None when CHUNK_WORKERS is 0."""
+  global _chunk_executor
+  if CHUNK_WORKERS <= 0:
+      return None
+  with _chunk_executor_lock:
+      if _chunk_executor is None:
+          # Spawned workers start clean instead of inheriting the server's threads and loaded models
+          _chunk_executor = ProcessPoolExecutor(CHUNK_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+          atexit.register(_chunk_executor.shutdown, cancel_futures=True)
+      return _chunk_executor
+
+def prepare_chunks(chunks):
+  """
+  Yields prepare_chunk's result for each chunk, in chunk order. Chunks are prepared in the worker
+  processes with at most one queued chunk per worker, so memory stays bounded by the chunk size.
+  """
+  executor = get_chunk_executor()
+  if executor is None:
+      yield from map(prepare_chunk, chunks)
+      return
+  pending = deque()
+  for chunk in chunks:
+      pending.append(executor.submit(prepare_chunk, chunk))
+      if len(pending) > CHUNK_WORKERS:
+          yield pending.popleft().result()
+  while pending:
+      yield pending.popleft().result()
+
+class MentionReservoir:
+  """Uniform random sample of k comment texts (with their sentiment) across chunks, for top mentions."""
+  def __init__(self, k=5):
+    self.k = k
+    self.keys = np.empty(0)
+    self.mentions = []
+
+  def add(self, dataset):
+    comments = dataset.comments[dataset.comments['comment_text'].notna()]
+    keys = np.random.random(len(comments))
+    keep = np.argsort(keys)[:self.k]
+    self._keep(np.concatenate([self.keys, keys[keep]]), self.mentions + list(zip(comments['comment_text'].to_numpy(dtype=object)[keep], comments['sentiment'].to_numpy(dtype=object)[keep])))
+
+  def _keep(self, keys, mentions):
+    order = np.argsort(keys)[:self.k] # The k smallest random keys are a uniform sample
+    self.keys = keys[order]
+    self.mentions = [mentions[i] for i in order]
+
+  def sample(self, aggregates):
+    """Returns the sample over the comment texts and each caption once, in random order."""
+    captions = aggregates.captions()
+    self._keep(np.concatenate([self.keys, np.random.random(len(captions))]), self.mentions + list(zip(captions['media_caption'], captions['caption_sentiment'])))
+    return self.mentions
+
+def analyze_csv(csv_source, sections=None):
+  """
+  Reads, analyzes and stores a CSV export chunk by chunk and returns the response data with the
+  given sections (default: all).
+  Each chunk is prepared in a worker process, scored, aggregated and merged into the running
+  aggregates, so exports larger than memory can be analyzed. An export that fits in one chunk
+  is analyzed in-process.
+  """
+  chunks = read_csv_chunks(csv_source)
+  first = next(chunks, pd.DataFrame(columns=CSV_COLUMNS))
+  second = next(chunks, None)
+  if second is None:
+      report_progress("parse")
+      with span("parse") as parsed:
+          dataset = normalize_export(first)
+          parsed.set(rows=len(dataset.comments), posts=len(dataset.posts))
+      return analyze_dataset(dataset, sections)
+
+  aggregates = None
+  reservoir = MentionReservoir()
+  sentiment_stats = Counter()
+  sentiment_models = set()
+  dataset_id = dataset_store.create() if dataset_store is not None else None
+  parts = []
+  for dataset, keywords, terms in prepare_chunks(itertools.chain([first, second], chunks)):
+      # Parsing, tokenizing, intent and alert matching ran in a chunk worker; this span covers the rest
+      with span("chunk", rows=len(dataset.comments)):
+          report_progress("sentiment")
+          chunk_stats = {}
+          dataset_sentiments(dataset, stats=chunk_stats)
+          sentiment_stats.update(chunk_stats)
+          sentiment_models.add(dataset.sentiment_model)
+          topics = update_topics(dataset, terms, aggregates.topics if aggregates else None)
+          with span("aggregate", rows=len(dataset.comments)):
+              chunk_aggregates = AnalysisAggregates.from_dataset(dataset, keywords, offset=aggregates.rows if aggregates else 0, topics=topics)
+              aggregates = chunk_aggregates if aggregates is None else aggregates.merge(chunk_aggregates)
+          reservoir.add(dataset)
+          if dataset_id is not None:
+              with span("store", rows=len(dataset.comments)):
+                  parts.append(dataset_store.write_part(dataset_id, stored_rows(dataset)))
+
+  response_data = render_analysis(aggregates, reservoir.sample(aggregates), dict(sentiment_stats), sections)
+  if dataset_id is not None:
+      sentiment_model = sentiment_models.pop() if len(sentiment_models) == 1 else None
+      try:
+          with span("commit"):
+              dataset_store.commit(dataset_id, aggregates.to_tables(), dataset_meta(sentiment_model), parts, aggregates.rows)
+      except Exception as e:
+          log.error(f"Could not store dataset: {e}")
+          dataset_id = None
+  response_data["dataset_id"] = dataset_id
+  return response_data
+
+# The fields each dashboard component renders (components/*.tsx, plus the recommendation id and
+# status app/page.tsx polls with). The dashboard view keeps only these; ?view=full sends everything.
+# A tuple keeps those keys of an object (or of each object in a list) whole; a dict filters them further.
+DASHBOARD_FIELDS = {
+    "engagement_metrics": {
+        "engagement_over_time": ("date", "posts", "comments"),
+        "peak_engagement_hours": ("hour", "activity"),
+        "top_performing_posts": ("media_id", "media_caption", "comments"),
+        "metrics_summary": ("title", "value", "change", "trend", "icon", "color"),
+        "engagement_by_post_type": ("type", "engagement"),
+    },
+    "publishing_recommendations": {
+        "best_posting_times": ("time", "engagement"),
+        "engagement_forecast": ("date", "value"),
+        "trending_topics": ("topic", "engagement"),
+        "ai_recommendations": ("type", "title", "description", "priority", "icon", "color", "action"),
+        "ai_recommendations_id": None,
+        "ai_recommendations_status": None,
+        "upcoming_posts": ("time", "content", "status"),
+    },
+    "diagnostic_metrics": {
+        "performance_trends": ("date", "posts", "comments"),
+        "current_metrics": ("title", "current", "previous", "trend", "target", "progress"),
+        "diagnostic_alerts": ("type", "title", "description", "action", "icon"),
+        "audience_insights": ("metric", "percentage", "change"),
+    },
+    "sentiment_analysis": {
+        "overall_sentiment": ("positive", "neutral", "negative", "overall"),
+        "sentiment_trends": ("period", "positive", "neutral", "negative"),
+        "advocacy_keywords": ("keyword", "mentions", "growth", "positive_pct", "negative_pct", "neutral_pct"),
+        "keyword_performance": ("keyword", "mentions"),
+        "topics": ("topic", "terms", "comments", "share", "positive", "neutral", "negative"),
+        "top_mentions": ("text", "sentiment", "engagement", "platform"),
+        "feature_sentiment": ("feature", "positive", "negative", "neutral"),
+        "customer_feedback_categories": ("category", "positive", "negative", "neutral"),
+        "sentiment_signals": ("signal", "insight"),
+        "product_features_sentiment": ("feature", "positive", "negative", "neutral", "praised", "painPoint"),
+    },
+    "virality_score": {
+        "virality_score_value": None,
+        "virality_factors": ("factor", "score", "description"),
+        "past_viral_posts": ("content", "score", "reach", "engagement", "shares", "date"),
+        "virality_trends": ("date", "value"),
+        "virality_tips": None,
+    },
+    "buyer_intent_discovery": {
+        "high_intent_users_count": None,
+        "predicted_revenue": None,
+        "conversion_rate": None,
+        "active_prospects": None,
+        "intent_signals": ("user", "intent", "score", "signals", "lastActivity", "predictedValue"),
+        "conversion_predictions": ("timeframe", "probability"),
+        "intent_categories": ("category", "count"),
+        "intent_signal_trends": ("date", "value"),
+        "next_best_actions": ("action", "users", "priority", "expectedLift"),
+    },
+    "advocate_identification": {
+        "community_health": ("metric", "value", "change", "icon"),
+        "top_advocates": ("user", "name", "tier", "score", "ugcCount", "engagement", "influence", "loyaltyPoints", "activities"),
+        "advocacy_tiers": ("tier", "count", "percentage", "color"),
+        "ugc_performance": ("date", "value"),
+        "advocate_performance_radar": ("metric", "score"),
+        "loyalty_program_performance": {
+            "points_distribution": ("activity", "points", "count"),
+            "reward_redemptions": ("reward", "redeemed", "points"),
+            "program_impact": ("metric", "value", "trend"),
+        },
+    },
+}
+
+def select_fields(value, fields):
+  """Returns value with only the given fields (see DASHBOARD_FIELDS) of an object, or of each object in a list."""
+  if fields is None:
+      return value
+  if isinstance(value, list):
+      return [select_fields(item, fields) for item in value]
+  if not isinstance(value, dict):
+      return value
+  fields = dict.fromkeys(fields) if isinstance(fields, tuple) else fields
+  return {key: select_fields(value[key], subfields) for key, subfields in fields.items() if key in value}
+
+def dashboard_view(response_data):
+  """Returns the response data with its sections trimmed to DASHBOARD_FIELDS. Other top-level fields (e.g. dataset_id) are kept."""
+  return {key: select_fields(value, DASHBOARD_FIELDS.get(key)) for key, value in response_data.items()}
+
+def pipeline_version():
+  """Identifies the code and models behind a response; part of every response cache key."""
+  version = {**analysis_fingerprint(), "response": RESPONSE_VERSION, "sentiment_mocked": sentiment_model.is_mocked(), "generation_mocked": generation_model.is_mocked()}
+  return content_hash(json.dumps(version, sort_keys=True))[:16]
+
+def cache_responses(key, response_data):
+  """Stores the dashboard and full views of response data under key and returns them as {view: CachedResponse}."""
+  return response_cache.put(key, {"dashboard": dashboard_view(response_data), "full": response_data}, info={"dataset_id": response_data.get("dataset_id")})
+
+def cached_responses(key):
+  """Returns the cached {view: CachedResponse} under key, or None. Responses naming a deleted dataset are dropped."""
+  responses = response_cache.get(key)
+  CACHE_REQUESTS.labels("response", "miss" if responses is None else "hit").inc()
+  dataset_id = responses["full"].info.get("dataset_id") if responses is not None else None
+  if dataset_id is not None and dataset_store is not None:
+      try:
+          dataset_store.meta(dataset_id)
+      except KeyError:
+          response_cache.discard(key)
+          return None
+  return responses
+
+def send_cached(responses, recorded=None):
+  """
+  Returns the Flask response for cached responses, in the view asked for by ?view= (dashboard or
+  full) and the smallest encoding the client accepts. GET requests whose If-None-Match holds
+  the view's ETag get 304 Not Modified. With ?debug=1 the payload is sent uncached, with the
+  spans of `recorded` (default: the current request's trace) in its `debug` field.
+  """
+  cached = responses.get(request.args.get('view', 'dashboard'), responses["dashboard"])
+  if request.args.get('debug') == '1':
+      recorded = recorded or current_trace()
+      payload = json.loads(cached.bodies["identity"])
+      payload["debug"] = {"spans": recorded.to_list() if recorded is not None else []}
+      return jsonify(payload)
+  headers = {"Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+  if request.method in ('GET', 'HEAD') and request.if_none_match.contains_weak(cached.etag):
+      response = Response(status=304, headers=headers)
+  else:
+      encoding = cached.encoding_for({encoding for encoding, _ in request.accept_encodings})
+      response = Response(cached.bodies[encoding], mimetype='application/json', headers=headers)
+      if encoding != "identity":
+          response.headers["Content-Encoding"] = encoding
+  response.set_etag(cached.etag, weak=True) # Weak: every encoding of a view shares its ETag
+  return response
+
+def spool_upload():
+  """
+  Copies the CSV from the current request (JSON csv_data, raw/gzip body or multipart `file`)
+  into a temporary file so it can be parsed after the request returns, hashing it on the way.
+  Returns (file path, sha256 of the body), or (None, None) if the request carries no CSV.
+
+  Parsing starts only once the whole body is spooled, on purpose: a job outlives its request,
+  and the response cache is keyed by the body's hash, which is known only at its end, so a
+  repeated upload is answered before any parsing. The spool is then parsed in blocks, so memory
+  stays bounded; the cost is that receiving and parsing a large upload don't overlap.
+  """
+  if request.is_json:
+      csv_content = request.json.get('csv_data')
+      if not csv_content:
+          return None, None
+      source = io.BytesIO(csv_content.encode('utf-8'))
+  elif request.mimetype == 'multipart/form-data':
+      upload = request.files.get('file')
+      if upload is None:
+          return None, None
+      source = upload.stream
+  else:
+      source = request.stream
+  # Gzip bodies are kept compressed on disk; open_upload_stream detects them by their magic bytes
+  digest = hashlib.sha256()
+  with tempfile.NamedTemporaryFile(prefix="scrollmark-upload-", suffix=".csv", delete=False) as spool:
+      try:
+          while block := source.read(UPLOAD_BUFFER_SIZE):
+              digest.update(block)
+              spool.write(block)
+      except BaseException: # e.g. the client disconnected mid-upload
+          os.remove(spool.name)
+          raise
+  if os.path.getsize(spool.name) == 0:
+      os.remove(spool.name)
+      return None, None
+  return spool.name, digest.hexdigest()
+
+def requested_sections():
+  """
+  Returns the sections named by the request's ?sections= (comma-separated), or None for all of them.
+  All sections are returned when the dataset store is disabled, since the others could not be
+  fetched later. Raises ValueError for unknown section names.
+  """
+  names = [name for name in request.args.get('sections', '').split(',') if name]
+  unknown = set(names) - set(ANALYSIS_SECTIONS)
+  if unknown:
+      raise ValueError(f"Unknown sections {', '.join(sorted(unknown))}; expected some of {', '.join(ANALYSIS_SECTIONS)}")
+  return tuple(names) if names and dataset_store is not None else None
+
+def run_analysis_job(path, upload_hash, sections=None, limiter=None):
+  """
+  Job body: returns the cached responses for a spooled upload, or analyzes it chunk by chunk and
+  caches the result. The spool is deleted either way. Returns {view: CachedResponse}. With a
+  limiter, only the analysis itself waits for (and may be refused) an inference slot.
+  """
+  try:
+      key = f"upload:{upload_hash}:{','.join(sections or ANALYSIS_SECTIONS)}:{pipeline_version()}"
+      responses = cached_responses(key)
+      if responses is not None:
+          log.info(f"Serving cached analysis of upload {upload_hash[:12]}.")
+          return responses
+      with limiter or contextlib.nullcontext(), open(path, 'rb') as raw:
+          response_data = analyze_csv(open_upload_stream(raw), sections)
+      return cache_responses(key, response_data)
+  finally:
+      os.remove(path)
+
+def analyze_spooled_upload():
+  """Spools the request's CSV, analyzes it (or reuses the cached analysis) and returns the Flask response."""
+  try:
+      sections = requested_sections()
+  except ValueError as e:
+      return jsonify({"error": str(e)}), 400
+  path, upload_hash = spool_upload()
+  if path is None:
+      log.warning("No CSV data provided.")
+      return jsonify({"error": "No CSV data provided"}), 400
+  try:
+      responses = run_analysis_job(path, upload_hash, sections, inference_limiter)
+  except CSVParseError as e:
+      log.warning(f"Error parsing CSV: {e}")
+      return jsonify({"error": f"Failed to parse CSV: {str(e)}"}), 400
+  return send_cached(responses)
+
 @app.route('/analyze', methods=['POST'])
 def analyze_data():
   """
-  Receives CSV data, processes it, and returns structured analytics.
+  Receives CSV data embedded in a JSON body, processes it, and returns structured analytics.
+  Large exports should use /analyze/upload instead.
   """
-  print(f"[{datetime.now()}] Received /analyze request.")
   if not request.is_json:
-      print(f"[{datetime.now()}] Error: Request must be JSON.")
+      log.warning("Request must be JSON.")
       return jsonify({"error": "Request must be JSON"}), 400
+  return analyze_spooled_upload()
+
+@app.route('/analyze/upload', methods=['POST'])
+def analyze_upload():
+  """
+  Receives a CSV export as a raw request body (plain or gzip-compressed) or as a multipart
+  `file` field, spools it to disk while hashing it, and returns structured analytics. A body
+  analyzed before is answered from the response cache.
+  """
+  if request.mimetype == 'multipart/form-data' and 'file' not in request.files:
+      log.warning("No CSV file provided.")
+      return jsonify({"error": "No CSV file provided in the 'file' field"}), 400
+  return analyze_spooled_upload()
 
-  csv_content = request.json.get('csv_data')
-  if not csv_content:
-      print(f"[{datetime.now()}] Error: No CSV data provided.")
+@app.route('/jobs', methods=['POST'])
+def submit_analysis_job():
+  """
+  Queues an analysis of the posted CSV (same body formats as /analyze and /analyze/upload)
+  and returns its job id immediately. ?sections= limits the result to some sections; the others
+  can be fetched later from /datasets/<dataset_id>/sections/<section>.
+  """
+  try:
+      sections = requested_sections()
+  except ValueError as e:
+      return jsonify({"error": str(e)}), 400
+  path, upload_hash = spool_upload()
+  if path is None:
+      log.warning("No CSV data provided.")
       return jsonify({"error": "No CSV data provided"}), 400
+  try:
+      job = analysis_jobs.submit(run_analysis_job, path, upload_hash, sections)
+  except RuntimeError as e: # The job executor has shut down; run_analysis_job will never remove the spool
+      os.remove(path)
+      log.warning(f"Refusing analysis job: {e}")
+      return jsonify({"error": "Server is shutting down; retry the upload later"}), 503, {"Retry-After": "30"}
+  except BaseException:
+      os.remove(path)
+      raise
+  log.info(f"Queued analysis job {job.id}.")
+  return jsonify({
+      **job.snapshot(),
+      "status_url": f"/jobs/{job.id}",
+      "events_url": f"/jobs/{job.id}/events",
+      "result_url": f"/jobs/{job.id}/result",
+  }), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_analysis_job(job_id):
+  """Returns the status, current stage and progress (percent) of a job."""
+  job = analysis_jobs.get(job_id)
+  if job is None:
+      return jsonify({"error": "Unknown job"}), 404
+  if request.args.get('debug') == '1':
+      return jsonify({**job.snapshot(), "debug": {"spans": job.trace.to_list() if job.trace is not None else []}})
+  return jsonify(job.snapshot())
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def stream_analysis_job(job_id):
+  """
+  Streams job status changes as Server-Sent Events until the job finishes. A job another worker
+  runs is followed through the shared state, polled every jobs.JOB_POLL_SECONDS.
+  """
+  job = analysis_jobs.get(job_id)
+  if job is None:
+      return jsonify({"error": "Unknown job"}), 404
+
+  def events():
+      version = None
+      while True:
+          current = job.wait_for_change(version, timeout=15)
+          if current == version:
+              yield ": keep-alive\n\n" # Nothing changed; keep proxies from closing the connection
+              continue
+          version = current
+          snapshot = job.snapshot()
+          yield f"data: {json.dumps(snapshot)}\n\n"
+          if snapshot["status"] in ("done", "failed"):
+              return
+
+  return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_analysis_job_result(job_id):
+  """
+  Returns the finished analysis payload (with an ETag, see send_cached), 202 while the job is
+  still running, or the job's error.
+  """
+  job = analysis_jobs.get(job_id)
+  if job is None:
+      return jsonify({"error": "Unknown job"}), 404
+  if job.status == "done":
+      return send_cached(job.result, job.trace)
+  if job.status == "failed":
+      return jsonify({"error": f"Analysis failed: {job.error}"}), 500
+  return jsonify(job.snapshot()), 202
 
+@app.route('/datasets', methods=['GET'])
+def list_datasets():
+  """Lists the stored datasets, most recently updated first."""
+  if dataset_store is None:
+      return jsonify({"error": "Dataset store is disabled"}), 404
+  return jsonify({"datasets": dataset_store.list()})
+
+@app.route('/datasets/<dataset_id>', methods=['GET'])
+def get_dataset(dataset_id):
+  """Returns a stored dataset's metadata."""
+  if dataset_store is None:
+      return jsonify({"error": "Dataset store is disabled"}), 404
   try:
-      df = parse_csv_data(csv_content)
-  except Exception as e:
-      print(f"[{datetime.now()}] Error parsing CSV: {str(e)}")
+      return jsonify(dataset_store.meta(dataset_id))
+  except KeyError:
+      return jsonify({"error": "Unknown dataset"}), 404
+
+@app.route('/datasets/<dataset_id>', methods=['DELETE'])
+def delete_dataset(dataset_id):
+  if dataset_store is None:
+      return jsonify({"error": "Dataset store is disabled"}), 404
+  try:
+      dataset_store.delete(dataset_id)
+  except KeyError:
+      return jsonify({"error": "Unknown dataset"}), 404
+  return jsonify({"deleted": dataset_id})
+
+@app.route('/datasets/<dataset_id>/analysis', methods=['GET'])
+def get_dataset_analysis(dataset_id):
+  """
+  Returns the analysis of a stored dataset, reading its stored columns and per-row results
+  instead of re-parsing the CSV and re-running inference.
+  """
+  if dataset_store is None:
+      return jsonify({"error": "Dataset store is disabled"}), 404
+  try:
+      key = f"dataset:{dataset_id}:{dataset_store.meta(dataset_id)['tables']}:{pipeline_version()}"
+      responses = cached_responses(key) or cache_responses(key, analyze_stored_dataset(dataset_id))
+  except KeyError:
+      return jsonify({"error": "Unknown dataset"}), 404
+  return send_cached(responses)
+
+DATASET_SECTIONS_CACHE_SIZE = 16 # Stored datasets whose sections and intermediates are kept in memory
+
+@functools.lru_cache(maxsize=DATASET_SECTIONS_CACHE_SIZE)
+def _dataset_sections(dataset_id, tables_version):
+  aggregates, meta = load_aggregates(dataset_id)
+  if aggregates is None:
+      log.info(f"Stored results of dataset {dataset_id} are stale; rebuilding them in memory.")
+      dataset = load_dataset(dataset_id, meta)
+      sentiment_stats = {}
+      aggregates = build_aggregates(dataset, stats=sentiment_stats)
+      mentions = sample_mentions(aggregates, dataset_mentions(dataset)) # Sampled now so the rows aren't kept
+      return AnalysisSections(aggregates, lambda: mentions, sentiment_stats)
+  texts = aggregates.text_count()
+  return AnalysisSections(aggregates, lambda: sample_mentions(aggregates, stored_mentions(dataset_id, meta)), {"texts": texts, "stored_labels": texts})
+
+def load_dataset_sections(dataset_id):
+  """
+  Returns the AnalysisSections of a stored dataset, built once per version of its stored tables
+  (an append or rebuild stores a new version). Raises KeyError for unknown ids.
+  """
+  return _dataset_sections(dataset_id, dataset_store.meta(dataset_id)["tables"])
+
+def load_rollup_index(dataset_id):
+  """Returns the RollupIndex of a stored dataset (see load_dataset_sections). Raises KeyError for unknown ids."""
+  return load_dataset_sections(dataset_id).rollup()
+
+@app.route('/datasets/<dataset_id>/sections/<section>', methods=['GET'])
+def get_dataset_section(dataset_id, section):
+  """
+  Returns one dashboard section of a stored dataset's analysis, e.g. engagement_metrics, as
+  {"dataset_id", <section>: payload}. Only that section and the intermediates it needs are
+  computed, so the engagement tab never waits for sentiment sampling or the LLM.
+  """
+  if dataset_store is None:
+      return jsonify({"error": "Dataset store is disabled"}), 404
+  if section not in ANALYSIS_SECTIONS:
+      return jsonify({"error": f"Unknown section; expected one of {', '.join(ANALYSIS_SECTIONS)}"}), 404
+  try:
+      sections = load_dataset_sections(dataset_id)
+      key = f"section:{dataset_id}:{dataset_store.meta(dataset_id)['tables']}:{section}:{pipeline_version()}"
+  except KeyError:
+      return jsonify({"error": "Unknown dataset"}), 404
+  responses = cached_responses(key) or cache_responses(key, {"dataset_id": dataset_id, section: sections.section(section)})
+  return send_cached(responses)
+
+@app.route('/datasets/<dataset_id>/authors/<author>', methods=['GET'])
+def get_dataset_author(dataset_id, author):
+  """
+  Returns one commenter's history in a stored dataset: comments, sentiment mix, buyer intent,
+  active days, first and last activity, advocacy score and comments per active day. Answered
+  from the dataset's author rollup, without reading rows.
+  """
+  if dataset_store is None:
+      return jsonify({"error": "Dataset store is disabled"}), 404
+  try:
+      advocates = load_dataset_sections(dataset_id).advocates()
+  except KeyError:
+      return jsonify({"error": "Unknown dataset"}), 404
+  found = advocates.lookup(normalize_usernames(pd.Series([author])).iat[0])
+  if found is None:
+      return jsonify({"error": "Unknown author"}), 404
+  return jsonify({"dataset_id": dataset_id, "author": found})
+
+@app.route('/datasets/<dataset_id>/alerts', methods=['GET'])
+def get_dataset_alerts(dataset_id):
+  """
+  Replays spike alerts over a stored dataset's history from its hourly aggregates, with the
+  configured settings or the ones given (window_hours, baseline_hours, threshold, min_count),
+  so settings can be backtested without reading rows.
+  """
+  if dataset_store is None:
+      return jsonify({"error": "Dataset store is disabled"}), 404
+  try:
+      settings = {
+          "window_hours": int(request.args.get('window_hours', ALERT_WINDOW_HOURS)),
+          "baseline_hours": float(request.args.get('baseline_hours', ALERT_BASELINE_HOURS)),
+          "threshold": float(request.args.get('threshold', ALERT_THRESHOLD)),
+          "min_count": int(request.args.get('min_count', ALERT_MIN_COUNT)),
+      }
+  except ValueError as e:
+      return jsonify({"error": f"Invalid alert setting: {e}"}), 400
+  if settings["window_hours"] < 1 or settings["baseline_hours"] <= 0 or settings["threshold"] <= 0 or settings["min_count"] < 0:
+      return jsonify({"error": "window_hours must be at least 1, baseline_hours and threshold positive and min_count not negative"}), 400
+  try:
+      sections = load_dataset_sections(dataset_id)
+  except KeyError:
+      return jsonify({"error": "Unknown dataset"}), 404
+  engine = sections.alerts() if settings == {"window_hours": ALERT_WINDOW_HOURS, "baseline_hours": ALERT_BASELINE_HOURS, "threshold": ALERT_THRESHOLD, "min_count": ALERT_MIN_COUNT} else replay_alerts(sections.aggregates, **settings)
+  return jsonify({
+      "dataset_id": dataset_id,
+      "settings": {**settings, "keywords": ALERT_KEYWORDS},
+      "alerts": [alert.to_dict() for alert in engine.alerts],
+      "stats": engine.stats(),
+  })
+
+@app.route('/datasets/<dataset_id>/rollup', methods=['GET'])
+def query_dataset_rollup(dataset_id):
+  """
+  Returns engagement, sentiment, buyer intent and keyword results of a stored dataset for a date
+  range (`start` and `end`, inclusive, default: all activity) at `granularity` day or week.
+  Answered from the dataset's rollup index, without reading rows or running inference.
+  """
+  if dataset_store is None:
+      return jsonify({"error": "Dataset store is disabled"}), 404
+  try:
+      start = parse_day(request.args['start']) if request.args.get('start') else None
+      end = parse_day(request.args['end']) if request.args.get('end') else None
+      index = load_rollup_index(dataset_id)
+      return jsonify({"dataset_id": dataset_id, **index.query(start, end, request.args.get('granularity', 'day'))})
+  except KeyError:
+      return jsonify({"error": "Unknown dataset"}), 404
+  except ValueError as e:
+      return jsonify({"error": str(e)}), 400
+
+@app.route('/datasets/<dataset_id>/append', methods=['POST'])
+def append_dataset(dataset_id):
+  """
+  Adds new comments to a stored dataset (same body formats as /analyze and /analyze/upload) and
+  returns the updated analysis. Rows already in the dataset are skipped; only new rows are scored.
+  """
+  if dataset_store is None:
+      return jsonify({"error": "Dataset store is disabled"}), 404
+  if request.is_json:
+      csv_source = request.json.get('csv_data')
+  elif request.mimetype == 'multipart/form-data':
+      upload = request.files.get('file')
+      csv_source = open_upload_stream(upload.stream) if upload is not None else None
+  else:
+      csv_source = open_upload_stream(request.stream, request.headers.get('Content-Encoding'))
+  if not csv_source:
+      log.warning("No CSV data provided.")
+      return jsonify({"error": "No CSV data provided"}), 400
+  try:
+      with inference_limiter:
+          return jsonify(append_to_dataset(dataset_id, csv_source))
+  except KeyError:
+      return jsonify({"error": "Unknown dataset"}), 404
+  except CSVParseError as e:
+      log.warning(f"Error parsing CSV: {e}")
       return jsonify({"error": f"Failed to parse CSV: {str(e)}"}), 400
 
-  # --- Engagement Metrics ---
-  print(f"[{datetime.now()}] Starting Engagement Metrics analysis.")
-  total_comments = int(df['comment_text'].dropna().astype(str).str.strip().astype(bool).sum())
-  total_posts = int(df['media_id'].nunique())
-
-  engagement_over_time = []
-  if 'timestamp' in df.columns:
-      df_valid_ts = df.dropna(subset=['timestamp'])
-      daily_activity = df_valid_ts.groupby(df_valid_ts['timestamp'].dt.date).agg(
-          posts=('media_id', 'nunique'),
-          comments=('comment_text', lambda x: x.dropna().astype(str).str.strip().astype(bool).sum())
-      ).reset_index()
-      daily_activity['date'] = daily_activity['timestamp'].astype(str)
-      daily_activity['posts'] = daily_activity['posts'].astype(int)
-      daily_activity['comments'] = daily_activity['comments'].astype(int)
-      engagement_over_time = daily_activity[['date', 'posts', 'comments']].to_dict(orient='records')
-
-  peak_engagement_hours = []
-  if 'timestamp' in df.columns:
-      hourly_activity = df_valid_ts.groupby(df_valid_ts['timestamp'].dt.hour).size().reset_index(name='activity')
-      hourly_activity.columns = ['hour_int', 'activity']
-      hourly_activity['hour'] = hourly_activity['hour_int'].apply(lambda x: f"{x:02d}:00") # Format as HH:00
-      hourly_activity['activity'] = hourly_activity['activity'].astype(int)
-      peak_engagement_hours = hourly_activity[['hour', 'activity']].to_dict(orient='records')
-
-  top_performing_posts = []
-  if 'media_id' in df.columns and 'comment_text' in df.columns:
-      post_comments_count = df.groupby('media_id')['comment_text'].apply(lambda x: x.dropna().astype(str).str.strip().astype(bool).sum()).reset_index(name='comments')
-      post_captions = df[['media_id', 'media_caption']].drop_duplicates(subset=['media_id'])
-      merged_posts = pd.merge(post_comments_count, post_captions, on='media_id', how='left')
-      merged_posts['comments'] = merged_posts['comments'].astype(int)
-      top_performing_posts = merged_posts.sort_values(by='comments', ascending=False).head(5).to_dict(orient='records')
-  print(f"[{datetime.now()}] Engagement Metrics analysis complete.")
-
-
-  # --- Publishing Recommendations ---
-  print(f"[{datetime.now()}] Starting Publishing Recommendations analysis.")
-  best_posting_times_data = []
-  if 'timestamp' in df.columns:
-      hourly_posts = df_valid_ts.groupby(df_valid_ts['timestamp'].dt.hour).size().reset_index(name='count')
-      hourly_posts.columns = ['hour_int', 'engagement']
-      hourly_posts['time'] = hourly_posts['hour_int'].apply(lambda x: f"{x:02d}:00") # Format as HH:00
-      hourly_posts['engagement'] = hourly_posts['engagement'].astype(int)
-      best_posting_times_data = hourly_posts[['time', 'engagement']].to_dict(orient='records')
-  print(f"[{datetime.now()}] Publishing Recommendations analysis complete.")
-
-  # --- Diagnostic Metrics ---
-  print(f"[{datetime.now()}] Starting Diagnostic Metrics analysis.")
-  ugc_volume = total_comments
-  performance_trends_data = engagement_over_time
-  print(f"[{datetime.now()}] Diagnostic Metrics analysis complete.")
-
-  # --- Sentiment Analysis (Actual NLP) ---
-  print(f"[{datetime.now()}] Starting Sentiment Analysis.")
-  all_texts_for_sentiment = df['comment_text'].dropna().tolist() + df['media_caption'].dropna().tolist()
-  
-  sentiments_results = [get_sentiment(text) for text in tqdm(all_texts_for_sentiment, desc="Analyzing sentiment")] # Added tqdm
-  sentiment_counts = Counter(sentiments_results)
-  
-  total_sentiment_analyzed = sum(sentiment_counts.values())
-  positive_pct = int((sentiment_counts['positive'] / total_sentiment_analyzed * 100) if total_sentiment_analyzed > 0 else 0)
-  neutral_pct = int((sentiment_counts['neutral'] / total_sentiment_analyzed * 100) if total_sentiment_analyzed > 0 else 0)
-  negative_pct = int((sentiment_counts['negative'] / total_sentiment_analyzed * 100) if total_sentiment_analyzed > 0 else 0)
-  
-  overall_sentiment_label = "Neutral"
-  if positive_pct > negative_pct and positive_pct > neutral_pct:
-      overall_sentiment_label = "Positive"
-  elif negative_pct > positive_pct and negative_pct > neutral_pct:
-      overall_sentiment_label = "Negative"
-
-  # Top Mentions (with actual sentiment)
-  top_mentions_data = []
-  # Take a sample of comments/captions for top mentions
-  sample_texts = random.sample(all_texts_for_sentiment, min(5, len(all_texts_for_sentiment)))
-  for text in sample_texts:
-      top_mentions_data.append({
-          "text": text,
-          "sentiment": get_sentiment(text),
-          "engagement": random.randint(50, 500), # Still simulated engagement for simplicity
-          "platform": random.choice(["Twitter", "Instagram", "Facebook", "LinkedIn"])
+@app.before_request
+def start_request_trace():
+  begin_trace()
+
+@app.after_request
+def record_request(response):
+  """Counts the request, and reports its top-level spans in a Server-Timing header and the log."""
+  recorded = current_trace()
+  route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+  HTTP_REQUESTS.labels(route, request.method, str(response.status_code)).inc()
+  if recorded is not None:
+      seconds = time.perf_counter() - recorded.started
+      HTTP_SECONDS.labels(route).observe(seconds)
+      timing = recorded.server_timing()
+      if timing:
+          response.headers["Server-Timing"] = timing
+      # Requests that did traced work get a log line; probes and polls only show up in metrics
+      log.log(logging.INFO if timing else logging.DEBUG, f"{request.method} {request.path} {response.status_code} {seconds * 1000:.0f} ms {timing}")
+  return response
+
+@app.teardown_request
+def end_request_trace(error=None):
+  end_trace()
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+  """Counters and histograms of this server process in the Prometheus text format."""
+  return Response(telemetry.render(), mimetype="text/plain; version=0.0.4")
+
+@app.errorhandler(Overloaded)
+def overloaded(e):
+  """Refused by the inference limiter: the client should retry later."""
+  log.warning(f"Refusing request: {e}")
+  return jsonify({"error": str(e)}), 503, {"Retry-After": str(int(e.retry_after))}
+
+@app.errorhandler(DatasetChanged)
+def dataset_changed(e):
+  """A stored dataset was replaced while the request read an old version of it: the client should retry."""
+  log.warning(f"Dataset {e} changed while it was read.")
+  return jsonify({"error": "Dataset changed while it was read; retry the request"}), 409
+
+@app.errorhandler(ModelUnavailable)
+def model_unavailable(e):
+  """A model in real mode failed to load; answering with mock output instead would hide it."""
+  log.error(f"Refusing request: {e}")
+  return jsonify({"error": str(e)}), 503
+
+@app.route('/recommendations/<recommendation_id>', methods=['GET'])
+def get_recommendations(recommendation_id):
+  """
+  Returns the LLM recommendations named by an analysis' ai_recommendations_id: 200 once they are
+  generated, 202 (with the mock recommendations) while the generation is queued or running.
+  """
+  result = recommendation_service.get(recommendation_id)
+  if result is None:
+      return jsonify({"error": "Unknown recommendations"}), 404
+  return jsonify(result), 200 if result["status"] == "ready" else 202
+
+def serving_status():
+  """
+  Returns models_status(). With SCROLLMARK_SENTIMENT_WORKERS, the pool's workers load their own
+  sentiment models and the in-process one stays unloaded, so sentiment is ready once the pool
+  is: loaded, or failed in auto mode and fallen back to the (mocked) in-process model.
+  """
+  statuses, ready = models_status()
+  if SENTIMENT_WORKERS == 0 or sentiment_model.is_mocked():
+      return statuses, ready
+  pool = sentiment_pool_status()
+  state = pool["state"] if pool is not None else "not_started"
+  if state == "failed":
+      return statuses, ready # Scoring falls back to the in-process model, so its status is the one that counts
+  statuses["sentiment"] = {**statuses["sentiment"], "state": state, "error": None}
+  return statuses, state == "loaded" and all(model.is_ready() for key, model in MODELS.items() if key != "sentiment")
+
+@app.route('/health', methods=['GET'])
+def health():
+  """Liveness check that also reports which models are loaded, loading or mocked."""
+  statuses, ready = serving_status()
+  return jsonify({"status": "ok", "ready": ready, "pid": os.getpid(), "models": statuses, "sentiment_pool": sentiment_pool_status(), "recommendations": recommendation_service.stats(), "inference": inference_limiter.stats()})
+
+@app.route('/ready', methods=['GET'])
+def ready():
+  """Readiness check: 503 until every model is loaded (or deliberately mocked), and for good once a real-mode model failed to load."""
+  statuses, ready = serving_status()
+  return jsonify({"ready": ready, "models": statuses}), 200 if ready else 503
+
+def build_aggregates(dataset, offset=0, stats=None, topics=None):
+  """
+  Computes the per-row results of a Dataset (features, sentiment labels, comment keywords,
+  intent and alert masks) and aggregates them. offset is the position of the dataset's first row among
+  the rows it will be merged with; topics is the TopicModel of those rows, continued with the
+  dataset's comments.
+  """
+  report_progress("engagement")
+  with span("engagement", rows=len(dataset.comments)):
+      dataset.features()
+
+  report_progress("sentiment")
+  dataset_sentiments(dataset, stats=stats) # Stored labels, or deduplicated, cached, batched inference
+
+  terms = comment_terms(dataset) # One tokenizing pass yields overall and weekly counts and the topic model's input
+  keywords = count_comment_keywords(dataset, terms)
+  match_dataset_intent(dataset)
+  match_dataset_alerts(dataset)
+  return AnalysisAggregates.from_dataset(dataset, keywords, offset, update_topics(dataset, terms, topics))
+
+def sample_mentions(aggregates, comment_mentions, k=5):
+  """
+  Samples up to k analyzed texts (comment texts, then captions) as (text, sentiment) pairs.
+  comment_mentions(positions) returns the pairs of the comment texts at the given positions.
+  """
+  total = aggregates.text_count()
+  sample = random.sample(range(total), min(k, total))
+  comment_positions = [i for i in sample if i < aggregates.texts]
+  comments = dict(zip(comment_positions, comment_mentions(comment_positions)))
+  captions = aggregates.captions()
+  return [
+      comments[i] if i < aggregates.texts else (captions['media_caption'].iat[i - aggregates.texts], captions['caption_sentiment'].iat[i - aggregates.texts])
+      for i in sample
+  ]
+
+ANALYSIS_SECTIONS = ["engagement_metrics", "publishing_recommendations", "diagnostic_metrics", "sentiment_analysis", "virality_score", "buyer_intent_discovery", "advocate_identification"]
+
+class AnalysisSections:
+  """
+  The dashboard sections of one analysis, each built on first request from the aggregates.
+  Intermediates shared by several sections (engagement aggregates, keyword counts, overall
+  sentiment, the rollup index, LLM recommendations) are computed once and reused, so a section
+  only costs what it needs: engagement is a few array reads, while recommendations are only
+  requested (and generated in the background) when the publishing section is asked for.
+  mentions() returns the (text, sentiment) pairs shown as top mentions; sentiment_stats is
+  reported as cache_stats.
+  """
+  def __init__(self, aggregates, mentions, sentiment_stats):
+    self.aggregates = aggregates
+    self._mentions = mentions
+    self.sentiment_stats = sentiment_stats
+    self._memo = {}
+    self._locks = {}
+    self._locks_lock = threading.Lock()
+
+  def _once(self, name, compute):
+    """Returns compute()'s result, computing it once per name even under concurrent requests."""
+    if name in self._memo:
+        return self._memo[name]
+    with self._locks_lock:
+        lock = self._locks.setdefault(name, threading.Lock())
+    with lock:
+        if name not in self._memo:
+            self._memo[name] = compute()
+    return self._memo[name]
+
+  def engagement(self):
+    """Engagement aggregates shared by the engagement, publishing, diagnostic and virality sections."""
+    return self._once("engagement", self.aggregates.engagement)
+
+  def keywords(self):
+    """Keyword counts of every comment and each caption once, bucketed by week."""
+    return self._once("keywords", lambda: aggregate_keywords(self.aggregates))
+
+  def overall_sentiment(self):
+    return self._once("overall_sentiment", lambda: sentiment_summary(self.aggregates.total_sentiment_counts())) # Comments plus each caption once per post
+
+  def rollup(self):
+    """RollupIndex over the aggregates' rollup cube, for date-range queries."""
+    return self._once("rollup", lambda: RollupIndex(self.aggregates, self.keywords(), INTENT_CATEGORY_MASKS))
+
+  def trending_topics(self):
+    # Trending Topics (Actual Keyword Extraction): comment counts are aggregated, captions are added once per post
+    return [
+        {"topic": keyword, "engagement": int(count / max(1, self.aggregates.text_count()) * 100)} # Normalize to a percentage
+        for keyword, count in self.keywords().top(5)
+    ]
+
+  def recommendations(self):
+    """AI Recommendations (Actual LLM), requested once per analysis; see RecommendationService.request."""
+    engagement = self.engagement()
+    return self._once("recommendations", lambda: recommendation_service.request({
+        "total_posts": engagement["total_posts"],
+        "total_comments": engagement["total_comments"],
+        "top_performing_posts": engagement["top_performing_posts"],
+        "overall_sentiment": {"overall": self.overall_sentiment()["overall"]}
+    }))
+
+  def section(self, name):
+    """Returns one section's payload by its response key (see ANALYSIS_SECTIONS)."""
+    return self._once(f"section:{name}", functools.partial(self._render, name))
+
+  def _render(self, name):
+    with span(name):
+        return getattr(self, name)()
+
+  def all(self, names=None):
+    """Returns the payloads of the named sections (default: all of them), as one response."""
+    return {name: self.section(name) for name in names or ANALYSIS_SECTIONS}
+
+  def engagement_metrics(self):
+    report_progress("engagement")
+    engagement = self.engagement()
+    total_comments = engagement["total_comments"]
+    total_posts = engagement["total_posts"]
+    engagement_over_time = engagement["engagement_over_time"]
+    peak_engagement_hours = engagement["peak_engagement_hours"]
+    top_performing_posts = engagement["top_performing_posts"]
+    return {
+        "total_posts": total_posts,
+        "total_comments": total_comments,
+        "engagement_over_time": engagement_over_time,
+        "peak_engagement_hours": peak_engagement_hours,
+        "top_performing_posts": top_performing_posts,
+        "metrics_summary": [
+            {"title": "Total Engagement", "value": f"{total_comments + total_posts * 5}", "change": f"+{random.uniform(5, 20):.1f}%", "trend": "up", "icon": "Heart", "color": "text-red-500"},
+            {"title": "Comments", "value": f"{total_comments}", "change": f"+{random.uniform(5, 20):.1f}%", "trend": "up", "icon": "MessageCircle", "color": "text-blue-500"},
+            {"title": "Shares", "value": f"{random.randint(10, 50)}K", "change": f"-{random.uniform(1, 5):.1f}%", "trend": "down", "icon": "Share", "color": "text-green-500"},
+            {"title": "Reach", "value": f"{random.randint(500, 1500)}K", "change": f"+{random.uniform(10, 25):.1f}%", "trend": "up", "icon": "Eye", "color": "text-purple-500"},
+        ],
+        "engagement_by_post_type": [ # Still mock as post type is not in CSV
+            {"type": "Video", "engagement": 3200},
+            {"type": "Image", "engagement": 2800},
+            {"type": "Carousel", "engagement": 2400},
+            {"type": "Text", "engagement": 1600},
+        ]
+    }
+
+  def publishing_recommendations(self):
+    report_progress("publishing")
+    best_posting_times_data = self.engagement()["best_posting_times"]
+    trending_topics_data = self.trending_topics()
+    llm_recommendations = self.recommendations()
+    return {
+        "best_posting_times": best_posting_times_data,
+        "engagement_forecast": generate_mock_trends(datetime.now(), 7, 1500, 500),
+        "trending_topics": trending_topics_data, # Actual NLP
+        "ai_recommendations": llm_recommendations["recommendations"], # Actual LLM, mock until generated
+        "ai_recommendations_id": llm_recommendations["id"], # Fetch from /recommendations/<id> while pending
+        "ai_recommendations_status": llm_recommendations["status"],
+        "upcoming_posts": [
+            {"time": "Today, 14:30", "content": "Product feature highlight", "status": "Scheduled"},
+            {"time": "Tomorrow, 10:00", "content": "Customer testimonial", "status": "Draft"},
+            {"time": "Wed, 15:15", "content": "Industry news commentary", "status": "Scheduled"},
+            {"time": "Thu, 13:45", "content": "Behind-the-scenes video", "status": "Draft"},
+            {"time": "Fri, 16:00", "content": "Weekly roundup", "status": "Scheduled"},
+        ]
+    }
+
+  def diagnostic_metrics(self):
+    report_progress("diagnostics")
+    ugc_volume = self.engagement()["total_comments"]
+    performance_trends_data = self.engagement()["engagement_over_time"]
+    return {
+        "ugc_volume": ugc_volume,
+        "performance_trends": performance_trends_data,
+        "current_metrics": [
+            {"title": "Follower Growth Rate", "current": "3.2%", "previous": "2.8%", "trend": "up", "target": "4.0%", "progress": 80},
+            {"title": "Engagement Rate", "current": "5.7%", "previous": "6.1%", "trend": "down", "target": "6.5%", "progress": 88},
+            {"title": "Reach Growth", "current": "12.4%", "previous": "10.2%", "trend": "up", "target": "15.0%", "progress": 83},
+            {"title": "Click-through Rate", "current": "2.1%", "previous": "1.9%", "trend": "up", "target": "2.5%", "progress": 84},
+            {"title": "UGC Volume (from data)", "current": str(ugc_volume), "previous": "0", "trend": "up", "target": "N/A", "progress": 100},
+            {"title": "Social Response Rate", "current": "36%", "previous": "0%", "trend": "up", "target": "N/A", "progress": 100},
+            {"title": "Overall Engagement Lift", "current": "61%", "previous": "0%", "trend": "up", "target": "N/A", "progress": 100},
+            {"title": "Lead Capture Effectiveness", "current": "1,062+ opt-ins / 3.6K+ giveaway", "previous": "0", "trend": "up", "target": "N/A", "progress": 100},
+            {"title": "Operational Time Savings", "current": "18 workdays / 20 hrs weekly", "previous": "0", "trend": "up", "target": "N/A", "progress": 100},
+        ],
+        "diagnostic_alerts": diagnostic_alerts(self.alerts()), # Actual spike detection over the comment history
+        "audience_insights": [
+            {"metric": "Age 18-24", "percentage": 28, "change": "+2%"},
+            {"metric": "Age 25-34", "percentage": 35, "change": "+1%"},
+            {"metric": "Age 35-44", "percentage": 22, "change": "-1%"},
+            {"metric": "Age 45+", "percentage": 15, "change": "0%"},
+        ]
+    }
+
+  def sentiment_analysis(self):
+    report_progress("sentiment")
+    overall_sentiment = self.overall_sentiment()
+
+    # Top Mentions (with actual sentiment)
+    top_mentions_data = []
+    # Take a sample of comments/captions for top mentions, reusing their stored sentiment results
+    for text, sentiment in self._mentions():
+        top_mentions_data.append({
+            "text": text,
+            "sentiment": sentiment,
+            "engagement": random.randint(50, 500), # Still simulated engagement for simplicity
+            "platform": random.choice(["Twitter", "Instagram", "Facebook", "LinkedIn"])
+        })
+
+    keyword_counter = self.keywords()
+    keyword_performance_data = [{"keyword": keyword, "mentions": int(count)} for keyword, count in keyword_counter.top(5)]
+    weekly_keywords_data = [
+        {"week": week, "keywords": [{"keyword": keyword, "mentions": int(count)} for keyword, count in top]}
+        for week, top in keyword_counter.top_by_bucket(5).items()
+    ]
+    # Weekly sentiment from the rollup cube's prefix sums
+    sentiment_trends_data = self.rollup().sentiment_trends(granularity='week')
+    return {
+        "overall_sentiment": overall_sentiment, # Actual NLP
+        "sentiment_trends": sentiment_trends_data, # Per week (Monday start), oldest first
+        "advocacy_keywords": [ # Still mock, but can be enhanced with NLP
+            {"keyword": "#innovation", "mentions": 1247, "sentiment": "positive", "growth": "+15%", "positive_pct": 90, "negative_pct": 2, "neutral_pct": 8},
+            {"keyword": "#quality", "mentions": 892, "sentiment": "positive", "growth": "+8%", "positive_pct": 85, "negative_pct": 5, "neutral_pct": 10},
+            {"keyword": "#customerservice", "mentions": 634, "sentiment": "positive", "growth": "+12%", "positive_pct": 92, "negative_pct": 3, "neutral_pct": 5},
+            {"keyword": "#sustainability", "mentions": 521, "sentiment": "positive", "growth": "+22%", "positive_pct": 88, "negative_pct": 4, "neutral_pct": 8},
+            {"keyword": "#leadership", "mentions": 387, "sentiment": "positive", "growth": "+5%", "positive_pct": 82, "negative_pct": 6, "neutral_pct": 12},
+            {"keyword": "#community", "mentions": 298, "sentiment": "positive", "growth": "+18%", "positive_pct": 95, "negative_pct": 1, "neutral_pct": 4},
+        ],
+        "keyword_performance": keyword_performance_data, # Actual NLP
+        "topics": self.aggregates.topics.summary() if self.aggregates.topics is not None else [], # Online NMF topics with their volume and sentiment
+        "weekly_keywords": weekly_keywords_data, # Top keywords per week (Monday start)
+        "top_mentions": top_mentions_data, # Actual NLP
+        "cache_stats": self.sentiment_stats, # Sentiment deduplication and cache savings for this request
+        "feature_sentiment": [ # Still mock
+            {"feature": "UI Design", "positive": 75, "negative": 15, "neutral": 10},
+            {"feature": "Customer Support", "positive": 85, "negative": 5, "neutral": 10},
+            {"feature": "Pricing", "positive": 40, "negative": 50, "neutral": 10},
+            {"feature": "Performance", "positive": 70, "negative": 20, "neutral": 10},
+        ],
+        "customer_feedback_categories": [ # Still mock
+            {"category": "Ease of Use", "positive": 80, "negative": 5, "neutral": 15},
+            {"category": "Feature Request", "positive": 20, "negative": 60, "neutral": 20},
+            {"category": "Bug Report", "positive": 5, "negative": 85, "neutral": 10},
+            {"category": "General Praise", "positive": 90, "negative": 2, "neutral": 8},
+        ],
+        "sentiment_signals": [ # Still mock
+            {"signal": "Increased positive mentions of UI after update", "insight": "New UI changes well received"},
+            {"signal": "Spike in negative mentions of pricing", "insight": "Potential need to re-evaluate pricing strategy"},
+            {"signal": "High positive sentiment around customer support", "insight": "Customer support is a key strength"},
+        ],
+        "product_features_sentiment": [ # Still mock
+            {"feature": "Dashboard", "positive": 80, "negative": 10, "neutral": 10, "praised": "Intuitive design", "painPoint": "Loading times"},
+            {"feature": "Reporting", "positive": 65, "negative": 25, "neutral": 10, "praised": "Comprehensive data", "painPoint": "Difficult to export"},
+            {"feature": "Integrations", "positive": 75, "negative": 15, "neutral": 10, "praised": "Seamless connectivity", "painPoint": "Limited options"},
+        ]
+    }
+
+  def virality_score(self):
+    # --- Virality Score (More data-driven simulation) ---
+    report_progress("virality")
+    engagement = self.engagement()
+    # Base virality on total comments and posts
+    virality_score_value = int(min(100, (engagement["total_comments"] + engagement["total_posts"] * 5) / 100)) # Simple heuristic
+    virality_score_value = max(60, virality_score_value) # Ensure a minimum score for display
+    return {
+        "virality_score_value": virality_score_value, # More data-driven
+        "virality_factors": [ # Still mock, but can be enhanced
+            {"factor": "Content Quality", "score": 85, "description": "High-quality, engaging content"},
+            {"factor": "Timing", "score": 72, "description": "Posted during peak hours"},
+            {"factor": "Hashtag Strategy", "score": 68, "description": "Relevant and trending hashtags"},
+            {"factor": "Audience Alignment", "score": 91, "description": "Perfect match with target audience"},
+            {"factor": "Emotional Appeal", "score": 78, "description": "Strong emotional resonance"},
+            {"factor": "Visual Impact", "score": 83, "description": "Eye-catching visual elements"},
+        ],
+        "past_viral_posts": [ # Still mock
+            {"content": "Behind-the-scenes of our product development process", "score": 94, "reach": "2.3M", "engagement": "187K", "shares": "45K", "date": "2 days ago"},
+            {"content": "Customer success story featuring local business", "score": 89, "reach": "1.8M", "engagement": "142K", "shares": "38K", "date": "1 week ago"},
+            {"content": "Industry trend analysis and predictions", "score": 82, "reach": "1.2M", "engagement": "98K", "shares": "22K", "date": "2 weeks ago"},
+        ],
+        "virality_trends": generate_mock_trends(datetime.now() - timedelta(days=180), 6, virality_score_value, 10), # Data-driven mock
+        "virality_tips": [ # Still mock
+            "Use trending hashtags relevant to your industry",
+            "Post during peak engagement hours (2-4 PM)",
+            "Include compelling visuals or videos",
+            "Ask questions to encourage comments",
+            "Share authentic, behind-the-scenes content",
+            "Collaborate with influencers or partners",
+        ]
+    }
+
+  def buyer_intent_discovery(self):
+    # --- Buyer Intent Discovery (Actual Analysis) ---
+    report_progress("buyer_intent")
+    buyer_intent_data = analyze_buyer_intent(self.aggregates)
+    return buyer_intent_data
+
+  def advocates(self):
+    """AdvocateIndex over the author rollup, for the advocate section and author lookups."""
+    return self._once("advocates", lambda: AdvocateIndex(self.aggregates.authors, self.aggregates.author_days, intent_scores))
+
+  def alerts(self):
+    """AlertEngine replayed over the hourly aggregates with the configured settings."""
+    return self._once("alerts", lambda: replay_alerts(self.aggregates))
+
+  def advocate_identification(self):
+    # --- Advocate Identification (Actual Analysis of the username column) ---
+    report_progress("advocates")
+    advocates = self.advocates()
+    if len(advocates) == 0:
+        return mock_advocate_identification() # The export has no username column
+    return analyze_advocates(advocates, self.aggregates.comments)
+
+def replay_alerts(aggregates, window_hours=None, baseline_hours=None, threshold=None, min_count=None):
+  """
+  Replays the spike alerts over an analysis' whole comment history, hour by hour, from its
+  rollup cube and alert keyword counts. Settings default to the SCROLLMARK_ALERT_* settings.
+  Returns the AlertEngine, with every alert in .alerts.
+  """
+  engine = AlertEngine(
+      keywords=ALERT_KEYWORDS,
+      window_buckets=window_hours or ALERT_WINDOW_HOURS,
+      halflife_buckets=baseline_hours or ALERT_BASELINE_HOURS,
+      threshold=threshold or ALERT_THRESHOLD,
+      min_count=ALERT_MIN_COUNT if min_count is None else min_count,
+  )
+  with span("alerts") as replayed:
+      hours, counts = hourly_counts(aggregates.rollup, aggregates.alert_hours, ALERT_KEYWORDS)
+      engine.replay(hours, counts)
+      replayed.set(hours=len(hours), alerts=len(engine.alerts))
+  return engine
+
+DIAGNOSTIC_ALERTS = 4 # Alerts listed in the diagnostic section
+
+def diagnostic_alerts(engine):
+  """
+  Builds the diagnostic section's alert cards from the spikes of an AlertEngine: keyword and
+  negative sentiment spikes first, then the others, most recent first within each.
+  """
+  recent = sorted(engine.alerts, key=lambda alert: alert.start, reverse=True)
+  recent.sort(key=lambda alert: alert.kind == "volume" or alert.series in ("sentiment:positive", "sentiment:neutral")) # Stable: keeps recency within each group
+  cards = []
+  for alert in recent[:DIAGNOSTIC_ALERTS]:
+      window = f"{alert.start:%b %d, %H:%M}" + (f" to {alert.end:%b %d, %H:%M}" if alert.end is not None else ", still ongoing")
+      if alert.kind == "volume":
+          title = "Comment volume spike"
+          description = f"{alert.peak_count} comments in {engine.window_buckets} hours against {alert.expected:.0f} expected ({window})."
+          card = {"type": "info", "action": "Check which posts drive the activity", "icon": "Activity"}
+      else:
+          share = alert.peak_count / max(1, alert.volume) * 100
+          expected_share = alert.expected / max(1, alert.volume) * 100
+          description = f"{alert.peak_count} of {alert.volume} comments ({share:.0f}%, usually {expected_share:.0f}%) in {engine.window_buckets} hours ({window})."
+          if alert.kind == "keyword":
+              title = f"Spike in mentions of '{alert.name}'"
+              card = {"type": "warning", "action": "Review the comments and respond", "icon": "AlertTriangle"}
+          elif alert.name == "positive":
+              title = "Spike in positive sentiment"
+              card = {"type": "success", "action": "Find out what resonated", "icon": "CheckCircle"}
+          elif alert.name == "negative":
+              title = "Spike in negative sentiment"
+              card = {"type": "warning", "action": "Review the comments and respond", "icon": "AlertTriangle"}
+          else:
+              title = f"Spike in {alert.name} sentiment"
+              card = {"type": "info", "action": "Review the comments", "icon": "Activity"}
+      cards.append({**card, "title": title, "description": description, "z_score": round(alert.peak_z, 1), "start": alert.start.isoformat(), "end": alert.end.isoformat() if alert.end is not None else None})
+  if not cards:
+      cards.append({"type": "success", "title": "No spikes detected", "description": f"Comment volume, sentiment and tracked keywords stayed within their usual range over {engine.stats()['buckets']} hours.", "action": "Monitor performance", "icon": "CheckCircle"})
+  return cards
+
+ADVOCATE_TOP = 5 # Advocates listed in the advocate section
+
+def analyze_advocates(advocates, total_comments):
+  """
+  Builds the advocate identification section from an AdvocateIndex: community health, the top
+  advocates by advocacy score, tier counts, weekly comments by identified authors and the top
+  advocates' average score components. total_comments counts every comment, with or without an author.
+  """
+  top = [advocates.describe(i) for i in advocates.top(ADVOCATE_TOP)]
+  tiers = advocates.tiers()
+  tiered = sum(count for _, count, _ in tiers)
+  champions_and_advocates = tiers[0][1] + tiers[1][1]
+  author_comments = int(advocates.authors['comments'].sum())
+  new_authors = advocates.new_authors(days=7)
+  top_scores = advocates.scores[advocates.scores >= TIERS[1][1]]
+
+  top_advocates = []
+  for advocate in top:
+      sentiment = advocate["sentiment"]
+      activities = [f"{advocate['comments']} comments on {advocate['active_days']} days", f"{sentiment['positive']} positive, {sentiment['negative']} negative comments"]
+      if advocate["intent_comments"]:
+          activities.append(f"{advocate['intent_comments']} comments with buyer intent")
+      if advocate["last_activity"]:
+          activities.append(f"Last active {advocate['last_activity'][:10]}")
+      top_advocates.append({
+          "user": f"@{advocate['author']}",
+          "name": advocate["author"],
+          "tier": advocate["tier"] or "Member",
+          "score": advocate["score"],
+          "ugcCount": advocate["comments"],
+          "engagement": advocate["active_days"],
+          "influence": min(100, advocate["intent_score"] * 5), # Buyer intent, scaled to 0-100 as in buyer intent discovery
+          "loyaltyPoints": advocate["comments"] * LOYALTY_POINTS_PER_COMMENT,
+          "activities": activities,
+          "sentiment": sentiment,
+          "first_activity": advocate["first_activity"],
+          "last_activity": advocate["last_activity"],
       })
 
-  # Trending Topics (Actual Keyword Extraction)
-  trending_topics_data = extract_keywords(all_texts_for_sentiment, num_keywords=5) # This calls extract_keywords which has tqdm
-  # Add a simulated engagement percentage for display
-  for topic in trending_topics_data:
-      topic['engagement'] = int(topic['engagement'] / max(1, len(all_texts_for_sentiment)) * 100) # Normalize to a percentage
-
-  # AI Recommendations (Actual LLM)
-  llm_recommendations = generate_llm_recommendation({
-      "total_posts": total_posts,
-      "total_comments": total_comments,
-      "top_performing_posts": top_performing_posts,
-      "overall_sentiment": {"overall": overall_sentiment_label}
-  })
-  print(f"[{datetime.now()}] Sentiment Analysis complete.")
-
-  # --- Virality Score (More data-driven simulation) ---
-  print(f"[{datetime.now()}] Starting Virality Score calculation.")
-  # Base virality on total comments and posts
-  virality_score_value = int(min(100, (total_comments + total_posts * 5) / 100)) # Simple heuristic
-  virality_score_value = max(60, virality_score_value) # Ensure a minimum score for display
-  print(f"[{datetime.now()}] Virality Score calculation complete.")
-
-  # --- Buyer Intent Discovery (Actual Analysis) ---
-  print(f"[{datetime.now()}] Starting Buyer Intent Discovery analysis.")
-  buyer_intent_data = analyze_buyer_intent(df) # This calls analyze_buyer_intent which has tqdm
-  print(f"[{datetime.now()}] Buyer Intent Discovery analysis complete.")
-
-  # --- Advocate Identification (Mostly mock) ---
-  print(f"[{datetime.now()}] Starting Advocate Identification analysis (mostly mock).")
-  # No specific loops here to wrap with tqdm, keep print statements.
-  print(f"[{datetime.now()}] Advocate Identification analysis complete.")
-
-
-  response_data = {
-      "engagement_metrics": {
-          "total_posts": total_posts,
-          "total_comments": total_comments,
-          "engagement_over_time": engagement_over_time,
-          "peak_engagement_hours": peak_engagement_hours,
-          "top_performing_posts": top_performing_posts,
-          "metrics_summary": [
-              {"title": "Total Engagement", "value": f"{total_comments + total_posts * 5}", "change": f"+{random.uniform(5, 20):.1f}%", "trend": "up", "icon": "Heart", "color": "text-red-500"},
-              {"title": "Comments", "value": f"{total_comments}", "change": f"+{random.uniform(5, 20):.1f}%", "trend": "up", "icon": "MessageCircle", "color": "text-blue-500"},
-              {"title": "Shares", "value": f"{random.randint(10, 50)}K", "change": f"-{random.uniform(1, 5):.1f}%", "trend": "down", "icon": "Share", "color": "text-green-500"},
-              {"title": "Reach", "value": f"{random.randint(500, 1500)}K", "change": f"+{random.uniform(10, 25):.1f}%", "trend": "up", "icon": "Eye", "color": "text-purple-500"},
-          ],
-          "engagement_by_post_type": [ # Still mock as post type is not in CSV
-              {"type": "Video", "engagement": 3200},
-              {"type": "Image", "engagement": 2800},
-              {"type": "Carousel", "engagement": 2400},
-              {"type": "Text", "engagement": 1600},
-          ]
-      },
-      "publishing_recommendations": {
-          "best_posting_times": best_posting_times_data,
-          "engagement_forecast": generate_mock_trends(datetime.now(), 7, 1500, 500),
-          "trending_topics": trending_topics_data, # Actual NLP
-          "ai_recommendations": llm_recommendations, # Actual LLM
-          "upcoming_posts": [
-              {"time": "Today, 14:30", "content": "Product feature highlight", "status": "Scheduled"},
-              {"time": "Tomorrow, 10:00", "content": "Customer testimonial", "status": "Draft"},
-              {"time": "Wed, 15:15", "content": "Industry news commentary", "status": "Scheduled"},
-              {"time": "Thu, 13:45", "content": "Behind-the-scenes video", "status": "Draft"},
-              {"time": "Fri, 16:00", "content": "Weekly roundup", "status": "Scheduled"},
-          ]
-      },
-      "diagnostic_metrics": {
-          "ugc_volume": ugc_volume,
-          "performance_trends": performance_trends_data,
-          "current_metrics": [
-              {"title": "Follower Growth Rate", "current": "3.2%", "previous": "2.8%", "trend": "up", "target": "4.0%", "progress": 80},
-              {"title": "Engagement Rate", "current": "5.7%", "previous": "6.1%", "trend": "down", "target": "6.5%", "progress": 88},
-              {"title": "Reach Growth", "current": "12.4%", "previous": "10.2%", "trend": "up", "target": "15.0%", "progress": 83},
-              {"title": "Click-through Rate", "current": "2.1%", "previous": "1.9%", "trend": "up", "target": "2.5%", "progress": 84},
-              {"title": "UGC Volume (from data)", "current": str(ugc_volume), "previous": "0", "trend": "up", "target": "N/A", "progress": 100},
-              {"title": "Social Response Rate", "current": "36%", "previous": "0%", "trend": "up", "target": "N/A", "progress": 100},
-              {"title": "Overall Engagement Lift", "current": "61%", "previous": "0%", "trend": "up", "target": "N/A", "progress": 100},
-              {"title": "Lead Capture Effectiveness", "current": "1,062+ opt-ins / 3.6K+ giveaway", "previous": "0", "trend": "up", "target": "N/A", "progress": 100},
-              {"title": "Operational Time Savings", "current": "18 workdays / 20 hrs weekly", "previous": "0", "trend": "up", "target": "N/A", "progress": 100},
-          ],
-          "diagnostic_alerts": [
-              {"type": "success", "title": "Scrollmark Active", "description": "Scrollmark is actively enhancing your content strategy.", "action": "Monitor performance", "icon": "CheckCircle"},
-              {"type": "info", "title": "Content Optimization Opportunities", "description": "Scrollmark has identified areas for content improvement.", "action": "Review recommendations", "icon": "Activity"},
-              {"type": "success", "title": "Lead Generation Boost", "description": "Scrollmark is driving significant lead capture.", "action": "Analyze lead quality", "icon": "CheckCircle"},
-              {"type": "warning", "title": "Potential Time Savings", "description": "Scrollmark can further optimize operational efficiency.", "action": "Explore advanced features", "icon": "AlertTriangle"},
-          ],
-          "audience_insights": [
-              {"metric": "Age 18-24", "percentage": 28, "change": "+2%"},
-              {"metric": "Age 25-34", "percentage": 35, "change": "+1%"},
-              {"metric": "Age 35-44", "percentage": 22, "change": "-1%"},
-              {"metric": "Age 45+", "percentage": 15, "change": "0%"},
-          ]
-      },
-      "sentiment_analysis": {
-          "overall_sentiment": {"positive": positive_pct, "neutral": neutral_pct, "negative": negative_pct, "overall": overall_sentiment_label}, # Actual NLP
-          "sentiment_trends": [ # Still mock, but can be enhanced with time-series sentiment
-              {"period": "This Week", "positive": positive_pct, "neutral": neutral_pct, "negative": negative_pct},
-              {"period": "Last Week", "positive": max(0, positive_pct - 5), "neutral": max(0, neutral_pct + 2), "negative": max(0, negative_pct + 3)},
-              {"period": "2 Weeks Ago", "positive": max(0, positive_pct - 2), "neutral": max(0, neutral_pct + 1), "negative": max(0, negative_pct + 1)},
-              {"period": "3 Weeks Ago", "positive": max(0, positive_pct - 7), "neutral": max(0, neutral_pct + 4), "negative": max(0, negative_pct + 3)},
-          ],
-          "advocacy_keywords": [ # Still mock, but can be enhanced with NLP
-              {"keyword": "#innovation", "mentions": 1247, "sentiment": "positive", "growth": "+15%", "positive_pct": 90, "negative_pct": 2, "neutral_pct": 8},
-              {"keyword": "#quality", "mentions": 892, "sentiment": "positive", "growth": "+8%", "positive_pct": 85, "negative_pct": 5, "neutral_pct": 10},
-              {"keyword": "#customerservice", "mentions": 634, "sentiment": "positive", "growth": "+12%", "positive_pct": 92, "negative_pct": 3, "neutral_pct": 5},
-              {"keyword": "#sustainability", "mentions": 521, "sentiment": "positive", "growth": "+22%", "positive_pct": 88, "negative_pct": 4, "neutral_pct": 8},
-              {"keyword": "#leadership", "mentions": 387, "sentiment": "positive", "growth": "+5%", "positive_pct": 82, "negative_pct": 6, "neutral_pct": 12},
-              {"keyword": "#community", "mentions": 298, "sentiment": "positive", "growth": "+18%", "positive_pct": 95, "negative_pct": 1, "neutral_pct": 4},
-          ],
-          "keyword_performance": trending_topics_data, # Actual NLP
-          "top_mentions": top_mentions_data, # Actual NLP
-          "feature_sentiment": [ # Still mock
-              {"feature": "UI Design", "positive": 75, "negative": 15, "neutral": 10},
-              {"feature": "Customer Support", "positive": 85, "negative": 5, "neutral": 10},
-              {"feature": "Pricing", "positive": 40, "negative": 50, "neutral": 10},
-              {"feature": "Performance", "positive": 70, "negative": 20, "neutral": 10},
-          ],
-          "customer_feedback_categories": [ # Still mock
-              {"category": "Ease of Use", "positive": 80, "negative": 5, "neutral": 15},
-              {"category": "Feature Request", "positive": 20, "negative": 60, "neutral": 20},
-              {"category": "Bug Report", "positive": 5, "negative": 85, "neutral": 10},
-              {"category": "General Praise", "positive": 90, "negative": 2, "neutral": 8},
-          ],
-          "sentiment_signals": [ # Still mock
-              {"signal": "Increased positive mentions of UI after update", "insight": "New UI changes well received"},
-              {"signal": "Spike in negative mentions of pricing", "insight": "Potential need to re-evaluate pricing strategy"},
-              {"signal": "High positive sentiment around customer support", "insight": "Customer support is a key strength"},
-          ],
-          "product_features_sentiment": [ # Still mock
-              {"feature": "Dashboard", "positive": 80, "negative": 10, "neutral": 10, "praised": "Intuitive design", "painPoint": "Loading times"},
-              {"feature": "Reporting", "positive": 65, "negative": 25, "neutral": 10, "praised": "Comprehensive data", "painPoint": "Difficult to export"},
-              {"feature": "Integrations", "positive": 75, "negative": 15, "neutral": 10, "praised": "Seamless connectivity", "painPoint": "Limited options"},
-          ]
-      },
-      "virality_score": {
-          "virality_score_value": virality_score_value, # More data-driven
-          "virality_factors": [ # Still mock, but can be enhanced
-              {"factor": "Content Quality", "score": 85, "description": "High-quality, engaging content"},
-              {"factor": "Timing", "score": 72, "description": "Posted during peak hours"},
-              {"factor": "Hashtag Strategy", "score": 68, "description": "Relevant and trending hashtags"},
-              {"factor": "Audience Alignment", "score": 91, "description": "Perfect match with target audience"},
-              {"factor": "Emotional Appeal", "score": 78, "description": "Strong emotional resonance"},
-              {"factor": "Visual Impact", "score": 83, "description": "Eye-catching visual elements"},
+  radar = [{"metric": name.capitalize(), "score": int(round(100 * np.mean([advocate["components"][name] for advocate in top])))} for name in SCORE_WEIGHTS] if top else []
+  if top:
+      radar.append({"metric": "Buyer Intent", "score": int(round(np.mean([min(100, advocate["intent_score"] * 5) for advocate in top])))})
+      radar.append({"metric": "Advocacy", "score": int(round(np.mean([advocate["score"] for advocate in top])))})
+
+  return {
+      "community_health": [
+          {"metric": "Active Advocates", "value": champions_and_advocates, "change": f"of {len(advocates)} commenters", "icon": "Users"},
+          {"metric": "UGC Volume", "value": author_comments, "change": f"{author_comments / max(1, total_comments) * 100:.0f}% of all comments", "icon": "MessageSquare"},
+          {"metric": "Advocacy Score", "value": round(float(top_scores.mean()) / 10, 1) if len(top_scores) else 0, "change": "average of advocates, out of 10", "icon": "Star"},
+          {"metric": "Community Growth", "value": f"{new_authors / max(1, len(advocates) - new_authors) * 100:.1f}%", "change": f"{new_authors} new commenters in the last 7 days", "icon": "TrendingUp"},
+      ],
+      "top_advocates": top_advocates,
+      "advocacy_tiers": [
+          {"tier": f"{tier}s", "count": count, "percentage": round(count / tiered * 100, 1) if tiered else 0, "color": color}
+          for tier, count, color in tiers
+      ],
+      "ugc_performance": [{"date": day_string(week), "value": int(comments)} for week, comments in advocates.weekly_comments()],
+      "advocate_performance_radar": radar,
+      "loyalty_program_performance": mock_advocate_identification()["loyalty_program_performance"], # Still mock: exports carry no loyalty program data
+  }
+
+def mock_advocate_identification():
+  """The advocate section for exports without a username column (mock data)."""
+  return {
+      "community_health": [
+          {"metric": "Active Advocates", "value": 247, "change": "+18% from last month (simulated)", "icon": "Users"},
+          {"metric": "UGC Volume", "value": 373, "change": "+24% from last month (simulated)", "icon": "MessageSquare"},
+          {"metric": "Advocacy Score", "value": 8.4, "change": "+12% from last month (simulated)", "icon": "Star"},
+          {"metric": "Community Growth", "value": "15.2%", "change": "+3.1% from last month (simulated)", "icon": "TrendingUp"},
+      ],
+      "top_advocates": [
+          {"user": "@emma_creative", "name": "Emma Johnson", "tier": "Champion", "score": 95, "ugcCount": 23, "engagement": 4200, "influence": 8500, "loyaltyPoints": 2400, "activities": ["Created 5 UGCs this week", "Referred 3 new customers", "Responded to 12 comments"]},
+          {"user": "@david_tech", "name": "David Chen", "tier": "Advocate", "score": 88, "ugcCount": 18, "engagement": 3100, "influence": 6200, "loyaltyPoints": 1800, "activities": ["Shared product launch", "Engaged with 8 posts", "Created tutorial video"]},
+          {"user": "@lisa_entrepreneur", "name": "Lisa Rodriguez", "tier": "Champion", "score": 92, "ugcCount": 31, "engagement": 5600, "influence": 12000, "loyaltyPoints": 3200, "activities": ["Top UGC creator", "Hosted live session", "Mentored new users"]},
+          {"user": "@ryan_designer", "name": "Ryan Park", "tier": "Supporter", "score": 76, "ugcCount": 12, "engagement": 2400, "influence": 3800, "loyaltyPoints": 1200, "activities": ["Consistent engagement", "Quality feedback", "Community participation"]},
+      ],
+      "advocacy_tiers": [
+          {"tier": "Champions", "count": 23, "percentage": 9.3, "color": "#FFD700"},
+          {"tier": "Advocates", "count": 67, "percentage": 27.1, "color": "#C0C0C0"},
+          {"tier": "Supporters", "count": 157, "percentage": 63.6, "color": "#CD7F32"},
+      ],
+      "ugc_performance": generate_mock_trends(datetime.now() - timedelta(days=150), 5, 150, 50),
+      "advocate_performance_radar": [
+          {"metric": "UGC Creation", "score": 92},
+          {"metric": "Engagement", "score": 88},
+          {"metric": "Influence", "score": 85},
+          {"metric": "Loyalty", "score": 94},
+          {"metric": "Advocacy", "score": 90},
+          {"metric": "Community", "score": 87},
+      ],
+      "loyalty_program_performance": {
+          "points_distribution": [
+              {"activity": "UGC Creation", "points": 500, "count": 89},
+              {"activity": "Comments", "points": 50, "count": 1247},
+              {"activity": "Shares", "points": 100, "count": 456},
+              {"activity": "Mentions", "points": 150, "count": 234},
+              {"activity": "Referrals", "points": 1000, "count": 67},
           ],
-          "past_viral_posts": [ # Still mock
-              {"content": "Behind-the-scenes of our product development process", "score": 94, "reach": "2.3M", "engagement": "187K", "shares": "45K", "date": "2 days ago"},
-              {"content": "Customer success story featuring local business", "score": 89, "reach": "1.8M", "engagement": "142K", "shares": "38K", "date": "1 week ago"},
-              {"content": "Industry trend analysis and predictions", "score": 82, "reach": "1.2M", "engagement": "98K", "shares": "22K", "date": "2 weeks ago"},
+          "reward_redemptions": [
+              {"reward": "Exclusive Content", "redeemed": 45, "points": 500},
+              {"reward": "Product Discount", "redeemed": 32, "points": 1000},
+              {"reward": "Early Access", "redeemed": 28, "points": 750},
+              {"reward": "Branded Merchandise", "redeemed": 19, "points": 1500},
+              {"reward": "VIP Event Access", "redeemed": 12, "points": 2500},
           ],
-          "virality_trends": generate_mock_trends(datetime.now() - timedelta(days=180), 6, virality_score_value, 10), # Data-driven mock
-          "virality_tips": [ # Still mock
-              "Use trending hashtags relevant to your industry",
-              "Post during peak engagement hours (2-4 PM)",
-              "Include compelling visuals or videos",
-              "Ask questions to encourage comments",
-              "Share authentic, behind-the-scenes content",
-              "Collaborate with influencers or partners",
+          "program_impact": [
+              {"metric": "Engagement Lift", "value": "61%", "trend": "up"},
+              {"metric": "UGC Increase", "value": "127%", "trend": "up"},
+              {"metric": "Retention Rate", "value": "84%", "trend": "up"},
+              {"metric": "Referral Rate", "value": "23%", "trend": "up"},
+              {"metric": "Brand Sentiment", "value": "+18%", "trend": "up"},
           ]
-      },
-      "buyer_intent_discovery": buyer_intent_data, # Actual Analysis
-      "advocate_identification": { # Mostly mock, but can be enhanced with user tracking
-          "community_health": [
-              {"metric": "Active Advocates", "value": 247, "change": "+18%", "icon": "Users"},
-              {"metric": "UGC Volume", "value": 373, "change": "+24%", "icon": "MessageSquare"},
-              {"metric": "Advocacy Score", "value": 8.4, "change": "+12%", "icon": "Star"},
-              {"metric": "Community Growth", "value": "15.2%", "change": "+3.1%", "icon": "TrendingUp"},
-          ],
-          "top_advocates": [
-              {"user": "@emma_creative", "name": "Emma Johnson", "tier": "Champion", "score": 95, "ugcCount": 23, "engagement": 4200, "influence": 8500, "loyaltyPoints": 2400, "activities": ["Created 5 UGCs this week", "Referred 3 new customers", "Responded to 12 comments"]},
-              {"user": "@david_tech", "name": "David Chen", "tier": "Advocate", "score": 88, "ugcCount": 18, "engagement": 3100, "influence": 6200, "loyaltyPoints": 1800, "activities": ["Shared product launch", "Engaged with 8 posts", "Created tutorial video"]},
-              {"user": "@lisa_entrepreneur", "name": "Lisa Rodriguez", "tier": "Champion", "score": 92, "ugcCount": 31, "engagement": 5600, "influence": 12000, "loyaltyPoints": 3200, "activities": ["Top UGC creator", "Hosted live session", "Mentored new users"]},
-              {"user": "@ryan_designer", "name": "Ryan Park", "tier": "Supporter", "score": 76, "ugcCount": 12, "engagement": 2400, "influence": 3800, "loyaltyPoints": 1200, "activities": ["Consistent engagement", "Quality feedback", "Community participation"]},
-          ],
-          "advocacy_tiers": [
-              {"tier": "Champions", "count": 23, "percentage": 9.3, "color": "#FFD700"},
-              {"tier": "Advocates", "count": 67, "percentage": 27.1, "color": "#C0C0C0"},
-              {"tier": "Supporters", "count": 157, "percentage": 63.6, "color": "#CD7F32"},
-          ],
-          "ugc_performance": generate_mock_trends(datetime.now() - timedelta(days=150), 5, 150, 50),
-          "advocate_performance_radar": [
-              {"metric": "UGC Creation", "score": 92},
-              {"metric": "Engagement", "score": 88},
-              {"metric": "Influence", "score": 85},
-              {"metric": "Loyalty", "score": 94},
-              {"metric": "Advocacy", "score": 90},
-              {"metric": "Community", "score": 87},
-          ],
-          "loyalty_program_performance": {
-              "points_distribution": [
-                  {"activity": "UGC Creation", "points": 500, "count": 89},
-                  {"activity": "Comments", "points": 50, "count": 1247},
-                  {"activity": "Shares", "points": 100, "count": 456},
-                  {"activity": "Mentions", "points": 150, "count": 234},
-                  {"activity": "Referrals", "points": 1000, "count": 67},
-              ],
-              "reward_redemptions": [
-                  {"reward": "Exclusive Content", "redeemed": 45, "points": 500},
-                  {"reward": "Product Discount", "redeemed": 32, "points": 1000},
-                  {"reward": "Early Access", "redeemed": 28, "points": 750},
-                  {"reward": "Branded Merchandise", "redeemed": 19, "points": 1500},
-                  {"reward": "VIP Event Access", "redeemed": 12, "points": 2500},
-              ],
-              "program_impact": [
-                  {"metric": "Engagement Lift", "value": "61%", "trend": "up"},
-                  {"metric": "UGC Increase", "value": "127%", "trend": "up"},
-                  {"metric": "Retention Rate", "value": "84%", "trend": "up"},
-                  {"metric": "Referral Rate", "value": "23%", "trend": "up"},
-                  {"metric": "Brand Sentiment", "value": "+18%", "trend": "up"},
-              ]
-          }
       }
   }
 
-  print(f"[{datetime.now()}] Returning response data.")
-  return jsonify(response_data)
+
+def render_analysis(aggregates, mentions, sentiment_stats, sections=None):
+  """
+  Builds the structured analytics from analysis aggregates, limited to the named sections if
+  given. mentions are the (text, sentiment) pairs shown as top mentions; sentiment_stats is
+  reported as cache_stats.
+  """
+  return AnalysisSections(aggregates, lambda: mentions, sentiment_stats).all(sections)
+
+def warm_up_sentiment_pool():
+  """
+  Starts the sentiment pool and waits for its workers to load their models, in a daemon thread.
+  If the pool fails, the in-process model (which scoring falls back to) is loaded instead.
+  """
+  def load():
+      try:
+          pool = get_sentiment_pool()
+          if pool.wait_ready() == pool.workers:
+              return
+          log.warning(f"Sentiment pool workers failed to load the model: {pool.error}. Scoring in-process instead.")
+      except Exception as e:
+          log.warning(f"Sentiment pool failed to start: {e}. Scoring in-process instead.")
+      warm_up(background=False, keys=["sentiment"])
+  thread = threading.Thread(target=load, name="sentiment-pool-warm-up", daemon=True)
+  thread.start()
+  return thread
+
+_preloaded = False # Set once preload_models has run, so forked workers warm up their own sentiment pools
+
+def preload_models():
+  """
+  Loads the models in this process before serving, for servers that fork workers afterwards
+  (see gunicorn.conf.py): the workers then share the loaded weights copy-on-write. The
+  sentiment pool is not started here, since its handler threads do not survive a fork;
+  after_fork starts one per server worker instead.
+  """
+  global _preloaded
+  keys = ["generation"] if SENTIMENT_WORKERS > 0 else None # Pool workers load their own sentiment model
+  warm_up(background=False, keys=keys)
+  gc.freeze() # Keep the collector from touching (and so copying) the preloaded objects in every worker
+  _preloaded = True
+
+def after_fork():
+  """Resets per-process state inherited from the parent in a freshly forked server worker."""
+  if sentiment_cache is not None:
+      sentiment_cache.reopen()
+  job_store.reopen()
+  recommendation_service.reopen()
+  inference_limiter.reset()
+  if _preloaded and SENTIMENT_WORKERS > 0 and not sentiment_model.is_mocked():
+      warm_up_sentiment_pool()
+  if "torch" in sys.modules:
+      import torch
+      # Split the cores between the workers instead of every worker using all of them
+      torch.set_num_threads(max(1, (os.cpu_count() or 1) // int(os.environ.get("SCROLLMARK_SERVER_WORKERS", 1))))
+
+def shutdown():
+  """Lets queued and running analysis jobs finish and stops background work, before a worker exits."""
+  analysis_jobs.shutdown(wait=True)
+  recommendation_service.shutdown()
 
 if __name__ == '__main__':
-  app.run(debug=False, port=5000) # Run on port 5000
+  if os.environ.get("SCROLLMARK_WARMUP", "1") == "1":
+      if SENTIMENT_WORKERS > 0 and not sentiment_model.is_mocked():
+          # Sentiment runs in the worker processes, which load their own copies of the model
+          warm_up_sentiment_pool()
+          warm_up(keys=["generation"])
+      else:
+          warm_up() # Load models in the background so the server starts accepting requests immediately
+  # Flask's development server: one process. Use `gunicorn -c gunicorn.conf.py` in production.
+  app.run(debug=False, port=PORT, threaded=True)
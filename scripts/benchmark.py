@@ -0,0 +1,204 @@
+"""
+Reproducible benchmark of the analysis pipeline at increasing export sizes.
+
+For each size, a synthetic export is generated with a fixed seed (see generate_mock_data.py)
+and cached, then analyzed in a fresh process the way /analyze/upload analyzes it. The time
+spent in each stage the pipeline reports (parse, engagement, sentiment, keywords,
+buyer_intent, topics, ...) and the process's peak memory are recorded, along with the topic
+model's fit time, size and largest document-term matrix. Results are written as JSON, and
+--compare flags stages that got slower than a previous results file.
+
+Models:
+  stub - a deterministic stand-in for the sentiment model (labels from a text hash), so the
+         batching and deduplication paths run without model weights; generation is mocked
+  mock - the backend's mock mode: no sentiment inference at all
+  real - the real models; the LLM is timed separately, since analyses no longer wait for it
+
+  python benchmark.py --sizes 18k,250k,1m --output results.json
+  python benchmark.py --sizes 18k,250k,1m --output new.json --compare results.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+from generate_mock_data import generate_csv, parse_rows
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATA_DIR = os.path.join(SCRIPTS_DIR, ".data", "benchmark")
+MODEL_CHOICES = ("stub", "mock", "real")
+
+class StubSentimentPipeline:
+  """Pipeline-compatible stand-in for the sentiment model: a label and score from a hash of each text."""
+  tokenizer = None # Batching falls back to character lengths
+
+  def __call__(self, texts, **kwargs):
+    texts = [texts] if isinstance(texts, str) else texts
+    predictions = []
+    for text in texts:
+        h = zlib.crc32(text.encode("utf-8"))
+        predictions.append({"label": "POSITIVE" if h & 1 else "NEGATIVE", "score": 0.5 + (h % 500) / 1000})
+    return predictions
+
+class StageTimer:
+  """Progress listener (see jobs.track_progress) that adds up the wall time spent in each reported stage."""
+  def __init__(self):
+    self.seconds = {}
+    self.stage = "setup"
+    self.since = time.perf_counter()
+
+  def update(self, stage, fraction=0.0):
+    if stage != self.stage:
+        self.flush()
+        self.stage = stage
+
+  def flush(self):
+    now = time.perf_counter()
+    self.seconds[self.stage] = self.seconds.get(self.stage, 0.0) + now - self.since
+    self.since = now
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+  peak = resource.getrusage(who).ru_maxrss
+  return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1) # Bytes on macOS, KiB on Linux
+
+def run_one(csv_path, models):
+  """Analyzes one export in this process and returns its timings and peak memory."""
+  os.environ["SCROLLMARK_MODELS"] = "real" if models == "real" else "mock"
+  import backend # Reads the environment at import
+  from jobs import track_progress
+  from recommendations import build_prompt, generate_llm_recommendation
+  from telemetry import trace
+  if models == "stub":
+      backend.sentiment_model.override(StubSentimentPipeline())
+  elif models == "real":
+      backend.sentiment_model.get()
+      backend.generation_model.get()
+
+  timer = StageTimer()
+  started = time.perf_counter()
+  with track_progress(timer), trace() as recorded, open(csv_path, "rb") as f:
+      response_data = backend.analyze_csv(f)
+  timer.flush()
+  total = time.perf_counter() - started
+  fits = [span for span in recorded.spans if span.name == "topics"] # One per chunk
+
+  llm_seconds = None
+  generator = backend.generation_model.get()
+  if generator is not None:
+      engagement = response_data["engagement_metrics"]
+      prompt = build_prompt({**engagement, "overall_sentiment": response_data["sentiment_analysis"]["overall_sentiment"]})
+      llm_started = time.perf_counter()
+      generate_llm_recommendation(generator, prompt, backend.RECOMMENDATION_SECONDS)
+      llm_seconds = round(time.perf_counter() - llm_started, 3)
+
+  return {
+      "total_seconds": round(total, 3),
+      "stage_seconds": {stage: round(seconds, 3) for stage, seconds in timer.seconds.items()},
+      "llm_seconds": llm_seconds,
+      "topic_model": {
+          "fit_seconds": round(sum(span.seconds for span in fits), 3),
+          "vocabulary": fits[-1].counts["vocabulary"],
+          "model_mb": round(fits[-1].counts["model_bytes"] / (1 << 20), 2),
+          "peak_matrix_mb": round(max(span.counts["matrix_bytes"] for span in fits) / (1 << 20), 2), # Sparse matrix of one chunk
+      } if fits else None,
+      "peak_rss_mb": peak_rss_mb(),
+      "peak_child_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN), # Chunk preparation workers
+  }
+
+def export_path(data_dir, rows, args):
+  name = f"treehut_{rows}_seed{args.seed}_cap{args.caption_repeat}_dup{args.duplicate_rate}_w{args.min_words}-{args.max_words}_a{args.authors or 'auto'}.csv"
+  return os.path.join(data_dir, name)
+
+def benchmark_size(rows, args):
+  """Generates (or reuses) the export for `rows` and analyzes it in a fresh process."""
+  path = export_path(args.data_dir, rows, args)
+  if not os.path.exists(path):
+      print(f"Generating {rows} rows into {path}...", file=sys.stderr)
+      generate_csv(path, rows, args.seed, caption_repeat=args.caption_repeat, duplicate_rate=args.duplicate_rate, min_words=args.min_words, max_words=args.max_words, authors=args.authors)
+  dataset_dir = tempfile.mkdtemp(prefix="scrollmark-benchmark-")
+  env = {
+      **os.environ,
+      "SCROLLMARK_DATASET_DIR": dataset_dir, # Storing the dataset is part of the analysis
+      "SCROLLMARK_SENTIMENT_CACHE_SIZE": "0", # Measure inference, not earlier runs' cached labels
+      "SCROLLMARK_WARMUP": "0",
+  }
+  try:
+      print(f"Analyzing {rows} rows...", file=sys.stderr)
+      output = subprocess.run([sys.executable, __file__, "--run-one", path, "--models", args.models], cwd=SCRIPTS_DIR, env=env, check=True, capture_output=True, text=True).stdout
+  finally:
+      shutil.rmtree(dataset_dir, ignore_errors=True)
+  result = json.loads(output.strip().splitlines()[-1])
+  return {"rows": rows, "rows_per_second": round(rows / result["total_seconds"]), **result}
+
+def git_version():
+  try:
+      revision = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=SCRIPTS_DIR, capture_output=True, text=True, check=True).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+      return None
+  return revision or None
+
+def compare(results, baseline, threshold):
+  """Returns a line per stage (and total) that got more than `threshold` times slower than baseline."""
+  regressions = []
+  previous = {result["rows"]: result for result in baseline["results"]}
+  for result in results["results"]:
+      old = previous.get(result["rows"])
+      if old is None:
+          continue
+      timings = {"total": (old["total_seconds"], result["total_seconds"])}
+      timings.update({stage: (old["stage_seconds"][stage], seconds) for stage, seconds in result["stage_seconds"].items() if stage in old["stage_seconds"]})
+      for stage, (before, after) in timings.items():
+          if before > 0.05 and after > before * threshold: # Ignore noise in near-zero stages
+              regressions.append(f"{result['rows']} rows, {stage}: {before:.3f}s -> {after:.3f}s ({after / before:.2f}x)")
+  return regressions
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline on synthetic exports.")
+  parser.add_argument("--sizes", default="18k,250k,1m", help="Comma-separated row counts, e.g. 18k,250k,1m,10m")
+  parser.add_argument("--models", default="stub", choices=MODEL_CHOICES, help="How sentiment and generation run (default: stub)")
+  parser.add_argument("--seed", type=int, default=42, help="Seed of the synthetic exports")
+  parser.add_argument("--caption-repeat", type=float, default=1.0, help="Fraction of rows carrying their post's caption")
+  parser.add_argument("--duplicate-rate", type=float, default=0.25, help="Fraction of comments that are stock one-liners")
+  parser.add_argument("--min-words", type=int, default=1, help="Minimum words in a composed comment")
+  parser.add_argument("--max-words", type=int, default=60, help="Maximum words in a composed comment")
+  parser.add_argument("--authors", type=int, default=None, help="Distinct commenters in the exports (default: one per 5 rows)")
+  parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Where generated exports are cached")
+  parser.add_argument("--output", default="benchmark-results.json", help="JSON file to write the results to")
+  parser.add_argument("--compare", help="Previous results file to compare against")
+  parser.add_argument("--threshold", type=float, default=1.2, help="Slowdown ratio reported as a regression")
+  parser.add_argument("--run-one", help=argparse.SUPPRESS) # Internal: analyze one export and print its result
+  args = parser.parse_args()
+
+  if args.run_one:
+      print(json.dumps(run_one(args.run_one, args.models)))
+      sys.exit(0)
+
+  results = {
+      "version": git_version(),
+      "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+      "python": platform.python_version(),
+      "machine": {"platform": platform.platform(), "cpus": os.cpu_count()},
+      "settings": {key: getattr(args, key) for key in ("models", "seed", "caption_repeat", "duplicate_rate", "min_words", "max_words", "authors")},
+      "results": [benchmark_size(parse_rows(size), args) for size in args.sizes.split(",")],
+  }
+  with open(args.output, "w") as f:
+      json.dump(results, f, indent=2)
+  for result in results["results"]:
+      stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in result["stage_seconds"].items())
+      topics = result["topic_model"]
+      topic_note = f", topic fit {topics['fit_seconds']:.2f}s, model {topics['model_mb']} MB, matrix {topics['peak_matrix_mb']} MB" if topics else ""
+      print(f"{result['rows']:>10} rows: {result['total_seconds']:.2f}s ({result['rows_per_second']} rows/s, peak {result['peak_rss_mb']} MB{topic_note}) - {stages}")
+
+  if args.compare:
+      with open(args.compare) as f:
+          regressions = compare(results, json.load(f), args.threshold)
+      for regression in regressions:
+          print(f"Regression: {regression}")
+      sys.exit(1 if regressions else 0)
@@ -0,0 +1,254 @@
+"""
+Persistent columnar store of analyzed uploads.
+
+Each stored dataset is a directory holding:
+  comments/<part>.parquet  - the comment rows with their per-row results (sentiment labels,
+                             intent masks), one part per upload or append
+  comments/<part>.keys.npy - the part's distinct row keys, sorted, when the store has a
+                             key_column (see contains)
+  tables-<version>/        - small tables (Parquet) and documents (JSON) describing the whole
+                             dataset, e.g. the posts table and the analysis aggregates
+  meta.json                - names the current parts and tables version, and the versions
+                             and parts that commits replaced (retired)
+meta.json is replaced atomically after everything it names has been written, so readers
+and crashed writers never see a half-written dataset. What a commit replaces is deleted
+only RETIRED_SECONDS later, by a later commit, so a reader still using the previous meta
+can finish; one that takes longer gets DatasetChanged. Commits take a file lock in the
+dataset's directory, so processes sharing the store (e.g. gunicorn workers) commit one at a
+time. Reopening a dataset reads the
+columns back memory-mapped, so the analysis can be served again without re-parsing the
+CSV or re-running inference.
+"""
+import contextlib
+import fcntl
+import json
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+RETIRED_SECONDS = 600 # How long replaced tables and parts stay readable after a commit
+
+class DatasetChanged(Exception):
+  """A file named by the meta a reader used was deleted by later commits; reading again sees the new version."""
+
+class DatasetStore:
+  def __init__(self, root, key_column=None):
+    import pyarrow # noqa: F401 - Parquet support is required; fail here rather than on first save
+    self.root = root
+    self.key_column = key_column # Column of comment rows indexed for contains, or None
+    os.makedirs(root, exist_ok=True)
+
+  def _path(self, dataset_id, *names):
+    if not dataset_id or not all(c in "0123456789abcdef" for c in dataset_id):
+        raise KeyError(dataset_id) # Ids are uuid4 hex; anything else can't name a stored dataset
+    return os.path.join(self.root, dataset_id, *names)
+
+  @contextlib.contextmanager
+  def lock(self, dataset_id, name="update"):
+    """
+    Holds an exclusive lock on a dataset, across threads and processes, while the block runs.
+    The default lock serializes read-modify-write sequences such as appends; commits take their
+    own. Raises KeyError for unknown ids.
+    """
+    path = self._path(dataset_id)
+    if not os.path.isdir(path):
+        raise KeyError(dataset_id)
+    with open(os.path.join(path, f".{name}.lock"), "a") as f: # Each open is its own lock, so threads exclude each other too
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+  def create(self):
+    """Reserves a new dataset id. The dataset becomes visible with its first commit."""
+    dataset_id = uuid.uuid4().hex
+    os.makedirs(self._path(dataset_id, "comments"))
+    return dataset_id
+
+  def write_part(self, dataset_id, comments):
+    """
+    Writes a part of comment rows, which becomes part of the dataset once a commit names it,
+    with the sorted distinct values of its key_column next to it. Returns the part name.
+    """
+    part = uuid.uuid4().hex
+    if self.key_column in comments.columns:
+        np.save(self._path(dataset_id, "comments", f"{part}.keys.npy"), np.unique(comments[self.key_column].dropna().to_numpy()))
+    comments.to_parquet(self._path(dataset_id, "comments", f"{part}.parquet"), index=False)
+    return part
+
+  def commit(self, dataset_id, tables, meta, parts, rows, append=False):
+    """
+    Makes written parts (holding `rows` comment rows in total) part of a dataset, together with
+    tables ({name: DataFrame or JSON-serializable dict}) and meta (a JSON-serializable dict).
+    With append, the parts are added to the dataset's existing parts; otherwise they replace them.
+    Tables and meta always replace the previous ones.
+    """
+    with self.lock(dataset_id, "commit"):
+        try:
+            previous = self.meta(dataset_id)
+        except KeyError:
+            previous = None
+        version = uuid.uuid4().hex
+        tables_dir = self._path(dataset_id, f"tables-{version}")
+        os.makedirs(tables_dir)
+        for name, table in tables.items():
+            if isinstance(table, pd.DataFrame):
+                table.to_parquet(os.path.join(tables_dir, f"{name}.parquet"))
+            else:
+                with open(os.path.join(tables_dir, f"{name}.json"), "w") as f:
+                    json.dump(table, f)
+
+        if append and previous:
+            parts = previous["parts"] + parts
+            rows = previous["rows"] + rows
+        # Retire what the previous meta named and the new one doesn't; delete what retired long enough ago
+        now = time.time()
+        retired = previous.get("retired", []) + [{"tables": previous["tables"], "parts": sorted(set(previous["parts"]) - set(parts)), "at": now}] if previous else []
+        expired = [entry for entry in retired if now - entry["at"] >= RETIRED_SECONDS]
+        meta = {**meta, "dataset_id": dataset_id, "parts": parts, "tables": version, "rows": rows, "updated": now, "retired": [entry for entry in retired if entry not in expired]}
+        staging = self._path(dataset_id, f".meta-{version}.json")
+        with open(staging, "w") as f:
+            json.dump(meta, f)
+        os.replace(staging, self._path(dataset_id, "meta.json")) # Commit point
+
+        for entry in expired:
+            shutil.rmtree(self._path(dataset_id, f"tables-{entry['tables']}"), ignore_errors=True)
+            for old_part in entry["parts"]:
+                for filename in (f"{old_part}.parquet", f"{old_part}.keys.npy"):
+                    try:
+                        os.remove(self._path(dataset_id, "comments", filename))
+                    except FileNotFoundError:
+                        pass
+
+  def save(self, tables, comments, meta, dataset_id=None, append=False):
+    """
+    Writes comment rows as one part and commits it with tables and meta (see commit). Creates a
+    new dataset unless dataset_id is given. Returns the dataset id.
+    """
+    dataset_id = dataset_id or self.create()
+    part = self.write_part(dataset_id, comments)
+    self.commit(dataset_id, tables, meta, [part], len(comments), append=append)
+    return dataset_id
+
+  def meta(self, dataset_id):
+    """Returns a dataset's meta dict. Raises KeyError for unknown ids."""
+    try:
+        with open(self._path(dataset_id, "meta.json")) as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        raise KeyError(dataset_id)
+    if "parts" not in meta:
+        raise KeyError(dataset_id) # Written by an older layout
+    return meta
+
+  def load_tables(self, dataset_id, meta=None):
+    """
+    Returns the {name: DataFrame or dict} tables of a dataset. Raises KeyError for unknown ids
+    and DatasetChanged if meta's version has been deleted since.
+    """
+    meta = meta or self.meta(dataset_id)
+    tables_dir = self._path(dataset_id, f"tables-{meta['tables']}")
+    tables = {}
+    try:
+        filenames = os.listdir(tables_dir)
+    except FileNotFoundError:
+        raise DatasetChanged(dataset_id)
+    for filename in filenames:
+        name, extension = os.path.splitext(filename)
+        if extension == ".parquet":
+            tables[name] = pd.read_parquet(os.path.join(tables_dir, filename), memory_map=True)
+        elif extension == ".json":
+            with open(os.path.join(tables_dir, filename)) as f:
+                tables[name] = json.load(f)
+    return tables
+
+  def load_comments(self, dataset_id, columns=None, meta=None):
+    """
+    Returns the comment rows of a dataset in insertion order, reading the Parquet parts
+    memory-mapped. columns limits which columns are read. Raises KeyError for unknown ids and
+    DatasetChanged if a part meta names has been deleted since.
+    """
+    meta = meta or self.meta(dataset_id)
+    parts = [self._read_part(dataset_id, part, columns) for part in meta["parts"]]
+    return pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+
+  def contains(self, dataset_id, keys, meta=None):
+    """
+    Returns whether each of keys (an array) is a key_column value of a dataset's rows. Each
+    part's sorted key file is read memory-mapped and binary-searched, so a lookup costs about
+    len(keys) * log(rows) per part, whatever the dataset's size. Parts written without a key
+    file (by an older version) are searched by reading their key column. Raises KeyError for
+    unknown ids and DatasetChanged if a part meta names has been deleted since.
+    """
+    meta = meta or self.meta(dataset_id)
+    keys = np.asarray(keys)
+    found = np.zeros(len(keys), dtype=bool)
+    for part in meta["parts"]:
+        try:
+            stored = np.load(self._path(dataset_id, "comments", f"{part}.keys.npy"), mmap_mode="r")
+        except FileNotFoundError:
+            stored = np.unique(self._read_part(dataset_id, part, [self.key_column])[self.key_column].dropna().to_numpy())
+        if len(stored) and len(keys):
+            found |= stored[np.searchsorted(stored, keys).clip(max=len(stored) - 1)] == keys
+    return found
+
+  def _read_part(self, dataset_id, part, columns):
+    """Reads one part; requested columns the part was written without (e.g. by an older version) come back as nulls."""
+    import pyarrow.parquet as pq
+    path = self._path(dataset_id, "comments", f"{part}.parquet")
+    try:
+        if columns is None:
+            return pd.read_parquet(path, memory_map=True)
+        present = set(pq.read_schema(path).names)
+        frame = pd.read_parquet(path, columns=[column for column in columns if column in present], memory_map=True)
+    except FileNotFoundError:
+        raise DatasetChanged(dataset_id)
+    return frame.reindex(columns=columns)
+
+  def take_texts(self, dataset_id, positions, text_column, columns, meta=None):
+    """
+    Returns the rows at `positions` among the rows whose text_column is not null, as a list of
+    tuples of `columns` values, in the order of positions. Only these columns are read.
+    """
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    meta = meta or self.meta(dataset_id)
+    wanted = sorted(set(positions))
+    found = {}
+    offset = 0
+    for part in meta["parts"]:
+        if not wanted:
+            break
+        try:
+            table = pq.read_table(self._path(dataset_id, "comments", f"{part}.parquet"), columns=columns, memory_map=True)
+        except FileNotFoundError:
+            raise DatasetChanged(dataset_id)
+        table = table.filter(pc.is_valid(table[text_column]))
+        in_part = [position for position in wanted if position < offset + table.num_rows]
+        if in_part:
+            taken = table.take([position - offset for position in in_part]).to_pydict()
+            for i, position in enumerate(in_part):
+                found[position] = tuple(taken[column][i] for column in columns)
+            wanted = wanted[len(in_part):]
+        offset += table.num_rows
+    return [found[position] for position in positions]
+
+  def list(self):
+    """Returns the meta of every stored dataset, most recently updated first."""
+    metas = []
+    for dataset_id in os.listdir(self.root):
+        try:
+            metas.append(self.meta(dataset_id))
+        except (KeyError, ValueError):
+            continue
+    return sorted(metas, key=lambda meta: meta.get("updated", 0), reverse=True)
+
+  def delete(self, dataset_id):
+    """Removes a stored dataset. Raises KeyError for unknown ids."""
+    with self.lock(dataset_id, "commit"):
+        shutil.rmtree(self._path(dataset_id))
@@ -0,0 +1,156 @@
+"""
+Synthetic @treehut-style Instagram comment exports.
+
+Writes a CSV with the export columns (timestamp, media_id, media_caption, comment_text,
+username) for March 2025. A fixed seed always produces the same file. The generator is written chunk by
+chunk, so exports of 10M rows are generated in bounded memory. Knobs control the shape of the
+data the analysis is sensitive to:
+  posts           - number of posts; comments spread over them with a long-tailed popularity
+  authors         - number of distinct commenters; a few regulars write many of the comments
+  caption_repeat  - fraction of a post's rows that carry its caption (1.0, as in real exports)
+  duplicate_rate  - fraction of comments that are stock one-liners ("Need this 😍"), which
+                    the sentiment cache and text deduplication collapse
+  min/max_words   - bounds of the target word count of composed comments (log-normally
+                    distributed in between; comments are whole phrases, so lengths are approximate)
+
+  python generate_mock_data.py                             # ~18k rows into data/
+  python generate_mock_data.py --rows 1m --output /tmp/treehut_1m.csv
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "treehut_comments_march_2025.csv")
+PERIOD_START = np.datetime64("2025-03-01T00:00:00", "s")
+PERIOD_SECONDS = 31 * 24 * 3600
+WRITE_CHUNK_ROWS = 250000
+ROW_SUFFIXES = {"k": 1000, "m": 1000000}
+
+PRODUCTS = ["shea sugar scrub", "body butter", "moisturizing shave oil", "hydrating body wash", "foaming gel wash", "lip scrub", "body serum", "hand cream"]
+SCENTS = ["Tropical Glow", "Moroccan Rose", "Vanilla", "Coconut Lime", "Tahitian Vanilla Bean", "Pink Champagne", "Watermelon", "Candy Crush", "Cotton Candy", "Sugar Papaya"]
+CAPTION_TEMPLATES = [
+    "Meet the new {scent} {product} ✨ Available now!",
+    "Your {scent} {product} routine, but make it a ritual 🌴",
+    "POV: your skin after our {product} 🧖‍♀️ #treehut",
+    "Giveaway time! Tag a friend who needs the {scent} {product} 🎁",
+    "Restocked: {scent} {product}. Which scent is your fave?",
+    "Self-care Sunday with {scent} 💕",
+]
+STOCK_COMMENTS = [
+    "Need this 😍", "Love this!", "😍😍😍", "Obsessed!!", "🔥🔥", "My favorite!", "I need this in my life",
+    "Yesss", "❤️❤️❤️", "So good", "Want!", "Omg yes", "This smells amazing", "Best scrub ever",
+]
+OPENERS = ["omg", "honestly", "okay but", "not gonna lie", "ngl", "wait", "so", "literally", "", "", ""]
+FRAGMENTS = [
+    "the {scent} {product} smells amazing", "my skin has never been this soft", "i use the {product} every day",
+    "this {product} is my holy grail", "the {scent} scent lasts all day", "can't find {scent} anywhere",
+    "what's the price of the {product}", "where can i buy the {scent} {product}", "how much does the {product} cost",
+    "is there a discount code", "please bring back {scent}", "my order arrived damaged", "still waiting on my order",
+    "customer support never replied", "the {product} broke me out", "too sticky for me", "need help choosing a scent",
+    "is the {product} safe for sensitive skin", "would love a trial size", "do you ship to canada",
+    "just bought three of these", "the packaging is so cute", "tried it and loved it", "my daughter stole my {product}",
+    "any feedback on the new formula", "will this {product} help with dry skin", "subscribe and save please",
+    "@bestie we need the {scent} {product}", "@sis look at this", "this review convinced me",
+]
+HANDLE_WORDS = ["glow", "scrub", "vanilla", "coco", "sugar", "rose", "skin", "beauty", "tropic", "papaya", "shea", "self.care"]
+CLOSERS = ["😍", "🥰", "❤️", "🙏", "!!", "?", "😭", "✨", "", "", "", ""]
+
+def parse_rows(text):
+  """Parses a row count such as 18000, 250k or 1m."""
+  text = str(text).strip().lower()
+  multiplier = ROW_SUFFIXES.get(text[-1:], 1)
+  return int(float(text[:-1] if multiplier > 1 else text) * multiplier)
+
+def fill(template, rng):
+  """Fills a caption template with a random scent and product."""
+  return template.format(scent=SCENTS[rng.integers(len(SCENTS))], product=PRODUCTS[rng.integers(len(PRODUCTS))])
+
+def filled_fragments():
+  """Every fragment with every scent and product filled in, as an array to index into."""
+  variants = {fragment.format(scent=scent, product=product) for fragment in FRAGMENTS for scent in SCENTS for product in PRODUCTS}
+  return np.array(sorted(variants), dtype=object)
+
+FILLED_FRAGMENTS = filled_fragments()
+FRAGMENT_WORDS = 6 # Rough words per fragment
+
+def compose_comments(rng, words):
+  """Strings random fragments together into one comment of about words[i] words per entry."""
+  counts = np.maximum(1, np.rint(words / FRAGMENT_WORDS).astype(int))
+  fragments = FILLED_FRAGMENTS[rng.integers(len(FILLED_FRAGMENTS), size=int(counts.sum()))]
+  openers = np.asarray(OPENERS, dtype=object)[rng.integers(len(OPENERS), size=len(words))]
+  closers = np.asarray(CLOSERS, dtype=object)[rng.integers(len(CLOSERS), size=len(words))]
+  ends = np.cumsum(counts)
+  return [
+      " ".join(part for part in (opener, *fragments[end - count:end], closer) if part)
+      for opener, closer, count, end in zip(openers, closers, counts, ends)
+  ]
+
+def generate_posts(rng, posts):
+  """Returns the posts' ids, captions, publish times (seconds into March) and popularity weights."""
+  media_ids = [str(17841400000000000 + 7919 * i) for i in range(posts)] # Instagram-like numeric ids
+  captions = [fill(CAPTION_TEMPLATES[rng.integers(len(CAPTION_TEMPLATES))], rng) for _ in range(posts)]
+  published = np.sort(rng.integers(0, PERIOD_SECONDS - 3600, posts))
+  popularity = 1.0 / np.arange(1, posts + 1) ** 1.1 # Zipf-like: a few posts draw most comments
+  popularity = rng.permutation(popularity / popularity.sum())
+  return media_ids, captions, published, popularity
+
+def generate_authors(rng, authors):
+  """Returns the commenters' handles and how often each comments (Zipf-like, like post popularity)."""
+  words = np.asarray(HANDLE_WORDS, dtype=object)[rng.integers(len(HANDLE_WORDS), size=authors)]
+  handles = np.array([f"{word}_{i}" for i, word in enumerate(words)], dtype=object)
+  activity = 1.0 / np.arange(1, authors + 1) ** 0.9
+  return handles, rng.permutation(activity / activity.sum())
+
+def generate_chunk(rng, posts, authors, rows, caption_repeat, duplicate_rate, min_words, max_words):
+  """Returns a DataFrame of `rows` export rows."""
+  media_ids, captions, published, popularity = posts
+  handles, activity = authors
+  post = rng.choice(len(media_ids), size=rows, p=popularity)
+  # Comments arrive after their post, most within a day
+  delay = np.minimum(rng.exponential(18 * 3600, rows).astype(np.int64), PERIOD_SECONDS - 1 - published[post])
+  timestamps = PERIOD_START + (published[post] + delay).astype("timedelta64[s]")
+
+  words = np.clip(np.rint(rng.lognormal(np.log(7), 0.7, rows)), min_words, max_words).astype(int)
+  comments = np.asarray(compose_comments(rng, words), dtype=object)
+  stock = rng.random(rows) < duplicate_rate
+  comments[stock] = np.asarray(STOCK_COMMENTS, dtype=object)[rng.integers(len(STOCK_COMMENTS), size=int(stock.sum()))]
+  comments[rng.random(rows) < 0.02] = ""
+  with_caption = rng.random(rows) < caption_repeat
+  return pd.DataFrame({
+      "timestamp": pd.to_datetime(timestamps).strftime("%Y-%m-%d %H:%M:%S"),
+      "media_id": np.asarray(media_ids, dtype=object)[post],
+      "media_caption": np.where(with_caption, np.asarray(captions, dtype=object)[post], ""),
+      "comment_text": comments,
+      "username": handles[rng.choice(len(handles), size=rows, p=activity)],
+  })
+
+def generate_csv(path, rows, seed=42, posts=None, caption_repeat=1.0, duplicate_rate=0.25, min_words=1, max_words=60, authors=None):
+  """Writes `rows` synthetic export rows to path (rows in timestamp order within each chunk). Returns path."""
+  rng = np.random.default_rng(seed)
+  post_table = generate_posts(rng, posts or max(20, rows // 50))
+  author_table = generate_authors(rng, authors or max(10, rows // 5))
+  os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+  with open(path, "w", newline="", encoding="utf-8") as f:
+      for start in range(0, rows, WRITE_CHUNK_ROWS):
+          chunk = generate_chunk(rng, post_table, author_table, min(WRITE_CHUNK_ROWS, rows - start), caption_repeat, duplicate_rate, min_words, max_words)
+          chunk.sort_values("timestamp", kind="stable").to_csv(f, index=False, header=start == 0)
+  return path
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Generate a synthetic @treehut comment export.")
+  parser.add_argument("--rows", default="18000", help="Number of rows, e.g. 18000, 250k, 1m, 10m (default 18000)")
+  parser.add_argument("--seed", type=int, default=42, help="Random seed; the same seed produces the same file")
+  parser.add_argument("--posts", type=int, default=None, help="Number of posts (default: one per 50 rows, at least 20)")
+  parser.add_argument("--authors", type=int, default=None, help="Number of distinct commenters (default: one per 5 rows, at least 10)")
+  parser.add_argument("--caption-repeat", type=float, default=1.0, help="Fraction of rows carrying their post's caption")
+  parser.add_argument("--duplicate-rate", type=float, default=0.25, help="Fraction of comments that are stock one-liners")
+  parser.add_argument("--min-words", type=int, default=1, help="Minimum words in a composed comment")
+  parser.add_argument("--max-words", type=int, default=60, help="Maximum words in a composed comment")
+  parser.add_argument("--output", default=DEFAULT_OUTPUT, help="CSV file to write")
+  args = parser.parse_args()
+
+  rows = parse_rows(args.rows)
+  generate_csv(args.output, rows, args.seed, args.posts, args.caption_repeat, args.duplicate_rate, args.min_words, args.max_words, args.authors)
+  print(f"Wrote {rows} rows to {args.output}")
@@ -0,0 +1,39 @@
+"""
+Production server settings: `gunicorn -c gunicorn.conf.py` from the scripts directory.
+
+The app and its models are loaded once in the master process and the workers are forked
+from it, so every worker shares the model weights copy-on-write instead of loading its own
+copy. Each worker serves requests on a few threads, and admits synchronous analyses through
+its inference limiter (see serving.py). On SIGTERM, workers stop accepting connections,
+finish in-flight requests and queued analysis jobs, and exit within graceful_timeout.
+
+Two workers are the default. Analysis jobs and LLM recommendations are kept in a SQLite file
+all workers open (SCROLLMARK_STATE_PATH, see shared_state.py), so the dashboard's /jobs/<id>
+and /recommendations/<id> polls can land on any worker, without sticky sessions.
+"""
+import os
+
+wsgi_app = "backend:app"
+bind = os.environ.get("SCROLLMARK_BIND", f"0.0.0.0:{os.environ.get('SCROLLMARK_PORT', 5000)}")
+workers = int(os.environ.get("SCROLLMARK_SERVER_WORKERS", 2)) # Job state is shared; see above
+threads = int(os.environ.get("SCROLLMARK_SERVER_THREADS", 4)) # Requests served concurrently per worker
+worker_class = "gthread"
+preload_app = True # Import the app (and load models, see on_starting) before forking workers
+timeout = int(os.environ.get("SCROLLMARK_SERVER_TIMEOUT", 300)) # Large synchronous analyses take minutes
+graceful_timeout = int(os.environ.get("SCROLLMARK_GRACEFUL_TIMEOUT", 120))
+keepalive = 5
+
+os.environ["SCROLLMARK_SERVER_WORKERS"] = str(workers) # Read by backend.after_fork to split CPU threads
+
+def on_starting(server):
+  if os.environ.get("SCROLLMARK_WARMUP", "1") == "1":
+      import backend
+      backend.preload_models()
+
+def post_fork(server, worker):
+  import backend
+  backend.after_fork()
+
+def worker_exit(server, worker):
+  import backend
+  backend.shutdown()
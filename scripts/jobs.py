@@ -0,0 +1,275 @@
+"""
+Background analysis jobs with stage-level progress reporting.
+
+A JobManager runs submitted functions on a small worker pool. Code running inside a job
+calls report_progress(stage, fraction) at the points where it logs stage starts and
+advances its progress bars; outside a job those calls do nothing.
+
+Jobs are written to a JobStore as they change (progress at most every PROGRESS_WRITE_SECONDS),
+and their results when they finish, so a JobManager in another server worker sharing the
+store's file can report on them: get() returns the local Job when this process runs it and a
+StoredJob read from the store otherwise.
+"""
+import json
+import os
+import pickle
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import shared_state
+import telemetry
+from telemetry import log
+
+PROGRESS_WRITE_SECONDS = 0.5 # Progress-only updates are written to the store at most this often
+JOB_POLL_SECONDS = 0.25 # How often a StoredJob is re-read while waiting for changes
+
+_current = threading.local() # The job running on this worker thread, if any
+
+def report_progress(stage, fraction=0.0):
+  """Records that the current job reached `fraction` (0-1) of `stage`. No-op outside a job."""
+  job = getattr(_current, 'job', None)
+  if job is not None:
+      job.update(stage, fraction)
+
+@contextmanager
+def track_progress(listener):
+  """Routes report_progress calls on this thread to listener.update(stage, fraction), e.g. to time stages outside a job."""
+  previous = getattr(_current, 'job', None)
+  _current.job = listener
+  try:
+      yield listener
+  finally:
+      _current.job = previous
+
+class Job:
+  def __init__(self, stages, store=None):
+    self.id = uuid.uuid4().hex
+    self.status = "queued" # queued -> running -> done | failed
+    self.stage = None
+    self.progress = 0.0
+    self.result = None
+    self.error = None
+    self.created = time.time()
+    self.finished = None
+    self.trace = None # Spans recorded while the job ran (see telemetry.span)
+    self.version = 0 # Bumped on every change so listeners can wait for updates
+    self._stages = stages # [(stage name, weight)], weights sum to 1
+    self._changed = threading.Condition()
+    self._store = store # JobStore the job is written to as it changes, or None
+    self._written = 0.0 # When the store was last written
+
+  def update(self, stage=None, fraction=0.0, status=None):
+    """Moves the job to `stage` (and `fraction` of it) and wakes up anyone waiting for changes."""
+    with self._changed:
+        previous_stage = self.stage
+        if status is not None:
+            self.status = status
+        if stage is not None:
+            done = 0.0
+            for name, weight in self._stages:
+                if name == stage:
+                    # Progress never moves backwards, even if a stage is reported out of order
+                    self.progress = max(self.progress, done + weight * min(1.0, max(0.0, fraction)))
+                    break
+                done += weight
+            self.stage = stage
+        if self.status in ("done", "failed"):
+            self.finished = time.time()
+            if self.status == "done":
+                self.progress = 1.0
+        self.version += 1
+        now = time.time()
+        if self._store is not None and (status is not None or self.stage != previous_stage or now - self._written >= PROGRESS_WRITE_SECONDS):
+            # Stored before waiters wake, so a client told the job is done finds its result in any worker
+            self._written = now
+            try:
+                self._store.save(self, result=self.status == "done")
+            except Exception as e: # The job itself goes on; only other workers miss the update
+                log.warning(f"Could not store the state of job {self.id}: {e}")
+        self._changed.notify_all()
+
+  def wait_for_change(self, version, timeout):
+    """Blocks until the job changes past `version` or `timeout` seconds pass. Returns the current version."""
+    with self._changed:
+        self._changed.wait_for(lambda: self.version != version, timeout=timeout)
+        return self.version
+
+  def snapshot(self):
+    """Returns the job's public status fields."""
+    return {
+        "job_id": self.id,
+        "status": self.status,
+        "stage": self.stage,
+        "progress": round(self.progress * 100, 1), # Percent
+        "error": self.error,
+        "created": self.created,
+        "finished": self.finished,
+    }
+
+class StoredJob:
+  """A job read from a JobStore, e.g. one another server worker runs. It reads like a Job."""
+  def __init__(self, store, fields):
+    self._store = store
+    self.__dict__.update(fields)
+
+  snapshot = Job.snapshot
+
+  def wait_for_change(self, version, timeout):
+    """Like Job.wait_for_change, re-reading the store every JOB_POLL_SECONDS."""
+    deadline = time.time() + timeout
+    while self.version == version and time.time() < deadline:
+        time.sleep(min(JOB_POLL_SECONDS, max(0.0, deadline - time.time())))
+        self.__dict__.update(self._store.load(self.id) or {})
+    return self.version
+
+  @property
+  def result(self):
+    return self._store.load_result(self.id)[0]
+
+  @property
+  def trace(self):
+    return RecordedSpans(self._store.load_result(self.id)[1])
+
+class RecordedSpans(list):
+  """Spans a job recorded, as stored: to_list() returns them like telemetry.Trace.to_list()."""
+  def to_list(self):
+    return list(self)
+
+class JobStore:
+  """
+  Status fields and results of jobs in a SQLite file shared by the server's worker processes
+  (see shared_state.py), or in memory without a path. Results are stored pickled, so job
+  functions must return picklable values.
+  """
+  def __init__(self, path=None):
+    self.path = path
+    self._lock = threading.Lock()
+    self._conn = self._connect()
+
+  def _connect(self):
+    conn = shared_state.connect(self.path)
+    conn.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, pid INTEGER NOT NULL, status TEXT NOT NULL, stage TEXT, progress REAL NOT NULL, error TEXT, created REAL NOT NULL, finished REAL, version INTEGER NOT NULL, result BLOB, spans TEXT)")
+    conn.commit()
+    return conn
+
+  def reopen(self):
+    """Opens a new connection, e.g. in a forked worker: SQLite connections must not cross a fork."""
+    self._lock = threading.Lock()
+    self._conn = self._connect()
+
+  def save(self, job, result=False):
+    """Writes a job's status fields, and with result also its result and recorded spans."""
+    fields = (job.status, job.stage, job.progress, job.error, job.finished, job.version)
+    with self._lock:
+        self._conn.execute(
+            "INSERT INTO jobs (id, pid, status, stage, progress, error, finished, version, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET status = excluded.status, stage = excluded.stage, progress = excluded.progress, error = excluded.error, finished = excluded.finished, version = excluded.version",
+            (job.id, os.getpid(), *fields, job.created))
+        if result:
+            spans = job.trace.to_list() if job.trace is not None else []
+            self._conn.execute("UPDATE jobs SET result = ?, spans = ? WHERE id = ?", (pickle.dumps(job.result, protocol=pickle.HIGHEST_PROTOCOL), json.dumps(spans), job.id))
+        self._conn.commit()
+
+  def load(self, job_id):
+    """
+    Returns a job's status fields as a dict, or None for unknown jobs. A job left unfinished by
+    a process that no longer runs is marked failed.
+    """
+    with self._lock:
+        row = self._conn.execute("SELECT pid, status, stage, progress, error, created, finished, version FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        pid, *fields = row
+        job = dict(zip(("status", "stage", "progress", "error", "created", "finished", "version"), fields), id=job_id)
+        if job["status"] in ("queued", "running") and not shared_state.process_alive(pid):
+            job.update(status="failed", error="The server worker running the job exited", finished=time.time(), version=job["version"] + 1)
+            self._conn.execute("UPDATE jobs SET status = ?, error = ?, finished = ?, version = ? WHERE id = ? AND version = ?", (job["status"], job["error"], job["finished"], job["version"], job_id, job["version"] - 1))
+            self._conn.commit()
+    return job
+
+  def load_result(self, job_id):
+    """Returns (result, spans) of a finished job; (None, []) before it finished."""
+    with self._lock:
+        row = self._conn.execute("SELECT result, spans FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None or row[0] is None:
+        return None, []
+    return pickle.loads(row[0]), json.loads(row[1])
+
+  def delete(self, job_id):
+    with self._lock:
+        self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        self._conn.commit()
+
+  def evict(self, max_jobs):
+    """Deletes the oldest finished jobs once more than max_jobs are stored."""
+    with self._lock:
+        self._conn.execute(
+            "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE finished IS NOT NULL ORDER BY created LIMIT MAX(0, (SELECT COUNT(*) FROM jobs) - ?))",
+            (max_jobs,))
+        self._conn.commit()
+
+class JobManager:
+  def __init__(self, stages, workers=2, max_jobs=100, store=None):
+    self.stages = stages
+    self.max_jobs = max_jobs
+    self.store = store or JobStore() # Shared with the other server workers when it has a path
+    self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analysis-job")
+    self._jobs = {} # {job id: Job} run by this process, in submission order
+    self._lock = threading.Lock()
+
+  def submit(self, fn, *args):
+    """Queues fn(*args) as a job and returns it. The job's result is fn's return value."""
+    job = Job(self.stages, self.store)
+    with self._lock:
+        self._jobs[job.id] = job
+        self._evict()
+    self.store.save(job)
+    self.store.evict(self.max_jobs)
+    try:
+        self._executor.submit(self._run, job, fn, args)
+    except RuntimeError: # Shut down: the job will never run, so don't leave it queued
+        with self._lock:
+            self._jobs.pop(job.id, None)
+        self.store.delete(job.id)
+        raise
+    return job
+
+  def shutdown(self, wait=True):
+    """Stops accepting jobs; with wait, blocks until queued and running jobs have finished."""
+    self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+  def get(self, job_id):
+    """Returns the Job if this process runs it, else the StoredJob another process stored, or None."""
+    with self._lock:
+        job = self._jobs.get(job_id)
+    if job is not None:
+        return job
+    fields = self.store.load(job_id)
+    return StoredJob(self.store, fields) if fields is not None else None
+
+  def _run(self, job, fn, args):
+    _current.job = job
+    job.update(status="running")
+    try:
+        with telemetry.trace() as recorded:
+            job.trace = recorded
+            job.result = fn(*args)
+        job.update(status="done")
+        log.info(f"Analysis job {job.id} finished in {time.time() - job.created:.1f} s {recorded.server_timing()}")
+    except Exception as e:
+        log.error(f"Analysis job {job.id} failed: {e}")
+        job.error = str(e)
+        job.update(status="failed")
+    finally:
+        _current.job = None
+
+  def _evict(self):
+    """Drops the oldest finished jobs once more than max_jobs are held."""
+    excess = len(self._jobs) - self.max_jobs
+    if excess <= 0:
+        return
+    for job_id in [job_id for job_id, job in self._jobs.items() if job.finished is not None][:excess]:
+        del self._jobs[job_id]
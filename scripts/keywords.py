@@ -0,0 +1,87 @@
+"""
+Single-pass keyword counting.
+
+KeywordCounter tokenizes each text once and updates unigram and bigram counts as it goes,
+both overall and per time bucket (e.g. per week), so weekly breakdowns come from the same
+pass as the overall ranking.
+"""
+import heapq
+import re
+from collections import Counter, defaultdict
+
+WORD_PATTERN = re.compile(r'\b[a-z]{3,}\b') # Simple tokenization: lowercase alphabetic words of 3+ letters
+BIGRAM_GAP_PATTERN = re.compile(r'[\s\-]+') # What may separate the two words of a bigram
+
+# Common stopwords (can be expanded)
+STOPWORDS = frozenset(['the', 'and', 'is', 'in', 'it', 'to', 'of', 'for', 'on', 'with', 'a', 'an', 'that', 'this', 'are', 'be', 'as', 'by', 'at', 'from', 'or', 'was', 'has', 'had', 'not', 'but', 'what', 'when', 'where', 'who', 'how', 'why', 'which', 'you', 'we', 'they', 'i', 'me', 'he', 'she', 'it', 'us', 'them', 'my', 'your', 'his', 'her', 'its', 'our', 'their', 'can', 'will', 'would', 'should', 'could', 'do', 'did', 'done', 'get', 'got', 'go', 'goes', 'went', 'make', 'made', 'making', 'say', 'says', 'said', 'see', 'sees', 'saw', 'take', 'takes', 'took', 'come', 'comes', 'came', 'know', 'knows', 'knew', 'think', 'thinks', 'thought', 'look', 'looks', 'looked', 'want', 'wants', 'wanted', 'use', 'uses', 'used', 'find', 'finds', 'found', 'give', 'gives', 'gave', 'tell', 'tells', 'told', 'ask', 'asks', 'asked', 'work', 'works', 'worked', 'seem', 'seems', 'seemed', 'feel', 'feels', 'felt', 'try', 'tries', 'tried', 'leave', 'leaves', 'left', 'call', 'calls', 'called', 'good', 'great', 'new', 'just', 'like', 'very', 'much', 'also', 'about', 'into', 'through', 'down', 'up', 'out', 'back', 'over', 'under', 'then', 'than', 'there', 'here', 'when', 'where', 'why', 'how', 'all', 'any', 'both', 'each', 'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'only', 'own', 'same', 'so', 'too', 'very', 's', 't', 'don', 've', 'm', 'd', 'll', 're', 'y', 'ain', 'aren', 'couldn', 'didn', 'doesn', 'hadn', 'hasn', 'haven', 'isn', 'ma', 'mightn', 'mustn', 'needn', 'shan', 'shouldn', 'wasn', 'weren', 'won', 'wouldn'])
+
+# A word that occurs inside one bigram at least this often is reported as that phrase instead
+# (e.g. "hut" almost only appears in "tree hut"), so phrases aren't crowded out by their own words
+PHRASE_SHARE = 0.8
+
+def keyword_grams(text, bigrams=True):
+  """
+  Returns the non-stopword unigrams of a text, followed by bigrams of non-stopwords that are
+  directly adjacent (separated only by whitespace or hyphens) in the text.
+  """
+  grams = []
+  previous = None
+  previous_end = 0
+  lowered = text.lower()
+  for match in WORD_PATTERN.finditer(lowered):
+      word = match.group()
+      if word in STOPWORDS:
+          previous = None # Don't join words across a stopword ("love the scrub" is not "love scrub")
+          continue
+      grams.append(word)
+      if bigrams and previous is not None and BIGRAM_GAP_PATTERN.fullmatch(lowered, previous_end, match.start()):
+          grams.append(f"{previous} {word}")
+      previous = word
+      previous_end = match.end()
+  return grams
+
+def top_keywords(counts, k):
+  """Returns the k most common (keyword, count) pairs, letting dominant bigrams absorb their words."""
+  absorbed = set()
+  for gram, count in counts.items():
+      if ' ' in gram:
+          for word in gram.split(' '):
+              if count >= PHRASE_SHARE * counts[word]:
+                  absorbed.add(word)
+  return heapq.nlargest(k, ((gram, count) for gram, count in counts.items() if gram not in absorbed), key=lambda item: item[1])
+
+class KeywordCounter:
+  def __init__(self, bigrams=True):
+    self.bigrams = bigrams
+    self.counts = Counter()
+    self.bucket_counts = defaultdict(Counter) # {bucket: Counter}
+    self.texts = 0
+
+  def add(self, text, bucket=None):
+    """Counts one text's keywords overall and, if bucket is given, within that bucket."""
+    if not isinstance(text, str):
+        return
+    grams = keyword_grams(text, self.bigrams)
+    self.texts += 1
+    self.counts.update(grams)
+    if bucket is not None:
+        self.bucket_counts[bucket].update(grams)
+
+  def top(self, k=5):
+    """Returns the overall top-k [(keyword, count)]."""
+    return top_keywords(self.counts, k)
+
+  def top_by_bucket(self, k=5):
+    """Returns {bucket: top-k [(keyword, count)]}, ordered by bucket."""
+    return {bucket: top_keywords(counts, k) for bucket, counts in sorted(self.bucket_counts.items())}
+
+  def merge(self, other):
+    """Adds another counter's counts, as if its texts had been added after this counter's own."""
+    self.texts += other.texts
+    self.counts.update(other.counts)
+    for bucket, counts in other.bucket_counts.items():
+        self.bucket_counts[bucket].update(counts)
+    return self
+
+  def copy(self):
+    return KeywordCounter(self.bigrams).merge(self)
@@ -0,0 +1,112 @@
+"""
+Local load test of the analysis endpoint on the development and production servers.
+
+Starts each server in turn with the response cache disabled (so every request runs the
+analysis), posts the same CSV export to /analyze/upload from concurrent clients, and reports
+requests per second and latency percentiles. Requests refused by the inference limiter
+(HTTP 503) are counted separately.
+
+  python loadtest.py --csv ../data/treehut_comments_march_2025.csv --requests 40 --concurrency 8
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def server_command(mode, port):
+  if mode == "dev":
+      return [sys.executable, "backend.py"]
+  return [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}"]
+
+def wait_until_ready(url, timeout):
+  deadline = time.time() + timeout
+  while time.time() < deadline:
+      try:
+          with urllib.request.urlopen(f"{url}/ready", timeout=5) as response:
+              if response.status == 200:
+                  return
+      except (urllib.error.URLError, ConnectionError):
+          pass
+      time.sleep(0.5)
+  raise RuntimeError(f"Server at {url} was not ready after {timeout}s")
+
+def percentile(values, fraction):
+  ordered = sorted(values)
+  return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else None
+
+def run_load(url, body, requests, concurrency):
+  """Posts body `requests` times from `concurrency` threads. Returns throughput and latency stats."""
+  latencies = []
+  statuses = {}
+  lock = threading.Lock()
+  remaining = iter(range(requests))
+
+  def client():
+      while True:
+          with lock:
+              if next(remaining, None) is None:
+                  return
+          request = urllib.request.Request(f"{url}/analyze/upload", data=body, headers={"Content-Type": "text/csv"}, method="POST")
+          started = time.perf_counter()
+          try:
+              with urllib.request.urlopen(request, timeout=600) as response:
+                  response.read()
+                  status = response.status
+          except urllib.error.HTTPError as e:
+              status = e.code
+          elapsed = time.perf_counter() - started
+          with lock:
+              statuses[status] = statuses.get(status, 0) + 1
+              if status == 200:
+                  latencies.append(elapsed)
+
+  started = time.perf_counter()
+  threads = [threading.Thread(target=client) for _ in range(concurrency)]
+  for thread in threads:
+      thread.start()
+  for thread in threads:
+      thread.join()
+  seconds = time.perf_counter() - started
+  return {
+      "requests": requests,
+      "concurrency": concurrency,
+      "statuses": statuses,
+      "seconds": round(seconds, 2),
+      "requests_per_second": round(len(latencies) / seconds, 2),
+      "p50_seconds": round(percentile(latencies, 0.50), 3) if latencies else None,
+      "p95_seconds": round(percentile(latencies, 0.95), 3) if latencies else None,
+  }
+
+def benchmark(mode, args, body):
+  env = {**os.environ, "SCROLLMARK_PORT": str(args.port), "SCROLLMARK_RESPONSE_CACHE_BYTES": "0"}
+  server = subprocess.Popen(server_command(mode, args.port), cwd=SCRIPTS_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+  try:
+      url = f"http://127.0.0.1:{args.port}"
+      wait_until_ready(url, args.startup_timeout)
+      run_load(url, body, min(args.concurrency, args.requests), args.concurrency) # Warm up
+      return run_load(url, body, args.requests, args.concurrency)
+  finally:
+      server.terminate()
+      server.wait(timeout=args.startup_timeout)
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Compare the development and production servers under concurrent analyses.")
+  parser.add_argument("--csv", required=True, help="CSV export to post")
+  parser.add_argument("--requests", type=int, default=40, help="Measured requests per server")
+  parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+  parser.add_argument("--port", type=int, default=5055, help="Port the servers listen on")
+  parser.add_argument("--servers", default="dev,prod", help="Comma-separated servers to test: dev, prod")
+  parser.add_argument("--startup-timeout", type=float, default=300, help="Seconds to wait for a server to load its models")
+  args = parser.parse_args()
+
+  with open(args.csv, "rb") as f:
+      body = f.read()
+  results = {mode: benchmark(mode, args, body) for mode in args.servers.split(",")}
+  print(json.dumps(results, indent=2))
@@ -0,0 +1,269 @@
+"""
+Lazily loaded NLP models.
+
+Nothing is imported from transformers until a model is first used (or warmed up), so
+importing the backend and serving requests that never reach a model stays fast.
+Each model runs in one of three modes, set by SCROLLMARK_MODELS or per model:
+  auto - load the real model, falling back to mock output if loading fails (default)
+  real - load the real model and fail loudly if it cannot be loaded: after a failed load,
+         using the model raises ModelUnavailable and /ready reports the server unready
+  mock - never load the model; callers use their mock fallbacks
+
+The sentiment model can run on different engines, chosen at startup by
+SCROLLMARK_SENTIMENT_ENGINE. Every engine returns a pipeline-compatible callable
+(texts in, [{'label', 'score'}] out, with a `tokenizer` attribute):
+  torch - the fp32 PyTorch model (default)
+  int8  - the same model with its Linear layers dynamically quantized to int8, for CPU servers
+Run `python models.py --agreement` to check how often an engine agrees with fp32 before switching.
+"""
+import os
+import threading
+import time
+
+import telemetry
+from telemetry import log
+
+INFERENCE_BATCH_SIZE = telemetry.Histogram("scrollmark_inference_batch_size", "Texts per sentiment model forward pass.", buckets=telemetry.SIZE_BUCKETS)
+INFERENCE_BATCH_SECONDS = telemetry.Histogram("scrollmark_inference_batch_duration_seconds", "Latency of sentiment model forward passes.")
+
+SENTIMENT_MODEL = "distilbert-base-uncased-finetuned-sst-2-english"
+SENTIMENT_THRESHOLD = 0.7 # Minimum model confidence for a positive/negative label
+SENTIMENT_ENGINE = os.environ.get("SCROLLMARK_SENTIMENT_ENGINE", "torch")
+# Identifies the model and engine behind a label, e.g. in cache keys; fp32 keeps the bare model name
+SENTIMENT_MODEL_LABEL = SENTIMENT_MODEL if SENTIMENT_ENGINE == "torch" else f"{SENTIMENT_MODEL}:{SENTIMENT_ENGINE}"
+GENERATION_MODEL = "distilgpt2"
+MODEL_MODES = ("auto", "real", "mock")
+DEFAULT_MODEL_MODE = os.environ.get("SCROLLMARK_MODELS", "auto")
+
+class ModelUnavailable(RuntimeError):
+  """A model in real mode failed to load, so it can't be used and must not be mocked."""
+
+class LazyModel:
+  def __init__(self, name, loader, mode=DEFAULT_MODEL_MODE):
+    if mode not in MODEL_MODES:
+        raise ValueError(f"Unknown model mode '{mode}' for {name}; expected one of {', '.join(MODEL_MODES)}.")
+    self.name = name
+    self.mode = mode
+    self._loader = loader
+    self._model = None
+    self._state = "mock" if mode == "mock" else "not_loaded" # not_loaded -> loading -> loaded | failed
+    self._error = None
+    self._load_seconds = None
+    self._lock = threading.Lock()
+
+  def is_mocked(self):
+    """True if callers should use mock output: mock mode, or auto mode after a failed load."""
+    return self._state == "mock" or (self._state == "failed" and self.mode == "auto")
+
+  def is_ready(self):
+    """True once the model is loaded or deliberately mocked (a failed real-mode model never is)."""
+    return self._state == "loaded" or self.is_mocked()
+
+  def get(self):
+    """
+    Returns the loaded model, loading it on first use. Returns None when the model is mocked.
+    Raises ModelUnavailable in real mode once loading has failed.
+    """
+    if self._model is not None or self.is_mocked():
+        return self._model
+    with self._lock:
+        if self._model is None and self._state != "failed":
+            self._load()
+    if self._state == "failed" and not self.is_mocked():
+        raise ModelUnavailable(f"Model {self.name} failed to load: {self._error}")
+    return self._model
+
+  def override(self, model):
+    """Uses `model` (e.g. a stub with the pipeline's interface) instead of loading the real one."""
+    with self._lock:
+        self._model = model
+        self._state = "loaded"
+        self._error = None
+
+  def _load(self):
+    self._state = "loading"
+    started = time.perf_counter()
+    log.info(f"Loading model {self.name}...")
+    try:
+        self._model = self._loader()
+    except Exception as e:
+        self._state = "failed"
+        self._error = str(e)
+        if self.mode == "real":
+            log.error(f"Could not load model {self.name}: {e}. It runs in real mode, so it will not be mocked.")
+            return
+        log.warning(f"Could not load model {self.name}: {e}. Falling back to mock output.")
+        return
+    self._load_seconds = round(time.perf_counter() - started, 2)
+    self._state = "loaded"
+    log.info(f"Model {self.name} loaded in {self._load_seconds}s.")
+
+  def status(self):
+    return {"model": self.name, "mode": self.mode, "state": self._state, "load_seconds": self._load_seconds, "error": self._error}
+
+def load_torch_sentiment_pipeline():
+  from transformers import pipeline
+  return pipeline("sentiment-analysis", model=SENTIMENT_MODEL)
+
+def load_int8_sentiment_pipeline():
+  import torch
+  from transformers import AutoModelForSequenceClassification, AutoTokenizer, pipeline
+  model = AutoModelForSequenceClassification.from_pretrained(SENTIMENT_MODEL)
+  # Dynamic quantization stores Linear weights as int8 and quantizes activations on the fly (CPU only)
+  model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+  return pipeline("sentiment-analysis", model=model, tokenizer=AutoTokenizer.from_pretrained(SENTIMENT_MODEL), device=-1)
+
+SENTIMENT_ENGINES = {
+    "torch": load_torch_sentiment_pipeline,
+    "int8": load_int8_sentiment_pipeline,
+}
+
+def load_sentiment_pipeline(engine=None):
+  """Builds the sentiment pipeline for `engine` (default: SCROLLMARK_SENTIMENT_ENGINE)."""
+  engine = engine or SENTIMENT_ENGINE
+  if engine not in SENTIMENT_ENGINES:
+      raise ValueError(f"Unknown sentiment engine '{engine}'; expected one of {', '.join(SENTIMENT_ENGINES)}.")
+  return SENTIMENT_ENGINES[engine]()
+
+def load_generation_pipeline():
+  from transformers import pipeline, set_seed
+  generator = pipeline('text-generation', model=GENERATION_MODEL)
+  set_seed(42) # for reproducibility
+  return generator
+
+sentiment_model = LazyModel(SENTIMENT_MODEL_LABEL, load_sentiment_pipeline, os.environ.get("SCROLLMARK_SENTIMENT_MODE", DEFAULT_MODEL_MODE))
+generation_model = LazyModel(GENERATION_MODEL, load_generation_pipeline, os.environ.get("SCROLLMARK_GENERATION_MODE", DEFAULT_MODEL_MODE))
+MODELS = {"sentiment": sentiment_model, "generation": generation_model}
+
+def map_sentiment_label(label, score):
+  """Maps a raw model prediction onto our positive/neutral/negative labels."""
+  # distilbert-base-uncased-finetuned-sst-2-english outputs 'POSITIVE' and 'NEGATIVE'
+  if label == 'POSITIVE' and score > SENTIMENT_THRESHOLD: # Use a threshold for strong sentiment
+      return "positive"
+  elif label == 'NEGATIVE' and score > SENTIMENT_THRESHOLD: # Use a threshold for strong sentiment
+      return "negative"
+  return "neutral" # If score is not high enough for strong positive/negative, or if it's truly neutral
+
+def token_lengths(analyzer, texts):
+  """Returns the tokenized length of each text, falling back to character length."""
+  tokenizer = getattr(analyzer, 'tokenizer', None)
+  if tokenizer is not None:
+      try:
+          return [len(ids) for ids in tokenizer(texts, truncation=True)['input_ids']]
+      except Exception as e:
+          log.warning(f"Could not tokenize texts for length bucketing: {e}. Using character lengths.")
+  return [len(text) for text in texts]
+
+def score_batch(analyzer, batch):
+  """Runs the sentiment model on one batch, retrying texts individually if the batch fails."""
+  try:
+      return analyzer(batch, batch_size=len(batch), truncation=True)
+  except Exception as e:
+      log.warning(f"Error during batched sentiment analysis ({len(batch)} texts): {e}. Retrying one by one.")
+  predictions = []
+  for text in batch:
+      try:
+          predictions.append(analyzer(text, truncation=True)[0])
+      except Exception as e:
+          log.warning(f"Error during sentiment analysis for text '{text[:50]}...': {e}")
+          predictions.append(None)
+  return predictions
+
+def predict_sentiment(analyzer, texts, batch_size, on_progress=None):
+  """
+  Runs a sentiment pipeline over texts in batches of similar token length to keep padding small.
+  Returns one {'label', 'score'} prediction (or None on failure) per text, in input order.
+  on_progress, if given, is called with the fraction of texts scored before each batch.
+  """
+  predictions = [None] * len(texts)
+  lengths = token_lengths(analyzer, texts)
+  ordered = sorted(range(len(texts)), key=lengths.__getitem__)
+  for start in range(0, len(ordered), batch_size):
+      if on_progress is not None:
+          on_progress(start / len(ordered))
+      batch_indices = ordered[start:start + batch_size]
+      started = time.perf_counter()
+      batch_predictions = score_batch(analyzer, [texts[i] for i in batch_indices])
+      INFERENCE_BATCH_SECONDS.observe(time.perf_counter() - started)
+      INFERENCE_BATCH_SIZE.observe(len(batch_indices))
+      for i, prediction in zip(batch_indices, batch_predictions):
+          predictions[i] = prediction
+  return predictions
+
+def warm_up(background=True, keys=None):
+  """Loads the non-mocked models named in keys (default: all), in a daemon thread unless background is False."""
+  def load_all():
+      for key, model in MODELS.items():
+          if keys is not None and key not in keys:
+              continue
+          try:
+              model.get()
+          except Exception as e:
+              log.warning(f"Warm-up failed for {model.name}: {e}")
+  if not background:
+      load_all()
+      return None
+  thread = threading.Thread(target=load_all, name="model-warm-up", daemon=True)
+  thread.start()
+  return thread
+
+def models_status():
+  """Returns {model key: status} and whether every model is ready (loaded or deliberately mocked)."""
+  statuses = {key: model.status() for key, model in MODELS.items()}
+  return statuses, all(model.is_ready() for model in MODELS.values())
+
+def check_engine_agreement(texts, candidate, reference="torch", batch_size=64):
+  """
+  Scores texts with both engines and reports how often they agree, on the raw
+  POSITIVE/NEGATIVE label and on the thresholded positive/neutral/negative label,
+  together with each engine's throughput.
+  """
+  results = []
+  for engine in (reference, candidate):
+      analyzer = load_sentiment_pipeline(engine)
+      predict_sentiment(analyzer, texts[:batch_size], batch_size) # Warm up before timing
+      started = time.perf_counter()
+      predictions = predict_sentiment(analyzer, texts, batch_size)
+      results.append((predictions, time.perf_counter() - started))
+
+  (reference_predictions, reference_seconds), (candidate_predictions, candidate_seconds) = results
+  pairs = [(a, b) for a, b in zip(reference_predictions, candidate_predictions) if a is not None and b is not None]
+  raw_matches = sum(1 for a, b in pairs if a['label'] == b['label'])
+  label_matches = sum(1 for a, b in pairs if map_sentiment_label(a['label'], a['score']) == map_sentiment_label(b['label'], b['score']))
+  return {
+      "texts": len(texts),
+      "compared": len(pairs),
+      "reference": reference,
+      "candidate": candidate,
+      "raw_label_agreement": raw_matches / max(1, len(pairs)),
+      "label_agreement": label_matches / max(1, len(pairs)),
+      "reference_texts_per_second": len(texts) / reference_seconds,
+      "candidate_texts_per_second": len(texts) / candidate_seconds,
+      "speedup": reference_seconds / candidate_seconds,
+  }
+
+if __name__ == '__main__':
+  import argparse
+  import json
+  import random
+
+  parser = argparse.ArgumentParser(description="Sentiment engine utilities.")
+  parser.add_argument("--agreement", action="store_true", help="Compare an engine's labels with the fp32 engine on a sample")
+  parser.add_argument("--engine", default="int8", choices=sorted(SENTIMENT_ENGINES), help="Engine to check (default: int8)")
+  parser.add_argument("--csv", help="CSV export to sample comment_text and media_caption from (required with --agreement)")
+  parser.add_argument("--sample", type=int, default=2000, help="Number of texts to sample")
+  parser.add_argument("--batch-size", type=int, default=64, help="Texts per forward pass")
+  args = parser.parse_args()
+  if not args.agreement:
+      parser.print_help() # --agreement is the only action so far
+      raise SystemExit(2)
+  if not args.csv:
+      parser.error("--agreement requires --csv")
+
+  import pandas as pd
+  df = pd.read_csv(args.csv, usecols=lambda column: column in ("comment_text", "media_caption"))
+  texts = pd.concat([df[column] for column in df.columns]).dropna().astype(str).str.strip()
+  texts = texts[texts != ""].drop_duplicates().tolist()
+  random.seed(42)
+  texts = random.sample(texts, min(args.sample, len(texts)))
+  print(json.dumps(check_engine_agreement(texts, args.engine, batch_size=args.batch_size), indent=2))
@@ -0,0 +1,193 @@
+"""
+LLM-generated publishing recommendations, off the request path.
+
+The prompt depends only on a few summary numbers, so results are memoized by a hash of the
+prompt and the generation model. An analysis never waits for the model: it gets the mock
+recommendations right away and, when the prompt has not been answered yet, a generation
+is queued on a single background worker. Each generation runs under a hard time budget
+(the pipeline's max_time), and at most `max_pending` prompts wait for the worker at a time.
+Clients fetch the generated recommendations by prompt key once they are ready.
+
+Generated and pending prompts are kept in a SQLite table shared by the server's worker
+processes (see shared_state.py), so a prompt is generated once whichever worker is asked
+first, and its result can be fetched from any worker.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import shared_state
+from telemetry import log, span
+
+MOCK_RECOMMENDATIONS = [
+    {"type": "Optimal Timing", "title": "Post between 2-4 PM on weekdays", "description": "Schedule posts for peak audience activity to maximize visibility.", "priority": "High", "icon": "Clock", "color": "text-blue-500", "action": "Schedule post for 3:00 PM today"},
+    {"type": "Content Type", "title": "Incorporate short-form video content", "description": "Short videos generate 2.3x more engagement than images. Use trending audio.", "priority": "Medium", "icon": "Target", "color": "text-green-500", "action": "Create a TikTok-style video about a recent product update"},
+]
+
+def build_prompt(summary_data):
+  """Returns the generation prompt for the summary numbers of an analysis."""
+  return f"""Based on the following social media analytics data, provide 3 actionable recommendations to improve engagement and reach:
+  Total Posts: {summary_data.get('total_posts', 'N/A')}
+  Total Comments: {summary_data.get('total_comments', 'N/A')}
+  Top Performing Posts (by comments): {', '.join([str(p['media_caption'] or p['media_id']) for p in summary_data.get('top_performing_posts', [])[:2]])}
+  Overall Sentiment: {summary_data.get('overall_sentiment', {}).get('overall', 'N/A')}
+
+  Recommendations:
+  """
+
+def parse_recommendations(generated_text):
+  """Parses generated text into at most 3 structured recommendations."""
+  recommendations = []
+  # Simple parsing: split by line and try to extract title/description
+  for line in generated_text.split('\n'):
+      line = line.strip()
+      if line and not line.startswith("Recommendations:"):
+          # Attempt to extract a title and description
+          if ':' in line:
+              parts = line.split(':', 1)
+              title = parts[0].strip()
+              description = parts[1].strip()
+          else:
+              title = line
+              description = "No specific description provided by AI."
+
+          # Assign a random priority, icon, and color for demonstration
+          priorities = ["High", "Medium", "Low"]
+          icons = ["Clock", "Target", "Lightbulb", "Wand2", "Calendar"]
+          colors = ["text-blue-500", "text-green-500", "text-orange-500", "text-teal-500", "text-purple-500"]
+
+          recommendations.append({
+              "type": "AI Insight",
+              "title": title,
+              "description": description,
+              "priority": random.choice(priorities),
+              "icon": random.choice(icons),
+              "color": random.choice(colors),
+              "action": f"Implement '{title}'"
+          })
+          if len(recommendations) >= 3: # Limit to 3 recommendations
+              break
+  return recommendations
+
+def generate_llm_recommendation(generator, prompt, max_seconds):
+  """Generates recommendations for a prompt, stopping generation after max_seconds. Falls back to the mock ones."""
+  try:
+      # Generate text, limiting length and time to avoid overly long responses
+      with span("llm", prompt_chars=len(prompt)):
+          generated_text = generator(prompt, max_new_tokens=150, max_time=max_seconds, num_return_sequences=1, truncation=True)[0]['generated_text']
+  except Exception as e:
+      log.warning(f"Error during LLM recommendation generation: {e}")
+      return MOCK_RECOMMENDATIONS
+  recommendations = parse_recommendations(generated_text[len(prompt):] if generated_text.startswith(prompt) else generated_text)
+  return recommendations or MOCK_RECOMMENDATIONS # Fallback if parsing fails
+
+class RecommendationService:
+  def __init__(self, model, max_seconds=20, max_entries=256, max_pending=8, path=None):
+    """model is the LazyModel of the text generation pipeline. path is the shared SQLite file; without it, results are kept in memory."""
+    self.model = model
+    self.max_seconds = max_seconds
+    self.max_entries = max_entries
+    self.max_pending = max_pending
+    self.path = path
+    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recommendations") # One generation at a time
+    self._pending = {} # {key: Future} of the generations this process runs
+    self._lock = threading.Lock()
+    self._conn = self._connect()
+
+  def _connect(self):
+    conn = shared_state.connect(self.path)
+    # recommendations is null while the generation is pending in process pid
+    conn.execute("CREATE TABLE IF NOT EXISTS recommendations (key TEXT PRIMARY KEY, pid INTEGER NOT NULL, recommendations TEXT, last_used REAL NOT NULL)")
+    conn.commit()
+    return conn
+
+  def reopen(self):
+    """Opens a new connection, e.g. in a forked worker: SQLite connections must not cross a fork."""
+    self._lock = threading.Lock()
+    self._pending = {}
+    self._conn = self._connect()
+
+  def key(self, prompt):
+    return hashlib.sha256(f"{self.model.name}\0{prompt}".encode("utf-8")).hexdigest()[:32]
+
+  def request(self, summary_data):
+    """
+    Returns {"id", "status", "recommendations"} for an analysis summary without waiting for the
+    model. status is "ready" with the memoized generated recommendations, "pending" with the mock
+    ones while a generation is queued or running in any worker (fetch the result later with
+    get(id)), or "mock" with the mock ones when the model is mocked or the queue is full.
+    """
+    if self.model.is_mocked():
+        return {"id": None, "status": "mock", "recommendations": MOCK_RECOMMENDATIONS}
+    prompt = build_prompt(summary_data)
+    key = self.key(prompt)
+    with self._lock:
+        self._conn.execute("BEGIN IMMEDIATE") # Workers asked for the same prompt together queue it once
+        try:
+            result = self._lookup(key)
+            if result is None:
+                if len(self._pending) >= self.max_pending:
+                    log.warning("LLM recommendation queue is full, returning mock recommendations.")
+                    return {"id": None, "status": "mock", "recommendations": MOCK_RECOMMENDATIONS}
+                self._pending[key] = self._executor.submit(self._generate, key, prompt) # It waits for self._lock, so it finds the row below
+                self._conn.execute("INSERT OR REPLACE INTO recommendations (key, pid, recommendations, last_used) VALUES (?, ?, NULL, ?)", (key, os.getpid(), time.time()))
+                result = {"id": key, "status": "pending", "recommendations": MOCK_RECOMMENDATIONS}
+        finally:
+            self._conn.commit()
+    return result
+
+  def get(self, key):
+    """Returns the same fields as request() for a prompt key, or None if it is unknown (or evicted)."""
+    with self._lock:
+        try:
+            return self._lookup(key)
+        finally:
+            self._conn.commit()
+
+  def _lookup(self, key):
+    """request()'s fields for a generated or pending prompt, or None. Marks hits as recently used; forgets generations whose process exited."""
+    row = self._conn.execute("SELECT pid, recommendations FROM recommendations WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return None
+    pid, recommendations = row
+    if recommendations is not None:
+        self._conn.execute("UPDATE recommendations SET last_used = ? WHERE key = ?", (time.time(), key))
+        return {"id": key, "status": "ready", "recommendations": json.loads(recommendations)}
+    if key in self._pending or shared_state.process_alive(pid):
+        return {"id": key, "status": "pending", "recommendations": MOCK_RECOMMENDATIONS}
+    self._conn.execute("DELETE FROM recommendations WHERE key = ?", (key,))
+    return None
+
+  def _generate(self, key, prompt):
+    try:
+        generator = self.model.get()
+        recommendations = generate_llm_recommendation(generator, prompt, self.max_seconds) if generator else MOCK_RECOMMENDATIONS
+    except Exception as e:
+        log.warning(f"Error during LLM recommendation generation: {e}")
+        recommendations = MOCK_RECOMMENDATIONS
+    with self._lock:
+        self._conn.execute("UPDATE recommendations SET recommendations = ?, last_used = ? WHERE key = ?", (json.dumps(recommendations), time.time(), key))
+        self._conn.execute(
+            "DELETE FROM recommendations WHERE key IN (SELECT key FROM recommendations WHERE recommendations IS NOT NULL ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,))
+        self._conn.commit()
+        del self._pending[key]
+
+  def shutdown(self):
+    """Drops queued generations and waits for a running one, which its time budget bounds."""
+    self._executor.shutdown(wait=True, cancel_futures=True)
+    with self._lock:
+        if self._pending: # Cancelled: let another worker generate them when asked again
+            self._conn.executemany("DELETE FROM recommendations WHERE key = ? AND recommendations IS NULL", [(key,) for key in self._pending])
+            self._conn.commit()
+            self._pending = {}
+
+  def stats(self):
+    """Generated recommendation sets stored, and generations pending in any worker."""
+    with self._lock:
+        entries, pending = self._conn.execute("SELECT COUNT(recommendations), COUNT(*) - COUNT(recommendations) FROM recommendations").fetchone()
+    return {"entries": entries, "pending": pending, "max_seconds": self.max_seconds}
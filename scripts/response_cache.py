@@ -0,0 +1,105 @@
+"""
+Size-bounded cache of serialized analysis responses.
+
+A payload is serialized once, with orjson when it is installed, and compressed once per
+supported Content-Encoding (gzip, plus brotli when the `brotli` package is installed).
+Its ETag is a hash of the serialized body. Repeat requests are answered with the stored
+bytes, or with 304 Not Modified when the client already holds them. The cache keeps entries
+up to `max_bytes` of stored bodies and evicts the least recently used entries first.
+"""
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+try:
+  import brotli
+except ImportError:
+  brotli = None
+
+GZIP_LEVEL = 6 # Most of the size win of level 9 at a fraction of the time
+BROTLI_QUALITY = 5
+
+def _json_default(value):
+  if hasattr(value, 'item'):
+      return value.item() # numpy scalars
+  return str(value)
+
+def dumps(data):
+  """Serializes a JSON payload to UTF-8 bytes."""
+  if orjson is not None:
+      return orjson.dumps(data, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+  return json.dumps(data, default=_json_default, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def content_hash(data):
+  """Returns the sha256 hex digest of bytes or a string, e.g. an uploaded CSV."""
+  return hashlib.sha256(data.encode('utf-8') if isinstance(data, str) else data).hexdigest()
+
+class CachedResponse:
+  def __init__(self, data, info=None):
+    body = dumps(data)
+    self.info = info or {} # What the caller needs to know about the payload without parsing it
+    self.etag = hashlib.sha256(body).hexdigest()[:32]
+    self.bodies = {"identity": body, "gzip": gzip.compress(body, compresslevel=GZIP_LEVEL)}
+    if brotli is not None:
+        self.bodies["br"] = brotli.compress(body, quality=BROTLI_QUALITY)
+
+  def encoding_for(self, accepted):
+    """Returns the smallest stored encoding among those `accepted` (a collection of encoding names)."""
+    candidates = [encoding for encoding in self.bodies if encoding == "identity" or encoding in accepted]
+    return min(candidates, key=lambda encoding: len(self.bodies[encoding]))
+
+  def size(self):
+    return sum(len(body) for body in self.bodies.values())
+
+class ResponseCache:
+  def __init__(self, max_bytes):
+    self.max_bytes = max_bytes
+    self.hits = 0
+    self.misses = 0
+    self._entries = OrderedDict() # {key: {view: CachedResponse}}, least recently used first
+    self._bytes = 0
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    """Returns the {view: CachedResponse} stored under key and marks it as recently used, or None."""
+    with self._lock:
+        responses = self._entries.get(key)
+        if responses is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return responses
+
+  def put(self, key, payloads, info=None):
+    """Serializes {view: payload}, stores it under key and returns {view: CachedResponse}, each carrying info."""
+    responses = {view: CachedResponse(data, info) for view, data in payloads.items()}
+    size = sum(response.size() for response in responses.values())
+    with self._lock:
+        if key in self._entries:
+            self._bytes -= sum(response.size() for response in self._entries.pop(key).values())
+        if size <= self.max_bytes:
+            self._entries[key] = responses
+            self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= sum(response.size() for response in evicted.values())
+    return responses
+
+  def discard(self, key):
+    with self._lock:
+        responses = self._entries.pop(key, None)
+        if responses is not None:
+            self._bytes -= sum(response.size() for response in responses.values())
+
+  def stats(self):
+    """Returns cumulative hit/miss counts and the current number and size of entries."""
+    with self._lock:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}
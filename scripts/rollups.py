@@ -0,0 +1,243 @@
+"""
+Date-range queries over the rollup cube of AnalysisAggregates.
+
+RollupIndex sorts the cube by hour once and keeps prefix sums of every measure (rows,
+comments, rows per intent category, and texts per sentiment label). The totals of any date
+range are then two binary searches and a subtraction, and a day or week series is the
+difference of the prefix sums at the period edges, so no rows are rescanned or rescored.
+Per-post prefix sums (keyed by post, then hour) give each post's comments in a range, and a
+sorted list of the periods each post was active in gives the distinct posts per period, so a
+query costs the number of posts and periods, not the number of cube rows in the range. Ranges
+are clamped to the days with activity. Keyword counts are kept per week, so keyword results
+cover every week a range touches.
+"""
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from keywords import top_keywords
+
+SENTIMENT_LABELS = ('positive', 'neutral', 'negative')
+GRANULARITIES = ('day', 'week')
+NANOSECONDS_PER_HOUR = 3600 * 10**9
+EPOCH_DAY = np.datetime64('1970-01-01', 'D')
+POST_KEY_SPAN = 1 << 40 # More hours than any post's activity spans
+
+def prefix_sums(values):
+  """Returns [0, v0, v0 + v1, ...], so the sum of values[i:j] is prefix[j] - prefix[i]."""
+  return np.concatenate([[0], np.cumsum(values, dtype=np.int64)])
+
+def period_start(days, granularity):
+  """Returns the first day of the day or (Monday-based) week containing each day. 1970-01-01 was a Thursday."""
+  return days if granularity == 'day' else days - (days + 3) % 7
+
+def day_string(day):
+  return str(EPOCH_DAY + int(day))
+
+def parse_day(text):
+  """Returns the day (days since 1970-01-01) of a date string. Raises ValueError for invalid dates."""
+  timestamp = pd.Timestamp(text)
+  if pd.isna(timestamp):
+      raise ValueError(f"Invalid date '{text}'")
+  return int((np.datetime64(timestamp.date(), 'D') - EPOCH_DAY).astype(np.int64))
+
+def sentiment_summary(counts):
+  """Returns the positive/neutral/negative percentages of sentiment label counts and the overall label."""
+  total = sum(counts.get(label, 0) for label in SENTIMENT_LABELS)
+  percentages = {label: int(counts.get(label, 0) / total * 100) if total > 0 else 0 for label in SENTIMENT_LABELS}
+  overall = "Neutral"
+  if percentages['positive'] > percentages['negative'] and percentages['positive'] > percentages['neutral']:
+      overall = "Positive"
+  elif percentages['negative'] > percentages['positive'] and percentages['negative'] > percentages['neutral']:
+      overall = "Negative"
+  return {**percentages, "overall": overall}
+
+def empty_query(start_day, end_day, granularity):
+  """Returns the RollupIndex.query result of a range without activity."""
+  sentiment_counts = {label: 0 for label in SENTIMENT_LABELS}
+  return {
+      "start": day_string(start_day) if start_day is not None else None,
+      "end": day_string(end_day) if end_day is not None else None,
+      "granularity": granularity,
+      "total_rows": 0,
+      "total_comments": 0,
+      "engagement_over_time": [],
+      "top_performing_posts": [],
+      "sentiment_counts": sentiment_counts,
+      "overall_sentiment": sentiment_summary(sentiment_counts),
+      "sentiment_trends": [],
+      "intent_categories": [],
+      "keywords": [],
+      "weekly_keywords": [],
+  }
+
+class RollupIndex:
+  def __init__(self, aggregates, keywords, category_masks):
+    """
+    Indexes the rollup cube of aggregates. keywords is the week-bucketed KeywordCounter of all
+    analyzed texts and category_masks is {intent category: keyword mask}.
+    """
+    cube = aggregates.rollup.sort_values('hour', kind='stable')
+    self.hours = cube['hour'].to_numpy(dtype=np.int64)
+    self.media_ids = cube['media_id'].to_numpy(dtype=object)
+    self.rows = cube['rows'].to_numpy(dtype=np.int64)
+    self.comments = cube['comments'].to_numpy(dtype=np.int64)
+    self.prefix = {'rows': prefix_sums(self.rows), 'comments': prefix_sums(self.comments)}
+
+    # A row's intent is its comment mask combined with its post's current caption mask
+    self.has_post = pd.notna(self.media_ids)
+    masks = cube['mask'].to_numpy(dtype=np.int64).copy()
+    masks[self.has_post] |= aggregates.posts['caption_mask'].reindex(self.media_ids[self.has_post]).to_numpy(dtype=np.int64)
+    self.category_prefix = {category: prefix_sums(np.where((masks & mask) != 0, self.rows, 0)) for category, mask in category_masks.items()}
+
+    # Per-post prefix sums: the cube rows of each post, by hour, under keys post code * POST_KEY_SPAN + hour offset
+    codes, self.post_ids = pd.factorize(self.media_ids[self.has_post], sort=True)
+    post_hours = self.hours[self.has_post]
+    self.hour_base = int(post_hours.min()) if len(post_hours) else 0
+    order = np.lexsort((post_hours, codes))
+    self.post_keys = codes[order].astype(np.int64) * POST_KEY_SPAN + (post_hours[order] - self.hour_base)
+    self.post_prefix = {
+        'rows': prefix_sums(self.rows[self.has_post][order]),
+        'comments': prefix_sums(self.comments[self.has_post][order]),
+    }
+    # The first day of every period each post was active in, sorted, so a whole period's distinct posts are two binary searches
+    post_days = post_hours // 24
+    self.post_periods = {
+        granularity: np.sort(pd.DataFrame({'start': period_start(post_days, granularity), 'post': codes}).drop_duplicates()['start'].to_numpy(dtype=np.int64))
+        for granularity in GRANULARITIES
+    }
+
+    # Sentiment covers comment texts and each caption once, at its post's first activity
+    labels = cube['sentiment'].to_numpy(dtype=object)
+    has_label = pd.notna(labels)
+    captions = aggregates.captions()
+    caption_labels = captions['caption_sentiment'].to_numpy(dtype=object)
+    caption_times = captions['timestamp'].to_numpy(dtype='datetime64[ns]')
+    has_caption = pd.notna(caption_labels) & ~np.isnat(caption_times)
+    sentiment_hours = np.concatenate([self.hours[has_label], caption_times[has_caption].view(np.int64) // NANOSECONDS_PER_HOUR])
+    sentiment_labels = np.concatenate([labels[has_label], caption_labels[has_caption]])
+    sentiment_counts = np.concatenate([self.rows[has_label], np.ones(int(has_caption.sum()), dtype=np.int64)])
+    order = np.argsort(sentiment_hours, kind='stable')
+    self.sentiment_hours = sentiment_hours[order]
+    self.sentiment_prefix = {label: prefix_sums(np.where(sentiment_labels[order] == label, sentiment_counts[order], 0)) for label in SENTIMENT_LABELS}
+
+    self.posts = aggregates.posts
+    self.keywords = keywords
+
+  def extent(self):
+    """Returns the first and last day with timestamped activity, or None if there is none."""
+    hours = np.concatenate([self.hours[:1], self.hours[-1:], self.sentiment_hours[:1], self.sentiment_hours[-1:]])
+    if len(hours) == 0:
+        return None
+    return int(hours.min() // 24), int(hours.max() // 24)
+
+  def _edges(self, start_day, end_day, granularity):
+    """Returns the first day of each period in [start_day, end_day] and the hour edges between them."""
+    starts = np.arange(period_start(start_day, granularity), end_day + 1, 7 if granularity == 'week' else 1, dtype=np.int64)
+    edges = np.append(np.maximum(starts, start_day), end_day + 1) * 24 # A partial first period starts at start_day
+    return starts, edges
+
+  def sentiment_trends(self, start_day=None, end_day=None, granularity='week'):
+    """Returns the sentiment percentages of each period, oldest first."""
+    if start_day is None or end_day is None:
+        extent = self.extent()
+        if extent is None:
+            return []
+        start_day, end_day = extent
+    starts, edges = self._edges(start_day, end_day, granularity)
+    bounds = np.searchsorted(self.sentiment_hours, edges)
+    counts = {label: np.diff(prefix[bounds]) for label, prefix in self.sentiment_prefix.items()}
+    trends = []
+    for i, start in enumerate(starts):
+        summary = sentiment_summary({label: counts[label][i] for label in SENTIMENT_LABELS})
+        trends.append({"period": day_string(start), **{label: summary[label] for label in SENTIMENT_LABELS}})
+    return trends
+
+  def _post_sums(self, measure, start_hour, end_hour):
+    """Returns the per-post sums of measure over the hours [start_hour, end_hour), in post_ids order."""
+    codes = np.arange(len(self.post_ids), dtype=np.int64) * POST_KEY_SPAN
+    offsets = np.clip([start_hour - self.hour_base, end_hour - self.hour_base], 0, POST_KEY_SPAN - 1)
+    prefix = self.post_prefix[measure]
+    return prefix[np.searchsorted(self.post_keys, codes + offsets[1])] - prefix[np.searchsorted(self.post_keys, codes + offsets[0])]
+
+  def _post_counts(self, starts, edges, granularity):
+    """Returns the number of distinct posts active in each period."""
+    periods = self.post_periods[granularity]
+    counts = np.searchsorted(periods, starts, side='right') - np.searchsorted(periods, starts)
+    # A partial first or last week (the range starts or ends mid-week) counts its posts from the per-post sums instead
+    for i in {0, len(starts) - 1}:
+        if edges[i] != starts[i] * 24 or edges[i + 1] != (starts[i] + (7 if granularity == 'week' else 1)) * 24:
+            counts[i] = np.count_nonzero(self._post_sums('rows', edges[i], edges[i + 1]))
+    return counts
+
+  def query(self, start_day=None, end_day=None, granularity='day', top=5):
+    """
+    Returns engagement, sentiment, intent and keyword results for the days [start_day, end_day]
+    (default: all timestamped activity) at day or week granularity. The range is clamped to the
+    days with activity, so a range without any (or a dataset without timestamps) gives empty results.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity '{granularity}'; expected one of {', '.join(GRANULARITIES)}.")
+    if start_day is not None and end_day is not None and end_day < start_day:
+        raise ValueError("The range ends before it starts.")
+    extent = self.extent()
+    if extent is not None:
+        start_day = extent[0] if start_day is None else max(start_day, extent[0])
+        end_day = extent[1] if end_day is None else min(end_day, extent[1])
+    if extent is None or end_day < start_day:
+        return empty_query(start_day, end_day, granularity)
+    starts, edges = self._edges(start_day, end_day, granularity)
+    bounds = np.searchsorted(self.hours, edges)
+    lo, hi = bounds[0], bounds[-1]
+
+    comments = np.diff(self.prefix['comments'][bounds])
+    posts = self._post_counts(starts, edges, granularity)
+    engagement_over_time = [
+        {"date": day_string(start), "posts": int(posts[i]), "comments": int(comments[i])}
+        for i, start in enumerate(starts)
+    ]
+
+    # Posts with activity in the range, most comments first; ties keep media_id order
+    post_rows = self._post_sums('rows', edges[0], edges[-1])
+    post_comments = self._post_sums('comments', edges[0], edges[-1])
+    active = np.flatnonzero(post_rows > 0)
+    ranked = active[np.argsort(-post_comments[active], kind='stable')[:top]]
+    media_ids = self.post_ids[ranked]
+    captions = self.posts['media_caption'].reindex(media_ids)
+    top_performing_posts = [
+        {"media_id": media_id, "comments": int(count), "media_caption": caption if pd.notna(caption) else None}
+        for media_id, count, caption in zip(media_ids.tolist(), post_comments[ranked], captions.to_numpy(dtype=object))
+    ]
+
+    sentiment_bounds = np.searchsorted(self.sentiment_hours, edges[[0, -1]])
+    sentiment_counts = {label: int(np.diff(prefix[sentiment_bounds])[0]) for label, prefix in self.sentiment_prefix.items()}
+
+    categories = Counter({category: int(prefix[hi] - prefix[lo]) for category, prefix in self.category_prefix.items()})
+    intent_categories = [{"category": category, "count": count} for category, count in categories.most_common() if count > 0]
+
+    # Keywords are bucketed by week: take every week the range touches
+    first_week, last_week = day_string(period_start(start_day, 'week')), day_string(end_day)
+    weeks = {week: counts for week, counts in sorted(self.keywords.bucket_counts.items()) if first_week <= week <= last_week}
+    keyword_counts = Counter()
+    for counts in weeks.values():
+        keyword_counts.update(counts)
+
+    return {
+        "start": day_string(start_day),
+        "end": day_string(end_day),
+        "granularity": granularity,
+        "total_rows": int(self.prefix['rows'][hi] - self.prefix['rows'][lo]),
+        "total_comments": int(comments.sum()),
+        "engagement_over_time": engagement_over_time,
+        "top_performing_posts": top_performing_posts,
+        "sentiment_counts": sentiment_counts,
+        "overall_sentiment": sentiment_summary(sentiment_counts),
+        "sentiment_trends": self.sentiment_trends(start_day, end_day, granularity),
+        "intent_categories": intent_categories,
+        "keywords": [{"keyword": keyword, "mentions": int(count)} for keyword, count in top_keywords(keyword_counts, top)],
+        "weekly_keywords": [
+            {"week": week, "keywords": [{"keyword": keyword, "mentions": int(count)} for keyword, count in top_keywords(counts, top)]}
+            for week, counts in weeks.items()
+        ],
+    }
@@ -0,0 +1,113 @@
+"""
+Persistent, content-addressed store of sentiment labels.
+
+Labels are keyed by a hash of the normalized text together with a model key
+(model name and label threshold), so switching models never serves stale labels.
+The store lives in a local SQLite file, holds at most `max_entries` rows and
+evicts the least recently used rows first. Keeping it cheap on the hot path:
+  - a one-row table kept up to date by triggers holds the number of entries, so
+    inserts never count the table
+  - eviction runs only once the store exceeds max_entries by EVICTION_SLACK of it,
+    and then removes the whole excess in one statement
+  - lookups don't write; the keys they hit are marked as recently used in batches,
+    with the next insert or every TOUCH_FLUSH_SECONDS
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+SQLITE_BATCH = 500 # Stay well below SQLite's bound-parameter limit
+EVICTION_SLACK = 0.01 # Fraction of max_entries the store may exceed before evicting
+TOUCH_FLUSH_SECONDS = 30 # Longest a hit waits before its last_used is written
+TOUCH_FLUSH_KEYS = 10000 # ... or until this many hits are waiting
+
+def normalize_text(text):
+  """Collapses runs of whitespace so trivially different copies of a text share one entry."""
+  return " ".join(text.split())
+
+def cache_key(normalized_text, model_key):
+  """Returns the content hash used as the cache key for a normalized text."""
+  return hashlib.sha256(f"{model_key}\0{normalized_text}".encode("utf-8")).hexdigest()
+
+class SentimentCache:
+  def __init__(self, path, max_entries=500000):
+    self.path = path
+    self.max_entries = max_entries
+    self.hits = 0
+    self.misses = 0
+    self._touched = {} # {key: last hit time} not yet written
+    self._touched_since = time.time()
+    self._lock = threading.Lock()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    self._conn = self._connect()
+
+  def _connect(self):
+    conn = sqlite3.connect(self.path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL") # Lets several server processes read and write the file
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("CREATE TABLE IF NOT EXISTS sentiment (key TEXT PRIMARY KEY, label TEXT NOT NULL, last_used REAL NOT NULL)")
+    conn.execute("CREATE INDEX IF NOT EXISTS sentiment_last_used ON sentiment (last_used)")
+    conn.execute("BEGIN IMMEDIATE") # Processes opening the file together create the entry count once
+    if conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'sentiment_entries'").fetchone() is None:
+        conn.execute("CREATE TABLE sentiment_entries (entries INTEGER NOT NULL)")
+        conn.execute("INSERT INTO sentiment_entries SELECT COUNT(*) FROM sentiment") # Counts a store written by an older version once
+        conn.execute("CREATE TRIGGER sentiment_insert AFTER INSERT ON sentiment BEGIN UPDATE sentiment_entries SET entries = entries + 1; END")
+        conn.execute("CREATE TRIGGER sentiment_delete AFTER DELETE ON sentiment BEGIN UPDATE sentiment_entries SET entries = entries - 1; END")
+    conn.commit()
+    return conn
+
+  def reopen(self):
+    """Opens a new connection, e.g. in a forked worker: SQLite connections must not cross a fork."""
+    self._lock = threading.Lock()
+    self._touched = {}
+    self._conn = self._connect()
+
+  def get_many(self, keys):
+    """Returns {key: label} for the keys present in the store and marks them as recently used."""
+    found = {}
+    now = time.time()
+    with self._lock:
+        for start in range(0, len(keys), SQLITE_BATCH):
+            chunk = keys[start:start + SQLITE_BATCH]
+            placeholders = ",".join("?" * len(chunk))
+            found.update(self._conn.execute(f"SELECT key, label FROM sentiment WHERE key IN ({placeholders})", chunk).fetchall())
+        self._touched.update(dict.fromkeys(found, now))
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        if len(self._touched) >= TOUCH_FLUSH_KEYS or now - self._touched_since >= TOUCH_FLUSH_SECONDS:
+            self._flush_touched()
+            self._conn.commit()
+    return found
+
+  def _flush_touched(self):
+    """Writes the pending last_used times (in the caller's transaction)."""
+    if self._touched:
+        self._conn.executemany("UPDATE sentiment SET last_used = ? WHERE key = ?", [(used, key) for key, used in self._touched.items()])
+        self._touched = {}
+    self._touched_since = time.time()
+
+  def put_many(self, labels):
+    """Stores {key: label} and evicts the least recently used entries once the store outgrows max_entries."""
+    if not labels:
+        return
+    now = time.time()
+    with self._lock:
+        self._flush_touched() # Eviction must see recent hits
+        self._conn.executemany(
+            "INSERT INTO sentiment (key, label, last_used) VALUES (?, ?, ?) ON CONFLICT (key) DO UPDATE SET label = excluded.label, last_used = excluded.last_used",
+            [(key, label, now) for key, label in labels.items()])
+        excess = self._entries() - self.max_entries
+        if excess > self.max_entries * EVICTION_SLACK:
+            self._conn.execute("DELETE FROM sentiment WHERE key IN (SELECT key FROM sentiment ORDER BY last_used LIMIT ?)", (excess,))
+        self._conn.commit()
+
+  def _entries(self):
+    return self._conn.execute("SELECT entries FROM sentiment_entries").fetchone()[0]
+
+  def stats(self):
+    """Returns cumulative hit/miss counts and the current number of stored entries."""
+    with self._lock:
+        entries = self._entries()
+    return {"hits": self.hits, "misses": self.misses, "entries": entries, "max_entries": self.max_entries}
@@ -0,0 +1,169 @@
+"""
+Multi-process sharded sentiment inference.
+
+A single Python process scores texts on one interpreter, and torch's intra-op threading
+scales poorly for a model as small as DistilBERT. SentimentPool instead keeps N worker
+processes alive, each with its own copy of the model and its torch thread count pinned
+so the workers don't oversubscribe the CPU. Texts are split into shards of similar length,
+scored in parallel and merged back in input order.
+
+Run `python sentiment_pool.py` to compare single-process and pooled throughput.
+"""
+import atexit
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+from models import SENTIMENT_ENGINE, load_sentiment_pipeline, predict_sentiment
+
+BATCHES_PER_SHARD = 8 # Shards hold several batches so each task amortizes its IPC cost
+
+_worker_analyzer = None # The model loaded in this worker process
+_worker_error = None
+
+def load_pipeline(engine):
+  """Builds the sentiment pipeline for `engine`, or benchmark's hash-based stub for "stub"."""
+  if engine == "stub":
+      from benchmark import StubSentimentPipeline
+      return StubSentimentPipeline()
+  return load_sentiment_pipeline(engine)
+
+def _init_worker(threads, engine):
+  """Pins the worker's thread pools and loads its copy of the model on `engine`."""
+  global _worker_analyzer, _worker_error
+  for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+      os.environ[variable] = str(threads) # Must be set before torch is imported
+  try:
+      _worker_analyzer = load_pipeline(engine)
+  except Exception as e:
+      # Raising here would make the pool respawn the worker forever; report on use instead
+      _worker_error = str(e)
+      return
+  if "torch" in sys.modules:
+      import torch
+      torch.set_num_threads(threads)
+
+def _wait(seconds):
+  """Returns None once this worker's model is loaded, or the error it failed with."""
+  time.sleep(seconds)
+  return None if _worker_analyzer is not None else _worker_error or "not loaded"
+
+def _score_shard(shard):
+  texts, batch_size = shard
+  if _worker_analyzer is None:
+      raise RuntimeError(f"Sentiment model failed to load in worker {os.getpid()}: {_worker_error}")
+  return predict_sentiment(_worker_analyzer, texts, batch_size)
+
+class SentimentPool:
+  def __init__(self, workers, threads_per_worker=None, engine=SENTIMENT_ENGINE):
+    self.workers = workers
+    self.engine = engine
+    self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    # Spawned workers start clean instead of inheriting the server's threads and loaded models
+    self._pool = multiprocessing.get_context("spawn").Pool(workers, initializer=_init_worker, initargs=(self.threads_per_worker, engine))
+    self.started = time.time()
+    self.loaded = None # Workers that loaded their model, once wait_ready has returned
+    self.error = None
+
+  def wait_ready(self):
+    """Blocks until the workers have run their initializers (loaded their models). Returns how many succeeded."""
+    # Each task holds its worker long enough that the tasks spread over all workers
+    errors = self._pool.map(_wait, [0.2] * self.workers, chunksize=1)
+    self.error = next((error for error in errors if error is not None), None)
+    self.loaded = errors.count(None)
+    return self.loaded
+
+  def state(self):
+    """loading until wait_ready has returned, then loaded if every worker loaded its model, else failed."""
+    if self.loaded is None:
+        return "loading"
+    return "loaded" if self.loaded == self.workers else "failed"
+
+  def predict(self, texts, batch_size, on_progress=None):
+    """
+    Scores texts across the worker processes. Returns one {'label', 'score'} prediction
+    (or None on failure) per text, in input order.
+    """
+    # Character length is a cheap stand-in for token length when cutting shards;
+    # each worker re-buckets its shard by token length
+    ordered = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    shard_size = batch_size * BATCHES_PER_SHARD
+    shards = [ordered[start:start + shard_size] for start in range(0, len(ordered), shard_size)]
+    predictions = [None] * len(texts)
+    results = self._pool.imap(_score_shard, [([texts[i] for i in shard], batch_size) for shard in shards])
+    for done, (shard, shard_predictions) in enumerate(zip(shards, results)):
+        if on_progress is not None:
+            on_progress(done / len(shards))
+        for i, prediction in zip(shard, shard_predictions):
+            predictions[i] = prediction
+    return predictions
+
+  def close(self):
+    self._pool.terminate()
+    self._pool.join()
+
+  def status(self):
+    return {
+        "workers": self.workers, "threads_per_worker": self.threads_per_worker, "engine": self.engine, "started": self.started,
+        "state": self.state(), "loaded_workers": self.loaded, "error": self.error,
+    }
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_sentiment_pool(workers=None, threads_per_worker=None):
+  """Returns the process-wide SentimentPool, starting it on first use so it outlives single requests."""
+  global _pool
+  with _pool_lock:
+      if _pool is None:
+          workers = workers or int(os.environ.get("SCROLLMARK_SENTIMENT_WORKERS", 0)) or (os.cpu_count() or 1)
+          threads_per_worker = threads_per_worker or int(os.environ.get("SCROLLMARK_SENTIMENT_WORKER_THREADS", 0)) or None
+          _pool = SentimentPool(workers, threads_per_worker)
+          atexit.register(_pool.close)
+      return _pool
+
+def sentiment_pool_status():
+  """Returns the running pool's size and state, or None if it has not been started."""
+  return _pool.status() if _pool is not None else None
+
+if __name__ == '__main__':
+  import argparse
+  import random
+
+  parser = argparse.ArgumentParser(description="Compare single-process and pooled sentiment throughput.")
+  parser.add_argument("--csv", help="CSV export to take comment_text from (default: synthetic comments)")
+  parser.add_argument("--texts", type=int, default=5000, help="Number of texts to score")
+  parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes for the pooled run")
+  parser.add_argument("--threads-per-worker", type=int, default=None, help="Torch threads per worker (default: cores / workers)")
+  parser.add_argument("--batch-size", type=int, default=64, help="Texts per forward pass")
+  parser.add_argument("--engine", default=SENTIMENT_ENGINE, help="Sentiment engine for both runs (stub: benchmark's hash-based stand-in, which measures the pool's overhead alone)")
+  args = parser.parse_args()
+
+  if args.csv:
+      import pandas as pd
+      texts = pd.read_csv(args.csv, usecols=["comment_text"])["comment_text"].dropna().astype(str).tolist()
+  else:
+      random.seed(42)
+      words = ["love", "this", "scrub", "smells", "amazing", "my", "order", "arrived", "damaged", "when", "restock", "tree", "hut", "body", "butter", "so", "soft", "price", "too", "high"]
+      texts = [" ".join(random.choices(words, k=random.randint(3, 40))) for _ in range(args.texts)]
+  texts = (texts * (args.texts // max(1, len(texts)) + 1))[:args.texts]
+
+  analyzer = load_pipeline(args.engine)
+  started = time.perf_counter()
+  single = predict_sentiment(analyzer, texts, args.batch_size)
+  single_seconds = time.perf_counter() - started
+
+  pool = SentimentPool(args.workers, args.threads_per_worker, args.engine)
+  pool.wait_ready() # Keep model load time out of the measurement
+  started = time.perf_counter()
+  pooled = pool.predict(texts, args.batch_size)
+  pooled_seconds = time.perf_counter() - started
+  pool.close()
+
+  matching = sum(1 for a, b in zip(single, pooled) if a and b and a['label'] == b['label'])
+  print(f"Engine: {args.engine}, cores: {os.cpu_count()}, texts: {len(texts)}, batch size: {args.batch_size}")
+  print(f"Single process: {single_seconds:.2f}s ({len(texts) / single_seconds:.0f} texts/s)")
+  print(f"Pool ({pool.workers} workers x {pool.threads_per_worker} threads): {pooled_seconds:.2f}s ({len(texts) / pooled_seconds:.0f} texts/s)")
+  print(f"Speedup: {single_seconds / pooled_seconds:.2f}x, matching labels: {matching}/{len(texts)}")
@@ -0,0 +1,56 @@
+"""
+Admission control for inference-heavy requests.
+
+Each server process runs at most `max_active` analyses at a time. Up to `max_queued` further
+requests wait their turn, each for at most `queue_timeout` seconds. Anything beyond that is
+turned away at once with Overloaded (HTTP 503 with Retry-After), instead of piling up threads
+that all compete for the same CPU cores and finish late together.
+"""
+import threading
+
+class Overloaded(Exception):
+  """Raised when an analysis can't be admitted; retry_after is a suggested wait in seconds."""
+  def __init__(self, message, retry_after):
+    super().__init__(message)
+    self.retry_after = retry_after
+
+class InferenceLimiter:
+  def __init__(self, max_active=1, max_queued=8, queue_timeout=60):
+    self.max_active = max_active
+    self.max_queued = max_queued
+    self.queue_timeout = queue_timeout
+    self.active = 0
+    self.queued = 0
+    self.rejected = 0
+    self._changed = threading.Condition()
+
+  def __enter__(self):
+    with self._changed:
+        if self.active >= self.max_active:
+            if self.queued >= self.max_queued:
+                self.rejected += 1
+                raise Overloaded(f"Too many analyses in progress ({self.active} running, {self.queued} queued)", retry_after=self.queue_timeout)
+            self.queued += 1
+            try:
+                admitted = self._changed.wait_for(lambda: self.active < self.max_active, timeout=self.queue_timeout)
+            finally:
+                self.queued -= 1
+            if not admitted:
+                self.rejected += 1
+                raise Overloaded(f"Timed out after {self.queue_timeout}s waiting for an analysis slot", retry_after=self.queue_timeout)
+        self.active += 1
+    return self
+
+  def __exit__(self, *exc_info):
+    with self._changed:
+        self.active -= 1
+        self._changed.notify()
+
+  def reset(self):
+    """Forgets requests counted by another process, e.g. the parent of a forked worker."""
+    self.active = self.queued = self.rejected = 0
+    self._changed = threading.Condition()
+
+  def stats(self):
+    with self._changed:
+        return {"active": self.active, "queued": self.queued, "rejected": self.rejected, "max_active": self.max_active, "max_queued": self.max_queued}
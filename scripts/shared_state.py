@@ -0,0 +1,31 @@
+"""
+SQLite state shared by the server's worker processes.
+
+An analysis job (jobs.py) or LLM recommendation (recommendations.py) is started by one gunicorn
+worker and then polled through whichever worker the load balancer picks, so their status and
+results live in a SQLite file on the machine rather than in the memory of the worker that
+started them. Rows record the process id of the worker doing the work, so a worker that dies
+leaves rows the others recognize as abandoned (see process_alive).
+"""
+import os
+import sqlite3
+
+def connect(path=None):
+  """Opens the SQLite file at path for use from several threads and processes; without a path, a private in-memory database."""
+  if path is None:
+      return sqlite3.connect(":memory:", check_same_thread=False)
+  os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+  conn = sqlite3.connect(path, check_same_thread=False)
+  conn.execute("PRAGMA journal_mode=WAL") # Readers in other workers don't block the writer
+  conn.execute("PRAGMA busy_timeout=5000")
+  return conn
+
+def process_alive(pid):
+  """True if a process with this id runs on this machine."""
+  try:
+      os.kill(pid, 0)
+  except ProcessLookupError:
+      return False
+  except PermissionError: # Exists, but belongs to another user
+      return True
+  return True
@@ -0,0 +1,234 @@
+"""
+Lightweight tracing and metrics.
+
+span(name, **counts) times a block of work: a pipeline stage, a model call or a dashboard
+section. Every span feeds the stage histograms below and, when the current thread is
+tracing (a request or a job, see trace()), is also recorded on that trace, so one slow
+upload shows which stage took the time. Spans cost a couple of clock reads and a histogram
+update, so they belong around stages and batches, never inside per-row loops.
+
+Metrics live in a process-wide registry and are rendered in the Prometheus text format
+(render()). Each server process keeps its own counts; scrape every worker, or aggregate
+them in Prometheus.
+"""
+import bisect
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+log = logging.getLogger("scrollmark")
+
+_current = threading.local() # The trace this thread records spans on, if any
+_registry = []
+_registry_lock = threading.Lock()
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+def _format_labels(names, values, extra=()):
+  pairs = [*zip(names, values), *extra]
+  if not pairs:
+      return ""
+  escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+  return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value):
+  if value == math.inf:
+      return "+Inf"
+  return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class _Metric:
+  kind = None
+
+  def __init__(self, name, documentation, labelnames=()):
+    self.name = name
+    self.documentation = documentation
+    self.labelnames = tuple(labelnames)
+    self._children = {} # {label values: child}
+    self._lock = threading.Lock()
+    with _registry_lock:
+        _registry.append(self)
+
+  def labels(self, *values):
+    """Returns the child metric for one combination of label values."""
+    child = self._children.get(values)
+    if child is None:
+        with self._lock:
+            child = self._children.setdefault(values, self._new_child())
+    return child
+
+  def render(self):
+    lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+    with self._lock:
+        children = list(self._children.items())
+    for values, child in sorted(children, key=lambda item: tuple(map(str, item[0]))):
+        lines.extend(child.render(self.name, self.labelnames, values))
+    return lines
+
+class _CounterChild:
+  def __init__(self):
+    self.value = 0
+    self._lock = threading.Lock()
+
+  def inc(self, amount=1):
+    with self._lock:
+        self.value += amount
+
+  def render(self, name, labelnames, values):
+    return [f"{name}{_format_labels(labelnames, values)} {_format_value(self.value)}"]
+
+class Counter(_Metric):
+  kind = "counter"
+  _new_child = _CounterChild
+
+  def inc(self, amount=1):
+    self.labels().inc(amount)
+
+class _HistogramChild:
+  def __init__(self, buckets):
+    self.buckets = buckets
+    self.counts = [0] * (len(buckets) + 1) # The last slot counts observations above every bucket
+    self.sum = 0.0
+    self._lock = threading.Lock()
+
+  def observe(self, value):
+    i = bisect.bisect_left(self.buckets, value)
+    with self._lock:
+        self.counts[i] += 1
+        self.sum += value
+
+  def render(self, name, labelnames, values):
+    with self._lock:
+        counts, total = list(self.counts), self.sum
+    lines = []
+    cumulative = 0
+    for bound, count in zip((*self.buckets, math.inf), counts):
+        cumulative += count
+        lines.append(f"{name}_bucket{_format_labels(labelnames, values, [('le', _format_value(bound))])} {cumulative}")
+    lines.append(f"{name}_sum{_format_labels(labelnames, values)} {_format_value(total)}")
+    lines.append(f"{name}_count{_format_labels(labelnames, values)} {cumulative}")
+    return lines
+
+class Histogram(_Metric):
+  kind = "histogram"
+
+  def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    self.buckets = tuple(sorted(buckets))
+    super().__init__(name, documentation, labelnames)
+
+  def _new_child(self):
+    return _HistogramChild(self.buckets)
+
+  def observe(self, value):
+    self.labels().observe(value)
+
+class Gauge(_Metric):
+  """A value read when metrics are rendered: collect() returns a number, or {label values: number}."""
+  kind = "gauge"
+
+  def __init__(self, name, documentation, collect, labelnames=()):
+    super().__init__(name, documentation, labelnames)
+    self.collect = collect
+
+  def render(self):
+    lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+    try:
+        values = self.collect()
+    except Exception as e:
+        log.warning(f"Could not collect {self.name}: {e}")
+        return lines
+    for labels, value in (values.items() if isinstance(values, dict) else [((), values)]):
+        lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+    return lines
+
+def render():
+  """Returns every registered metric in the Prometheus text exposition format."""
+  with _registry_lock:
+      metrics = list(_registry)
+  return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+STAGE_SECONDS = Histogram("scrollmark_stage_duration_seconds", "Wall time of pipeline stages, model calls and dashboard sections.", ["stage"])
+STAGE_ITEMS = Counter("scrollmark_stage_items_total", "Rows or texts processed by pipeline stages.", ["stage"])
+
+class Span:
+  def __init__(self, name, counts, parent):
+    self.name = name
+    self.counts = counts # e.g. {"rows": 18000}; the first count is the span's item count
+    self.parent = parent
+    self.start = time.perf_counter()
+    self.seconds = None
+
+  def set(self, **counts):
+    """Adds or updates counts, e.g. once the number of rows is known."""
+    self.counts.update(counts)
+
+  def to_dict(self, origin):
+    span = {"name": self.name, "start_ms": round((self.start - origin) * 1000, 2), "ms": round(self.seconds * 1000, 2), **self.counts}
+    if self.parent is not None:
+        span["parent"] = self.parent
+    items = next(iter(self.counts.values()), None)
+    if isinstance(items, (int, float)) and self.seconds > 0:
+        span["items_per_second"] = round(items / self.seconds)
+    return span
+
+class Trace:
+  def __init__(self):
+    self.started = time.perf_counter()
+    self.spans = [] # Finished spans, in finishing order
+    self._open = [] # Names of the spans in progress, innermost last
+
+  def to_list(self):
+    """Returns the finished spans as dicts, in start order."""
+    return [span.to_dict(self.started) for span in sorted(self.spans, key=lambda span: span.start)]
+
+  def server_timing(self, limit=20):
+    """Returns the outermost spans as a Server-Timing header value."""
+    top = [span for span in self.spans if span.parent is None][:limit]
+    return ", ".join(f"{span.name.replace(' ', '_')};dur={span.seconds * 1000:.1f}" for span in top)
+
+@contextmanager
+def trace():
+  """Records the spans finished on this thread in a new Trace until the block exits."""
+  previous = getattr(_current, 'trace', None)
+  _current.trace = recorded = Trace()
+  try:
+      yield recorded
+  finally:
+      _current.trace = previous
+
+def begin_trace():
+  """Starts recording spans on this thread without a block, e.g. in a request hook; see end_trace."""
+  _current.trace = Trace()
+  return _current.trace
+
+def end_trace():
+  """Stops recording spans on this thread and returns the trace, or None."""
+  recorded = getattr(_current, 'trace', None)
+  _current.trace = None
+  return recorded
+
+def current_trace():
+  return getattr(_current, 'trace', None)
+
+@contextmanager
+def span(name, **counts):
+  """Times the block as a span named `name` with counts such as rows=... or texts=...; see Span.set."""
+  recorded = getattr(_current, 'trace', None)
+  current = Span(name, counts, recorded._open[-1] if recorded is not None and recorded._open else None)
+  if recorded is not None:
+      recorded._open.append(name)
+  try:
+      yield current
+  finally:
+      current.seconds = time.perf_counter() - current.start
+      if recorded is not None:
+          recorded._open.pop()
+          recorded.spans.append(current)
+      STAGE_SECONDS.labels(name).observe(current.seconds)
+      items = next(iter(current.counts.values()), None)
+      if isinstance(items, (int, float)):
+          STAGE_ITEMS.labels(name).inc(items)
+      if log.isEnabledFor(logging.DEBUG):
+          log.debug(f"{name}: {current.seconds * 1000:.1f} ms {current.counts}")
@@ -0,0 +1,52 @@
+"""
+Shared fixtures. The backend reads its settings from the environment at import, so they are
+set here, before any test imports it: mocked models with the benchmark's deterministic stub
+sentiment pipeline, no sentiment or response cache, chunks prepared in-process, and datasets
+and the shared job state stored in a temporary directory.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import pandas as pd
+import pytest
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+
+DATASET_DIR = tempfile.mkdtemp(prefix="scrollmark-test-datasets-")
+os.environ.update({
+    "SCROLLMARK_MODELS": "mock",
+    "SCROLLMARK_DATASET_DIR": DATASET_DIR,
+    "SCROLLMARK_STATE_PATH": os.path.join(DATASET_DIR, "state.sqlite3"),
+    "SCROLLMARK_SENTIMENT_CACHE_SIZE": "0",
+    "SCROLLMARK_RESPONSE_CACHE_BYTES": "0",
+    "SCROLLMARK_CHUNK_WORKERS": "0",
+    "SCROLLMARK_WARMUP": "0",
+    "SCROLLMARK_LOG_LEVEL": "WARNING",
+})
+
+EXPORT_ROWS = 6000
+
+def pytest_unconfigure(config):
+  shutil.rmtree(DATASET_DIR, ignore_errors=True)
+
+@pytest.fixture(scope="session")
+def backend():
+  import backend
+  from benchmark import StubSentimentPipeline
+  backend.sentiment_model.override(StubSentimentPipeline()) # Mixed labels, the same for the same text
+  return backend
+
+@pytest.fixture(scope="session")
+def export_rows(tmp_path_factory):
+  """A seeded synthetic export (see generate_mock_data.py) without repeated rows, as a DataFrame."""
+  from generate_mock_data import generate_csv
+  path = generate_csv(str(tmp_path_factory.mktemp("exports") / "export.csv"), EXPORT_ROWS, seed=7)
+  rows = pd.read_csv(path, dtype=str, keep_default_na=False)
+  # Appends skip rows already stored (same media_id, timestamp and text); keep one of each
+  return rows.drop_duplicates(["media_id", "timestamp", "comment_text"]).reset_index(drop=True)
+
+def to_csv(rows):
+  return rows.to_csv(index=False).encode("utf-8")
@@ -0,0 +1,52 @@
+"""Advocate ranking over the author rollup."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from advocates import TIERS, AdvocateIndex
+
+def author_rollup(n, seed=0):
+  rng = np.random.default_rng(seed)
+  comments = rng.integers(1, 4, n) # Few distinct values, so many authors tie
+  positive = rng.binomial(comments, 0.5)
+  authors = pd.DataFrame({
+      "author": [f"user_{i}" for i in range(n)],
+      "comments": comments,
+      "positive": positive,
+      "neutral": comments - positive,
+      "negative": 0,
+      "active_days": np.minimum(comments, rng.integers(1, 3, n)),
+      "intent_mask": 0,
+  })
+  author_days = pd.DataFrame({"author": ["user_1", "user_0", "user_1"], "day": [20150, 20150, 20148], "comments": [2, 1, 1]})
+  return AdvocateIndex(authors, author_days, lambda masks: np.zeros(len(masks)))
+
+def ranked(index):
+  """Every author by score, then comments, then first appearance (the documented order), with a full sort."""
+  comments = index.authors["comments"].to_numpy()
+  return np.lexsort((np.arange(len(index)), -comments, -index.scores))
+
+@pytest.mark.parametrize("k", [1, 5, 17, 500, 2000])
+def test_top_matches_a_full_sort(k):
+  index = author_rollup(1000)
+  assert index.top(k).tolist() == ranked(index)[:k].tolist()
+
+def test_ties_at_the_boundary_go_to_the_first_authors():
+  index = author_rollup(1000, seed=3)
+  boundary = ranked(index)[:10]
+  key = (index.scores[boundary[-1]], index.authors["comments"].iloc[boundary[-1]])
+  tied = [i for i in range(len(index)) if (index.scores[i], index.authors["comments"].iloc[i]) == key]
+  assert len(tied) > 1 # The 10th place is shared
+  assert index.top(10).tolist() == boundary.tolist()
+
+def test_tiers_count_each_author_once():
+  index = author_rollup(1000)
+  counts = dict((tier, n) for tier, n, _ in index.tiers())
+  assert list(counts) == [tier for tier, _, _ in TIERS]
+  assert sum(counts.values()) == int(np.count_nonzero(index.scores >= TIERS[-1][1]))
+
+def test_history_in_day_order():
+  index = author_rollup(3)
+  assert index.history("user_1") == [(20148, 1), (20150, 2)]
+  assert index.history("nobody") == []
+  assert len(index.top(0)) == 0
@@ -0,0 +1,69 @@
+"""Merged aggregates must not depend on how the rows arrived: in one chunk, in many, or appended later."""
+import functools
+import io
+
+import pandas as pd
+import pytest
+
+from conftest import to_csv
+
+CHUNK_ROWS = 1000
+TOPIC_TABLES = ("topic_terms", "topics") # Online fits depend on the batches; see topics.py
+
+def canonical(table):
+  """A DataFrame in a row order independent of merge order, index included."""
+  table = table.reset_index(drop=isinstance(table.index, pd.RangeIndex))
+  return table.sort_values(list(table.columns), kind="stable").reset_index(drop=True)
+
+def assert_same_aggregates(expected, actual):
+  expected, actual = expected.to_tables(), actual.to_tables()
+  assert set(expected) == set(actual)
+  for name, table in expected.items():
+      if name in TOPIC_TABLES:
+          continue
+      if isinstance(table, pd.DataFrame):
+          pd.testing.assert_frame_equal(canonical(table), canonical(actual[name]), obj=name)
+      else:
+          assert {**table, "topics": None} == {**actual[name], "topics": None}, name
+
+def analyze(backend, rows, chunk_rows=None):
+  """Analyzes and stores rows the way /analyze/upload does; returns the stored aggregates and dataset id."""
+  read_csv_chunks = backend.read_csv_chunks
+  if chunk_rows is not None:
+      backend.read_csv_chunks = functools.partial(read_csv_chunks, chunk_rows=chunk_rows)
+  try:
+      dataset_id = backend.analyze_csv(io.BytesIO(to_csv(rows)))["dataset_id"]
+  finally:
+      backend.read_csv_chunks = read_csv_chunks
+  return backend.load_aggregates(dataset_id)[0], dataset_id
+
+@pytest.fixture(scope="module")
+def whole(backend, export_rows):
+  aggregates, _ = analyze(backend, export_rows)
+  assert aggregates.rows == len(export_rows)
+  return aggregates
+
+def test_chunked_matches_whole(backend, export_rows, whole):
+  chunked, _ = analyze(backend, export_rows, chunk_rows=CHUNK_ROWS)
+  assert_same_aggregates(whole, chunked)
+
+def test_appended_matches_whole(backend, export_rows, whole):
+  _, dataset_id = analyze(backend, export_rows.iloc[:2500])
+  for start, end in ((2500, 4000), (4000, len(export_rows))):
+      response = backend.append_to_dataset(dataset_id, io.BytesIO(to_csv(export_rows.iloc[start:end])))
+      assert response["appended_rows"] == end - start
+  appended, _ = backend.load_aggregates(dataset_id)
+  assert_same_aggregates(whole, appended)
+  assert appended.topics.batches > whole.topics.batches # The stored topic model was continued, not refitted
+
+def test_append_skips_stored_rows(backend, export_rows):
+  _, dataset_id = analyze(backend, export_rows.iloc[:3000])
+  response = backend.append_to_dataset(dataset_id, io.BytesIO(to_csv(export_rows.iloc[2000:4000])))
+  assert (response["appended_rows"], response["duplicate_rows"]) == (1000, 1000)
+  assert backend.dataset_store.meta(dataset_id)["rows"] == 4000
+
+def test_tables_roundtrip(whole):
+  from aggregates import AnalysisAggregates
+  restored = AnalysisAggregates.from_tables(whole.to_tables())
+  assert_same_aggregates(whole, restored)
+  assert restored.topics.summary() == whole.topics.summary()
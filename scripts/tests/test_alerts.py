@@ -0,0 +1,80 @@
+"""Spike alerts: opening and closing on synthetic spikes, and replaying the same alerts from aggregates."""
+import io
+
+import numpy as np
+import pandas as pd
+
+from alerts import AlertEngine
+from conftest import to_csv
+
+HOUR = pd.Timedelta(hours=1)
+START = pd.Timestamp("2025-03-01")
+
+def steady_hours(hours, rng, volume=20, negative_share=0.1):
+  """Per-hour counts (volume, positive, neutral, negative, keyword) of a quiet comment stream."""
+  counts = np.zeros((hours, 5), dtype=np.int64)
+  counts[:, 0] = rng.poisson(volume, hours)
+  counts[:, 3] = rng.binomial(counts[:, 0], negative_share)
+  counts[:, 1] = counts[:, 0] - counts[:, 3]
+  return counts
+
+def replay(counts, **settings):
+  engine = AlertEngine(keywords=["damaged"], **settings)
+  return engine.replay(np.arange(len(counts)) + START.value // HOUR.value, counts)
+
+def test_negative_spike_opens_and_closes_one_alert():
+  counts = steady_hours(240, np.random.default_rng(1))
+  counts[150:154, 3] = counts[150:154, 0] * 3 // 4 # Four hours where most comments turn negative
+  counts[150:154, 1] = counts[150:154, 0] - counts[150:154, 3]
+  engine = replay(counts)
+
+  assert [alert.series for alert in engine.alerts] == ["sentiment:negative"]
+  alert = engine.alerts[0]
+  spike_start, spike_end = START + 150 * HOUR, START + 154 * HOUR
+  assert spike_start - 6 * HOUR < alert.start < spike_end # The first window that reached the threshold overlaps the spike
+  assert alert.end is not None and spike_end <= alert.end <= spike_end + 6 * HOUR # Closed once the spike left the window
+  assert alert.peak_z >= 3 and alert.peak_count > alert.expected
+  assert engine.active() == []
+
+def test_quiet_stream_raises_no_alerts():
+  assert replay(steady_hours(240, np.random.default_rng(0))).alerts == []
+
+def keyword_alerts(engine):
+  return [alert for alert in engine.alerts if alert.series == "keyword:damaged"]
+
+def test_min_count_and_warmup_hold_back_alerts():
+  counts = steady_hours(240, np.random.default_rng(3))
+  counts[150, 4] = 8 # Eight 'damaged' comments in an hour that never had any
+  assert [alert.start for alert in keyword_alerts(replay(counts))] == [START + 145 * HOUR]
+  assert keyword_alerts(replay(counts, min_count=10)) == [] # Too few comments to alert on
+  counts[150, 4] = 0
+  counts[3, 4] = 30 # Before a full window has entered the baseline
+  assert keyword_alerts(replay(counts)) == []
+
+def test_events_and_bucket_counts_agree():
+  rng = np.random.default_rng(4)
+  counts = steady_hours(120, rng)
+  counts[80:83, 3] = counts[80:83, 0]
+  counts[80:83, 1] = 0
+  events = AlertEngine(keywords=["damaged"])
+  for hour, (volume, positive, _, negative, _) in enumerate(counts.tolist()):
+      labels = ["positive"] * positive + ["negative"] * negative + [None] * (volume - positive - negative)
+      for i, label in enumerate(labels):
+          events.add(START + hour * HOUR + pd.Timedelta(seconds=i), label)
+  events.flush()
+  buckets = replay(counts)
+  assert [alert.to_dict() for alert in events.alerts] == [alert.to_dict() for alert in buckets.alerts]
+  assert events.alerts
+
+def test_keyword_spike_in_an_export(backend, export_rows):
+  rows = export_rows.copy()
+  timestamps = pd.to_datetime(rows["timestamp"])
+  spike = timestamps.between(timestamps.min() + pd.Timedelta(days=20), timestamps.min() + pd.Timedelta(days=20, hours=3))
+  assert spike.sum() >= 10
+  rows.loc[spike, "comment_text"] = "my order arrived damaged"
+
+  dataset_id = backend.analyze_csv(io.BytesIO(to_csv(rows)))["dataset_id"]
+  aggregates, _ = backend.load_aggregates(dataset_id)
+  alerts = keyword_alerts(backend.replay_alerts(aggregates))
+  assert len(alerts) == 1
+  assert alerts[0].start <= timestamps[spike].max() and alerts[0].start + 6 * HOUR > timestamps[spike].min()
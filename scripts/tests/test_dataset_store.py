@@ -0,0 +1,113 @@
+"""DatasetStore commits: appends, replaced versions staying readable, locking, and the row key index."""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dataset_store
+from dataset_store import DatasetChanged, DatasetStore
+
+@pytest.fixture
+def store(tmp_path):
+  return DatasetStore(str(tmp_path / "datasets"))
+
+def comments(*values):
+  return pd.DataFrame({"value": list(values)})
+
+def test_append_adds_parts(store):
+  dataset_id = store.save({"summary": {"n": 1}}, comments(1, 2), {"source": "upload"})
+  store.save({"summary": {"n": 2}}, comments(3), {"source": "append"}, dataset_id=dataset_id, append=True)
+  meta = store.meta(dataset_id)
+  assert (len(meta["parts"]), meta["rows"], meta["source"]) == (2, 3, "append")
+  assert store.load_comments(dataset_id)["value"].tolist() == [1, 2, 3]
+  assert store.load_tables(dataset_id)["summary"] == {"n": 2}
+
+def test_replace_drops_parts(store):
+  dataset_id = store.save({"summary": {"n": 1}}, comments(1, 2), {})
+  store.save({"summary": {"n": 2}}, comments(3), {}, dataset_id=dataset_id)
+  assert store.load_comments(dataset_id)["value"].tolist() == [3]
+  assert store.meta(dataset_id)["rows"] == 1
+
+def test_readers_of_the_previous_version_survive_commits(store):
+  dataset_id = store.save({"posts": pd.DataFrame({"n": [0]})}, comments(0), {})
+  previous = store.meta(dataset_id)
+  errors = []
+  done = threading.Event()
+
+  def read():
+      while not done.is_set():
+          try:
+              assert store.load_tables(dataset_id, previous)["posts"]["n"].tolist() == [0]
+              assert store.load_comments(dataset_id, meta=previous)["value"].tolist() == [0]
+              store.load_comments(dataset_id) # Whatever version is current
+          except Exception as e: # Reported below; an assert here would only end this thread
+              errors.append(e)
+              return
+
+  readers = [threading.Thread(target=read) for _ in range(4)]
+  for reader in readers:
+      reader.start()
+  for i in range(1, 30):
+      store.save({"posts": pd.DataFrame({"n": [i]})}, comments(i), {}, dataset_id=dataset_id, append=i % 2 == 0)
+  done.set()
+  for reader in readers:
+      reader.join()
+  assert errors == []
+  assert store.load_tables(dataset_id)["posts"]["n"].tolist() == [29]
+
+def test_retired_versions_are_deleted_after_the_grace_period(store, monkeypatch):
+  dataset_id = store.save({"summary": {"n": 1}}, comments(1), {})
+  previous = store.meta(dataset_id)
+  store.save({"summary": {"n": 2}}, comments(2), {}, dataset_id=dataset_id)
+  assert store.load_tables(dataset_id, previous) == {"summary": {"n": 1}} # Within the grace period
+
+  monkeypatch.setattr(dataset_store, "RETIRED_SECONDS", 0)
+  store.save({"summary": {"n": 3}}, comments(3), {}, dataset_id=dataset_id)
+  with pytest.raises(DatasetChanged):
+      store.load_tables(dataset_id, previous)
+  with pytest.raises(DatasetChanged):
+      store.load_comments(dataset_id, meta=previous)
+  assert store.meta(dataset_id)["retired"] == []
+
+def test_lock_serializes_read_modify_write(store):
+  dataset_id = store.save({"counter": {"n": 0}}, comments(0), {})
+
+  def increment():
+      for _ in range(10):
+          with store.lock(dataset_id):
+              n = store.load_tables(dataset_id)["counter"]["n"]
+              store.commit(dataset_id, {"counter": {"n": n + 1}}, {}, [], 0, append=True)
+
+  threads = [threading.Thread(target=increment) for _ in range(4)]
+  for thread in threads:
+      thread.start()
+  for thread in threads:
+      thread.join()
+  assert store.load_tables(dataset_id)["counter"] == {"n": 40}
+
+def test_contains_searches_every_part(tmp_path):
+  store = DatasetStore(str(tmp_path / "datasets"), key_column="value")
+  dataset_id = store.save({}, comments(5, 1, 9), {})
+  store.save({}, comments(4, 4), {}, dataset_id=dataset_id, append=True)
+  legacy = DatasetStore(store.root).write_part(dataset_id, comments(7)) # Written without a key file
+  store.commit(dataset_id, {}, {}, [legacy], 1, append=True)
+  assert store.contains(dataset_id, np.array([1, 2, 4, 7, 9, 10])).tolist() == [True, False, True, True, True, False]
+  assert store.contains(dataset_id, np.array([], dtype=np.int64)).tolist() == []
+
+def test_key_files_are_retired_with_their_parts(tmp_path, monkeypatch):
+  store = DatasetStore(str(tmp_path / "datasets"), key_column="value")
+  dataset_id = store.save({}, comments(1), {})
+  monkeypatch.setattr(dataset_store, "RETIRED_SECONDS", 0)
+  store.save({}, comments(2), {}, dataset_id=dataset_id)
+  store.save({}, comments(3), {}, dataset_id=dataset_id)
+  part = store.meta(dataset_id)["parts"][0]
+  assert sorted(os.listdir(os.path.join(store.root, dataset_id, "comments"))) == [f"{part}.keys.npy", f"{part}.parquet"]
+  assert store.contains(dataset_id, np.array([1, 2, 3])).tolist() == [False, False, True]
+
+def test_unknown_datasets(store):
+  with pytest.raises(KeyError):
+      store.meta("0123abcd")
+  with pytest.raises(KeyError):
+      store.lock("../etc").__enter__()
@@ -0,0 +1,195 @@
+"""
+The vectorized buyer intent section must reproduce the original row-by-row analyze_buyer_intent.
+The reference below is that function as the baseline commit shipped it, minus its progress bar
+and prints. Its mock figures (revenue, conversion rate, values, trends) are random and not compared.
+"""
+import io
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+PARITY_ROWS = 4000
+
+def generate_mock_trends(start_date, num_days, base_value, fluctuation):
+  """Generates mock trend data for charts."""
+  trends = []
+  current_date = start_date
+  for _ in range(num_days):
+      value = base_value + random.uniform(-fluctuation, fluctuation)
+      trends.append({'date': current_date.strftime('%Y-%m-%d'), 'value': int(max(0, round(value)))}) # Ensure int
+      current_date += timedelta(days=1)
+  return trends
+
+def baseline_analyze_buyer_intent(df):
+  """
+  Analyzes buyer intent from comments and captions based on keywords.
+  Returns structured data for the buyer intent discovery section.
+  """
+  intent_keywords = {
+      "high": ["buy", "price", "cost", "demo", "trial", "subscribe", "plan", "quote", "integrate", "how to get", "purchase", "pricing"],
+      "medium": ["feature", "solution", "problem", "help", "support", "learn more", "interested", "compare"],
+      "low": ["question", "feedback", "review", "thoughts", "what is"]
+  }
+
+  all_texts = []
+  if 'comment_text' in df.columns:
+      all_texts.extend(df['comment_text'].dropna().tolist())
+  if 'media_caption' in df.columns:
+      all_texts.extend(df['media_caption'].dropna().tolist())
+
+  intent_signals_raw = []
+  intent_categories_counts = Counter()
+
+  # Use media_id as a proxy for user for high_intent_users_count
+  user_intent_scores = {} # {media_id: score}
+  user_last_activity = {} # {media_id: timestamp}
+
+  for index, row in df.iterrows():
+      media_id = row.get('media_id', f"post_{index}")
+      comment_text = str(row.get('comment_text', '')).lower()
+      media_caption = str(row.get('media_caption', '')).lower()
+      timestamp = row.get('timestamp')
+
+      current_score = 0
+      signals_found = []
+      categories_found = set()
+
+      # Check for high intent keywords
+      for keyword in intent_keywords["high"]:
+          if keyword in comment_text or keyword in media_caption:
+              current_score += 10
+              signals_found.append(f"Keyword: '{keyword}'")
+              if keyword in ["price", "pricing", "cost", "quote"]: categories_found.add("Pricing Questions")
+              elif keyword in ["demo", "trial", "subscribe", "buy", "purchase"]: categories_found.add("Demo/Purchase Intent")
+              elif keyword in ["integrate"]: categories_found.add("Integration Inquiry")
+
+      # Check for medium intent keywords
+      for keyword in intent_keywords["medium"]:
+          if keyword in comment_text or keyword in media_caption:
+              current_score += 5
+              signals_found.append(f"Keyword: '{keyword}'")
+              if keyword in ["feature", "solution"]: categories_found.add("Feature Requests")
+              elif keyword in ["help", "support"]: categories_found.add("Support Inquiry")
+
+      # Check for low intent keywords
+      for keyword in intent_keywords["low"]:
+          if keyword in comment_text or keyword in media_caption:
+              current_score += 1
+              signals_found.append(f"Keyword: '{keyword}'")
+              if keyword in ["question", "feedback", "review"]: categories_found.add("General Inquiry/Feedback")
+
+      if current_score > 0:
+          # Aggregate score per user (media_id)
+          user_intent_scores[media_id] = max(user_intent_scores.get(media_id, 0), current_score)
+          if pd.notna(timestamp):
+              user_last_activity[media_id] = max(user_last_activity.get(media_id, timestamp), timestamp)
+
+          # Add to raw signals for detailed list
+          if signals_found:
+              text_sample = comment_text if comment_text else media_caption
+              intent_signals_raw.append({
+                  "user": f"@{str(media_id)[:8]}...", # Use a truncated media_id as user handle
+                  "intent": "High" if current_score >= 10 else ("Medium" if current_score >= 5 else "Low"),
+                  "score": min(100, current_score * 5), # Scale score to 0-100
+                  "signals": list(set(signals_found)), # Unique signals
+                  "lastActivity": (datetime.now() - timestamp).days, # Days ago (both are now naive)
+                  "predictedValue": f"${int(min(100, current_score * 5) * 15 + random.uniform(-50, 50)):,}" # Scale score to 0-100 and then calculate value
+              })
+
+          for cat in categories_found:
+              intent_categories_counts[cat] += 1
+
+  # Sort intent signals by score
+  intent_signals_raw.sort(key=lambda x: x['score'], reverse=True)
+
+  high_intent_users_count = sum(1 for score in user_intent_scores.values() if score >= 10) # Users with score >= 10
+  active_prospects = len(user_intent_scores) # All users with any intent signal
+
+  # Dynamic predicted revenue and conversion rate based on high intent users
+  predicted_revenue = f"${int(high_intent_users_count * 250 + random.uniform(0, 5000)):,}" if high_intent_users_count > 0 else "$0"
+  conversion_rate = f"{int(min(100, 25 + (high_intent_users_count / max(1, active_prospects)) * 15 + random.uniform(-2, 2)))}%" if high_intent_users_count > 0 else "0%"
+
+  # Dynamic conversion predictions
+  base_probability = 70 if high_intent_users_count > 0 else 10
+  conversion_predictions = [
+      {"timeframe": "Next 7 days", "probability": min(95, base_probability + random.randint(0, 5)), "users": int(high_intent_users_count * random.uniform(0.1, 0.3))},
+      {"timeframe": "Next 14 days", "probability": min(90, base_probability - random.randint(0, 5)), "users": int(high_intent_users_count * random.uniform(0.3, 0.5))},
+      {"timeframe": "Next 30 days", "probability": min(80, base_probability - random.randint(5, 10)), "users": int(high_intent_users_count * random.uniform(0.5, 0.7))},
+      {"timeframe": "Next 60 days", "probability": min(70, base_probability - random.randint(10, 20)), "users": int(high_intent_users_count * random.uniform(0.7, 1.0))},
+  ]
+
+  # Dynamic intent categories
+  intent_categories_data = []
+  for category, count in intent_categories_counts.most_common():
+      # Assign a mock value for each category
+      value = f"${int(count * random.uniform(200, 600)):,}"
+      intent_categories_data.append({"category": category, "count": int(count), "value": value})
+
+  # Dynamic next best actions
+  next_best_actions = []
+  if "Demo/Purchase Intent" in intent_categories_counts:
+      next_best_actions.append({"action": "Send personalized product demo", "users": int(intent_categories_counts["Demo/Purchase Intent"]), "priority": "High", "expectedLift": "+25-35% conversion"})
+  if "Pricing Questions" in intent_categories_counts:
+      next_best_actions.append({"action": "Drop limited-time coupon", "users": int(intent_categories_counts["Pricing Questions"]), "priority": "Medium", "expectedLift": "+15-20% conversion"})
+  if "Feature Requests" in intent_categories_counts:
+      next_best_actions.append({"action": "Schedule feature discussion call", "users": int(intent_categories_counts["Feature Requests"]), "priority": "Medium", "expectedLift": "+10-15% engagement"})
+  if not next_best_actions and high_intent_users_count > 0: # Fallback if no specific categories
+      next_best_actions.append({"action": "Schedule general follow-up call", "users": high_intent_users_count, "priority": "High", "expectedLift": "+20-30% close rate"})
+  elif not next_best_actions: # Default if no intent detected
+      next_best_actions.append({"action": "Engage with top posts", "users": 0, "priority": "Low", "expectedLift": "+5-10% engagement"})
+
+  return {
+      "high_intent_users_count": int(high_intent_users_count),
+      "predicted_revenue": predicted_revenue,
+      "conversion_rate": conversion_rate,
+      "active_prospects": int(active_prospects),
+      "intent_signals": intent_signals_raw[:5], # Limit to top 5 for display
+      "conversion_predictions": conversion_predictions,
+      "intent_categories": intent_categories_data,
+      "intent_signal_trends": generate_mock_trends(datetime.now() - timedelta(days=30), 5, int(high_intent_users_count / 2), int(high_intent_users_count / 10)),
+      "next_best_actions": next_best_actions,
+  }
+
+def comparable(section):
+  """The deterministic parts of a buyer intent section. Signals are compared as sets (the baseline lists them from a set)."""
+  return {
+      "high_intent_users_count": section["high_intent_users_count"],
+      "active_prospects": section["active_prospects"],
+      "intent_signals": [
+          {**signal, "signals": sorted(signal["signals"]), "predictedValue": None}
+          for signal in section["intent_signals"]
+      ],
+      "conversion_timeframes": [prediction["timeframe"] for prediction in section["conversion_predictions"]],
+      "intent_categories": {category["category"]: category["count"] for category in section["intent_categories"]},
+      "category_counts": [category["count"] for category in section["intent_categories"]],
+      "next_best_actions": section["next_best_actions"],
+  }
+
+@pytest.fixture(scope="module")
+def export_csv(tmp_path_factory):
+  from generate_mock_data import generate_csv
+  with open(generate_csv(str(tmp_path_factory.mktemp("intent") / "export.csv"), PARITY_ROWS, seed=11), "rb") as f:
+      return f.read()
+
+def baseline_section(csv):
+  df = pd.read_csv(io.BytesIO(csv)) # As the baseline's parse_csv_data
+  df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce', utc=True).dt.tz_localize(None)
+  return baseline_analyze_buyer_intent(df)
+
+def test_matches_baseline(backend, export_csv):
+  expected = baseline_section(export_csv)
+  assert expected["active_prospects"] > 0 and len(expected["intent_categories"]) > 1 # The export exercises the matcher
+  actual = backend.analyze_csv(io.BytesIO(export_csv), sections=["buyer_intent_discovery"])["buyer_intent_discovery"]
+  assert comparable(actual) == comparable(expected)
+
+def test_matches_baseline_when_chunked_and_appended(backend, export_csv):
+  expected = baseline_section(export_csv)
+  lines = export_csv.splitlines(keepends=True)
+  head, tail = b"".join(lines[:1501]), lines[0] + b"".join(lines[1501:])
+  dataset_id = backend.analyze_csv(io.BytesIO(head))["dataset_id"]
+  backend.append_to_dataset(dataset_id, io.BytesIO(tail))
+  actual = backend.load_dataset_sections(dataset_id).section("buyer_intent_discovery")
+  assert comparable(actual) == comparable(expected)
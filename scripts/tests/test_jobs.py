@@ -0,0 +1,116 @@
+"""
+Job and recommendation state shared by server workers: a JobManager or RecommendationService
+opened on the same state file, as in another worker, sees the jobs and generations of the first.
+"""
+import json
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from conftest import SCRIPTS_DIR, to_csv
+from jobs import JobManager, JobStore, report_progress
+from recommendations import RecommendationService
+
+STAGES = [("parse", 0.5), ("score", 0.5)]
+
+@pytest.fixture
+def state_path(tmp_path):
+  return str(tmp_path / "state.sqlite3")
+
+def wait_until_finished(job, timeout=10):
+  deadline = time.time() + timeout
+  while job.snapshot()["status"] not in ("done", "failed") and time.time() < deadline:
+      job.wait_for_change(job.version, timeout=0.5)
+  return job.snapshot()
+
+def test_other_workers_follow_a_job(state_path):
+  runner, other = JobManager(STAGES, store=JobStore(state_path)), JobManager(STAGES, store=JobStore(state_path))
+  started, release = threading.Event(), threading.Event()
+
+  def work():
+      report_progress("score", 0.5)
+      started.set()
+      release.wait(10)
+      return {"rows": 42}
+
+  job = runner.submit(work)
+  assert started.wait(10)
+  seen = other.get(job.id)
+  assert (seen.snapshot()["status"], seen.snapshot()["stage"], seen.snapshot()["progress"]) == ("running", "score", 75.0)
+  release.set()
+  assert wait_until_finished(seen)["status"] == "done"
+  assert seen.snapshot() == job.snapshot()
+  assert seen.result == {"rows": 42}
+  assert other.get("0" * 32) is None
+
+def test_jobs_of_an_exited_worker_fail(state_path):
+  code = (f"import os, sys, time; sys.path.insert(0, {SCRIPTS_DIR!r}); from jobs import JobManager, JobStore; "
+          f"print(JobManager([('parse', 1.0)], store=JobStore({state_path!r})).submit(time.sleep, 60).id, flush=True); os._exit(0)")
+  job_id = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.strip()
+  job = JobManager(STAGES, store=JobStore(state_path)).get(job_id)
+  assert job.status == "failed" and "exited" in job.error
+
+def test_finished_jobs_are_evicted(state_path):
+  manager = JobManager(STAGES, max_jobs=2, store=JobStore(state_path))
+  first = manager.submit(lambda: 1)
+  wait_until_finished(first)
+  second = manager.submit(lambda: 2)
+  wait_until_finished(second)
+  third = manager.submit(lambda: 3)
+  wait_until_finished(third)
+  other = JobManager(STAGES, store=JobStore(state_path))
+  assert other.get(first.id) is None
+  assert other.get(second.id).result == 2 and other.get(third.id).result == 3
+
+class GatedGenerator:
+  """Text generation model stand-in whose generations wait for `release`."""
+  name = "gated-generator"
+
+  def __init__(self):
+    self.prompts = []
+    self.started, self.release = threading.Event(), threading.Event()
+
+  def is_mocked(self):
+    return False
+
+  def get(self):
+    def generate(prompt, **kwargs):
+        self.prompts.append(prompt)
+        self.started.set()
+        self.release.wait(10)
+        return [{"generated_text": prompt + "Post at noon: the lunch crowd scrolls"}]
+    return generate
+
+def test_recommendations_are_generated_once_for_all_workers(state_path):
+  model = GatedGenerator()
+  first, second = RecommendationService(model, path=state_path), RecommendationService(model, path=state_path)
+  pending = first.request({"total_posts": 3})
+  assert pending["status"] == "pending"
+  assert second.request({"total_posts": 3}) == pending # Not queued again by the other worker
+  assert second.get(pending["id"]) == pending
+  assert model.started.wait(10)
+  model.release.set()
+  first.shutdown() # Waits for the running generation
+  ready = second.get(pending["id"])
+  assert ready["status"] == "ready" and ready["recommendations"][0]["title"] == "Post at noon"
+  assert second.request({"total_posts": 3}) == ready
+  assert len(model.prompts) == 1
+  assert {key: second.stats()[key] for key in ("entries", "pending")} == {"entries": 1, "pending": 0}
+
+def test_job_routes_answer_from_any_worker(backend, export_rows, monkeypatch):
+  client = backend.app.test_client()
+  response = client.post("/jobs", data=to_csv(export_rows.iloc[:1500]), content_type="text/csv")
+  assert response.status_code == 202
+  job_id = response.get_json()["job_id"]
+  local = backend.analysis_jobs.get(job_id)
+  monkeypatch.setattr(backend, "analysis_jobs", JobManager(backend.ANALYSIS_STAGES, store=JobStore(backend.STATE_PATH))) # Another worker
+  events = [json.loads(line[len("data: "):]) for line in client.get(f"/jobs/{job_id}/events").get_data(as_text=True).splitlines() if line.startswith("data: ")]
+  assert events[-1]["status"] == "done" and events[-1]["progress"] == 100.0
+  assert client.get(f"/jobs/{job_id}").get_json() == local.snapshot()
+  result = client.get(f"/jobs/{job_id}/result")
+  assert result.status_code == 200 and result.get_json()["dataset_id"]
+  assert client.get(f"/jobs/{job_id}/result", headers={"If-None-Match": result.headers["ETag"]}).status_code == 304
+  assert client.get("/jobs/" + "0" * 32).status_code == 404
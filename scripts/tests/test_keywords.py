@@ -0,0 +1,77 @@
+"""Keyword counting: tokenization, bigrams, phrase absorption, and the single pass matching a plain count."""
+import re
+from collections import Counter
+
+import pytest
+
+from keywords import PHRASE_SHARE, STOPWORDS, KeywordCounter, keyword_grams, top_keywords
+from topics import DocumentTerms
+
+def test_grams_skip_stopwords_and_short_words():
+  assert keyword_grams("I love the Tree Hut scrub, it's so good!!") == ["love", "tree", "hut", "tree hut", "scrub", "hut scrub"]
+
+def test_bigrams_need_adjacent_words():
+  assert keyword_grams("body-butter smells") == ["body", "butter", "body butter", "smells", "butter smells"]
+  assert "love scrub" not in keyword_grams("love the scrub") # Not across a stopword
+  assert "shipping damaged" not in keyword_grams("shipping, damaged") # Not across punctuation
+  assert keyword_grams("love scrub", bigrams=False) == ["love", "scrub"]
+
+def test_phrases_absorb_their_words():
+  counts = Counter({"tree": 10, "hut": 9, "tree hut": 9, "scrub": 12, "love": 5})
+  assert 9 >= PHRASE_SHARE * 10
+  assert top_keywords(counts, 3) == [("scrub", 12), ("tree hut", 9), ("love", 5)]
+  counts["tree"] = 20 # "tree" now mostly appears on its own
+  assert top_keywords(counts, 2) == [("tree", 20), ("scrub", 12)]
+
+def test_ties_keep_first_counted():
+  counts = Counter({"scrub": 3, "butter": 5, "lotion": 3, "oil": 3})
+  assert top_keywords(counts, 3) == [("butter", 5), ("scrub", 3), ("lotion", 3)]
+
+def plain_unigrams(texts):
+  """Unigram counts from a straightforward regex scan, the way keywords were counted before bigrams."""
+  counts = Counter()
+  for text in texts:
+      counts.update(word for word in re.findall(r'\b[a-z]{3,}\b', text.lower()) if word not in STOPWORDS)
+  return counts
+
+@pytest.fixture(scope="module")
+def comments(export_rows):
+  return export_rows[["comment_text", "timestamp"]].replace("", None)
+
+def test_unigrams_match_a_plain_count(comments):
+  counter = KeywordCounter()
+  for text in comments["comment_text"]:
+      counter.add(text)
+  texts = comments["comment_text"].dropna()
+  assert counter.texts == len(texts)
+  assert Counter({gram: count for gram, count in counter.counts.items() if " " not in gram}) == plain_unigrams(texts)
+
+def test_buckets_and_merge_match_one_pass(backend, comments):
+  buckets = backend.week_buckets(comments["timestamp"])
+  whole = KeywordCounter()
+  for text, bucket in zip(comments["comment_text"], buckets):
+      whole.add(text, bucket)
+  assert len(whole.bucket_counts) > 1
+  assert sum(whole.bucket_counts.values(), Counter()) == whole.counts
+
+  half = len(comments) // 2
+  first, second = KeywordCounter(), KeywordCounter()
+  for text, bucket in zip(comments["comment_text"][:half], buckets[:half]):
+      first.add(text, bucket)
+  for text, bucket in zip(comments["comment_text"][half:], buckets[half:]):
+      second.add(text, bucket)
+  merged = first.copy().merge(second)
+  assert (merged.counts, merged.bucket_counts, merged.texts) == (whole.counts, whole.bucket_counts, whole.texts)
+  assert merged.top(5) == whole.top(5) and merged.top_by_bucket(5) == whole.top_by_bucket(5)
+  assert list(whole.top_by_bucket(5)) == sorted(whole.bucket_counts)
+  assert first.texts == half - comments["comment_text"][:half].isna().sum() # copy() left first untouched
+
+def test_document_terms_count_like_the_counter(backend, comments):
+  buckets = backend.week_buckets(comments["timestamp"])
+  counter = KeywordCounter()
+  for text, bucket in zip(comments["comment_text"], buckets):
+      counter.add(text, bucket)
+  from_terms = DocumentTerms.from_texts(comments["comment_text"]).keyword_counter(buckets)
+  assert from_terms.counts == counter.counts
+  assert dict(from_terms.bucket_counts) == dict(counter.bucket_counts)
+  assert from_terms.texts == counter.texts
@@ -0,0 +1,89 @@
+"""Cached responses: the dashboard view's fields, ETag revalidation and compressed encodings."""
+import gzip
+import json
+import os
+
+import pytest
+
+from conftest import SCRIPTS_DIR, to_csv
+
+FRONTEND_DIR = os.path.dirname(SCRIPTS_DIR)
+
+@pytest.fixture(scope="module")
+def client(backend):
+  return backend.app.test_client()
+
+@pytest.fixture(scope="module")
+def analysis_url(client, export_rows):
+  response = client.post("/analyze/upload", data=to_csv(export_rows.iloc[:3000]), content_type="text/csv")
+  assert response.status_code == 200
+  return f"/datasets/{response.get_json()['dataset_id']}/analysis"
+
+def field_names(fields):
+  """Every key named in a DASHBOARD_FIELDS entry, nested ones included."""
+  if fields is None:
+      return []
+  if isinstance(fields, tuple):
+      return list(fields)
+  return [name for key, subfields in fields.items() for name in [key, *field_names(subfields)]]
+
+def test_dashboard_fields_are_read_by_the_frontend(backend):
+  with open(os.path.join(FRONTEND_DIR, "app", "page.tsx")) as f:
+      page = f.read()
+  for section, fields in backend.DASHBOARD_FIELDS.items():
+      with open(os.path.join(FRONTEND_DIR, "components", section.replace("_", "-") + ".tsx")) as f:
+          component = f.read()
+      for name in field_names(fields):
+          assert name in component or name in page, f"{section}.{name}"
+
+def test_dashboard_view_keeps_only_dashboard_fields(backend, client, analysis_url):
+  full = client.get(analysis_url, query_string={"view": "full"}).get_json()
+  dashboard = client.get(analysis_url).get_json()
+  assert dashboard == backend.dashboard_view(full)
+  assert dashboard["dataset_id"] == full["dataset_id"]
+  assert "cache_stats" in full["sentiment_analysis"] and "cache_stats" not in dashboard["sentiment_analysis"]
+  advocate = full["advocate_identification"]["top_advocates"][0]
+  assert {"first_activity", "last_activity", "sentiment"} <= set(advocate)
+  assert set(dashboard["advocate_identification"]["top_advocates"][0]) == set(backend.DASHBOARD_FIELDS["advocate_identification"]["top_advocates"])
+  assert "ai_recommendations_status" in dashboard["publishing_recommendations"] # Polled by app/page.tsx
+  assert len(json.dumps(dashboard)) < len(json.dumps(full))
+
+@pytest.mark.parametrize("view", ["dashboard", "full"])
+def test_etag_revalidation(client, analysis_url, view):
+  first = client.get(analysis_url, query_string={"view": view})
+  etag = first.headers["ETag"]
+  assert first.status_code == 200 and etag.startswith('W/"')
+  assert first.headers["Cache-Control"] == "no-cache" and first.headers["Vary"] == "Accept-Encoding"
+
+  revalidated = client.get(analysis_url, query_string={"view": view}, headers={"If-None-Match": etag})
+  assert revalidated.status_code == 304 and revalidated.data == b""
+  assert revalidated.headers["ETag"] == etag
+
+  changed = client.get(analysis_url, query_string={"view": view}, headers={"If-None-Match": 'W/"stale"'})
+  assert changed.status_code == 200 and changed.data == first.data
+
+def test_views_have_their_own_etags(client, analysis_url):
+  dashboard_etag = client.get(analysis_url).headers["ETag"]
+  full = client.get(analysis_url, query_string={"view": "full"}, headers={"If-None-Match": dashboard_etag})
+  assert full.status_code == 200 and full.headers["ETag"] != dashboard_etag
+
+def decompress(encoding, body):
+  if encoding == "br":
+      import brotli
+      return brotli.decompress(body)
+  return gzip.decompress(body)
+
+@pytest.mark.parametrize("encoding", ["gzip", "br"])
+def test_compressed_encodings(client, analysis_url, encoding):
+  if encoding == "br":
+      pytest.importorskip("brotli")
+  identity = client.get(analysis_url, headers={"Accept-Encoding": "identity"})
+  assert "Content-Encoding" not in identity.headers
+  compressed = client.get(analysis_url, headers={"Accept-Encoding": encoding})
+  assert compressed.headers["Content-Encoding"] == encoding
+  assert compressed.headers["ETag"] == identity.headers["ETag"] # Weak: shared by every encoding
+  assert len(compressed.data) < len(identity.data)
+  assert json.loads(decompress(encoding, compressed.data)) == json.loads(identity.data)
+
+  revalidated = client.get(analysis_url, headers={"Accept-Encoding": encoding, "If-None-Match": identity.headers["ETag"]})
+  assert revalidated.status_code == 304
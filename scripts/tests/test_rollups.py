@@ -0,0 +1,79 @@
+"""Rollup range queries must match a scan of the cube's rows in the range, and stay bounded by the data."""
+import io
+
+import numpy as np
+import pytest
+
+from conftest import to_csv
+from rollups import day_string, parse_day, period_start
+
+@pytest.fixture(scope="module")
+def stored(backend, export_rows):
+  dataset_id = backend.analyze_csv(io.BytesIO(to_csv(export_rows)))["dataset_id"]
+  return backend.load_aggregates(dataset_id)[0], backend.load_rollup_index(dataset_id)
+
+def scanned(backend, aggregates, start_day, end_day, granularity, top=5):
+  """Engagement, top posts and intent counts of [start_day, end_day] from the cube's rows, without prefix sums."""
+  cube = aggregates.rollup
+  days = cube['hour'].to_numpy(dtype=np.int64) // 24
+  cube = cube[(days >= start_day) & (days <= end_day)].assign(period=period_start(days[(days >= start_day) & (days <= end_day)], granularity))
+  engagement = cube.groupby('period').agg(comments=('comments', 'sum'), posts=('media_id', 'nunique'))
+  periods = np.arange(period_start(start_day, granularity), end_day + 1, 7 if granularity == 'week' else 1)
+  engagement = engagement.reindex(periods, fill_value=0)
+
+  with_post = cube[cube['media_id'].notna()]
+  post_comments = with_post.groupby('media_id')['comments'].sum()
+  post_comments = post_comments.iloc[np.argsort(-post_comments.to_numpy(), kind='stable')[:top]]
+
+  masks = cube['mask'].to_numpy(dtype=np.int64).copy()
+  has_post = cube['media_id'].notna().to_numpy()
+  masks[has_post] |= aggregates.posts['caption_mask'].reindex(cube['media_id'][has_post]).to_numpy(dtype=np.int64)
+  categories = {category: int(cube['rows'].to_numpy()[(masks & mask) != 0].sum()) for category, mask in backend.INTENT_CATEGORY_MASKS.items()}
+  return {
+      "engagement_over_time": [
+          {"date": day_string(period), "posts": int(row.posts), "comments": int(row.comments)}
+          for period, row in zip(periods, engagement.itertuples())
+      ],
+      "top_posts": [(media_id, int(count)) for media_id, count in post_comments.items()],
+      "intent_categories": {category: count for category, count in categories.items() if count > 0},
+  }
+
+@pytest.mark.parametrize("granularity", ["day", "week"])
+@pytest.mark.parametrize("offsets", [(0, 0), (3, -5), (10, -20), (1, -1), (12, -12)])
+def test_query_matches_scan(backend, stored, granularity, offsets):
+  aggregates, index = stored
+  first, last = index.extent()
+  start_day, end_day = first + offsets[0], last + offsets[1]
+  result = index.query(start_day, end_day, granularity)
+  expected = scanned(backend, aggregates, start_day, end_day, granularity)
+  assert result["engagement_over_time"] == expected["engagement_over_time"]
+  assert [(post["media_id"], post["comments"]) for post in result["top_performing_posts"]] == expected["top_posts"]
+  assert {entry["category"]: entry["count"] for entry in result["intent_categories"]} == expected["intent_categories"]
+  assert result["total_comments"] == sum(period["comments"] for period in expected["engagement_over_time"])
+
+def test_wide_range_is_clamped(stored):
+  _, index = stored
+  first, last = index.extent()
+  result = index.query(parse_day("0001-01-01"), parse_day("9999-12-31"), "day")
+  assert (result["start"], result["end"]) == (day_string(first), day_string(last))
+  assert len(result["engagement_over_time"]) == last - first + 1
+  assert result == index.query(granularity="day")
+
+def test_range_without_activity_is_empty(stored):
+  _, index = stored
+  first, _ = index.extent()
+  result = index.query(first - 30, first - 1, "week")
+  assert result["total_rows"] == 0 and result["engagement_over_time"] == [] and result["top_performing_posts"] == []
+  with pytest.raises(ValueError):
+      index.query(first + 1, first, "day")
+
+def test_dataset_without_timestamps_is_empty(backend, export_rows):
+  rows = export_rows.iloc[:500].assign(timestamp="")
+  dataset_id = backend.analyze_csv(io.BytesIO(to_csv(rows)))["dataset_id"]
+  index = backend.load_rollup_index(dataset_id)
+  assert index.extent() is None
+  for start_day, end_day in ((None, None), (parse_day("2024-01-01"), parse_day("2024-02-01"))):
+      result = index.query(start_day, end_day, "week")
+      assert result["total_rows"] == 0 and result["engagement_over_time"] == [] and result["sentiment_trends"] == []
+  response = backend.app.test_client().get(f"/datasets/{dataset_id}/rollup")
+  assert response.status_code == 200 and response.get_json()["total_comments"] == 0
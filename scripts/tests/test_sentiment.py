@@ -0,0 +1,82 @@
+"""Batched sentiment scoring must return each text's own label, in input order, whatever order it scores them in."""
+import random
+
+import pytest
+
+from benchmark import StubSentimentPipeline
+from models import map_sentiment_label, predict_sentiment
+
+class WordTokenizer:
+  """Tokenizer stand-in: one token per word."""
+  def __call__(self, texts, truncation=True):
+    return {"input_ids": [text.split() for text in texts]}
+
+class RecordingPipeline(StubSentimentPipeline):
+  """The stub pipeline with a tokenizer, recording the batches it is called with; batches holding `poison` fail."""
+  tokenizer = WordTokenizer()
+
+  def __init__(self, poison=None):
+    self.batches = []
+    self.poison = poison
+
+  def __call__(self, texts, **kwargs):
+    batch = [texts] if isinstance(texts, str) else list(texts)
+    self.batches.append(batch)
+    if self.poison in batch and len(batch) > 1:
+        raise RuntimeError("batch failed")
+    if batch == [self.poison]:
+        raise RuntimeError("text failed")
+    return super().__call__(batch)
+
+def random_texts(n, seed):
+  rng = random.Random(seed)
+  words = ["love", "this", "scrub", "smells", "amazing", "order", "arrived", "damaged", "restock", "price"]
+  return [" ".join(rng.choices(words, k=rng.randint(1, 30))) for _ in range(n)]
+
+@pytest.mark.parametrize("batch_size", [1, 7, 64, 1000])
+def test_predictions_follow_input_order(batch_size):
+  texts = random_texts(500, seed=batch_size)
+  analyzer = RecordingPipeline()
+  progress = []
+  predictions = predict_sentiment(analyzer, texts, batch_size, on_progress=progress.append)
+  assert predictions == [StubSentimentPipeline()(text)[0] for text in texts]
+  assert all(len(batch) <= batch_size for batch in analyzer.batches)
+  assert sorted(text for batch in analyzer.batches for text in batch) == sorted(texts)
+  assert progress == sorted(progress) and progress[0] == 0 and progress[-1] < 1
+
+def test_batches_are_bucketed_by_token_length():
+  texts = random_texts(300, seed=1)
+  analyzer = RecordingPipeline()
+  predict_sentiment(analyzer, texts, 32)
+  lengths = [[len(text.split()) for text in batch] for batch in analyzer.batches]
+  for batch, following in zip(lengths, lengths[1:]):
+      assert max(batch) <= min(following)
+
+def test_failed_batch_is_retried_one_by_one():
+  texts = random_texts(50, seed=2)
+  analyzer = RecordingPipeline(poison=texts[10])
+  predictions = predict_sentiment(analyzer, texts, 16)
+  expected = [StubSentimentPipeline()(text)[0] for text in texts]
+  expected[10] = None
+  assert predictions == expected
+
+def test_score_texts_labels_in_input_order(backend):
+  texts = random_texts(400, seed=3)
+  labels = backend._score_texts(texts, 16)
+  assert labels == [map_sentiment_label(p["label"], p["score"]) for p in StubSentimentPipeline()(texts)]
+
+def test_get_sentiments_scores_repeats_once(backend):
+  texts = random_texts(100, seed=4)
+  texts = texts + ["  " + text.replace(" ", "   ") + "\n" for text in texts[:20]] + ["", None, "   "]
+  expected = backend._score_texts(texts[:100], 8)
+  analyzer = RecordingPipeline()
+  backend.sentiment_model.override(analyzer)
+  try:
+      stats = {}
+      labels = backend.get_sentiments(texts, batch_size=8, stats=stats)
+  finally:
+      backend.sentiment_model.override(StubSentimentPipeline())
+  assert labels == expected + expected[:20] + ["neutral"] * 3
+  scored = [text for batch in analyzer.batches for text in batch]
+  assert len(scored) == len(set(texts[:100])) == stats["unique_texts"]
+  assert stats["texts"] == len(texts)
@@ -0,0 +1,83 @@
+"""The sentiment cache: one entry per normalized text and model, least recently used entries evicted first."""
+import itertools
+import sqlite3
+
+import pytest
+
+import sentiment_cache
+from benchmark import StubSentimentPipeline
+from sentiment_cache import EVICTION_SLACK, SentimentCache, cache_key, normalize_text
+
+@pytest.fixture
+def clock(monkeypatch):
+  """Makes the cache's time.time() return 1, 2, 3, ... so recency is unambiguous."""
+  ticks = itertools.count(1)
+  monkeypatch.setattr(sentiment_cache.time, "time", lambda: float(next(ticks)))
+
+def keys(n, start=0):
+  return [cache_key(f"comment {i}", "model") for i in range(start, start + n)]
+
+def stored_keys(cache):
+  return {key for (key,) in cache._conn.execute("SELECT key FROM sentiment")}
+
+def test_keys_dedup_whitespace_and_separate_models():
+  assert normalize_text("  love \t this\nscrub ") == "love this scrub"
+  assert cache_key(normalize_text("love  this"), "a") == cache_key(normalize_text(" love this "), "a")
+  assert cache_key("love this", "a") != cache_key("love this", "b")
+
+def test_round_trip_and_upsert(tmp_path):
+  cache = SentimentCache(str(tmp_path / "cache.db"), max_entries=100)
+  cache.put_many(dict.fromkeys(keys(10), "positive"))
+  cache.put_many(dict.fromkeys(keys(5), "negative")) # Overwrites, never duplicates
+  found = cache.get_many(keys(20))
+  assert found == {**dict.fromkeys(keys(5), "negative"), **dict.fromkeys(keys(5, 5), "positive")}
+  assert cache.stats() == {"hits": 10, "misses": 10, "entries": 10, "max_entries": 100}
+
+def test_evicts_least_recently_used(tmp_path, clock):
+  cache = SentimentCache(str(tmp_path / "cache.db"), max_entries=100)
+  for key in keys(100):
+      cache.put_many({key: "neutral"})
+  cache.get_many(keys(10)) # The oldest ten become the most recently used
+  cache.put_many(dict.fromkeys(keys(50, 100), "positive"))
+  assert cache.stats()["entries"] == 100
+  assert stored_keys(cache) == set(keys(10) + keys(40, 60) + keys(50, 100))
+
+def test_evicts_only_beyond_the_slack(tmp_path):
+  cache = SentimentCache(str(tmp_path / "cache.db"), max_entries=1000)
+  slack = int(1000 * EVICTION_SLACK)
+  cache.put_many(dict.fromkeys(keys(1000 + slack), "neutral"))
+  assert cache.stats()["entries"] == 1000 + slack
+  cache.put_many(dict.fromkeys(keys(1, 1000 + slack), "neutral"))
+  assert cache.stats()["entries"] == 1000
+
+def test_entry_count_is_shared_and_migrated(tmp_path):
+  path = str(tmp_path / "cache.db")
+  conn = sqlite3.connect(path) # A store written before the entry count table existed
+  conn.execute("CREATE TABLE sentiment (key TEXT PRIMARY KEY, label TEXT NOT NULL, last_used REAL NOT NULL)")
+  conn.executemany("INSERT INTO sentiment VALUES (?, 'positive', 0)", [(key,) for key in keys(30)])
+  conn.commit()
+  conn.close()
+  first, second = SentimentCache(path, max_entries=100), SentimentCache(path, max_entries=100)
+  assert first.stats()["entries"] == 30
+  second.put_many(dict.fromkeys(keys(20, 30), "negative"))
+  assert first.stats()["entries"] == second.stats()["entries"] == 50
+
+def test_get_sentiments_serves_repeats_from_the_cache(backend, tmp_path, monkeypatch):
+  monkeypatch.setattr(backend, "sentiment_cache", SentimentCache(str(tmp_path / "cache.db")))
+  texts = [f"order {i} arrived damaged" if i % 3 else f"love scrub {i}" for i in range(200)]
+  first_stats, second_stats = {}, {}
+  first = backend.get_sentiments(texts + texts[:50], stats=first_stats)
+  calls = []
+  class CountingPipeline(StubSentimentPipeline):
+    def __call__(self, batch, **kwargs):
+      calls.append(batch)
+      return super().__call__(batch, **kwargs)
+  backend.sentiment_model.override(CountingPipeline())
+  try:
+      second = backend.get_sentiments([" " + text for text in texts], stats=second_stats)
+  finally:
+      backend.sentiment_model.override(StubSentimentPipeline())
+  assert first[:200] == second and first[200:] == first[:50]
+  assert first_stats["unique_texts"] == first_stats["cache_misses"] == 200
+  assert second_stats["cache_hits"] == 200 and second_stats["cache_misses"] == 0
+  assert calls == [] # Fully cached texts never reach the model
@@ -0,0 +1,79 @@
+"""The sparse document-term matrix against tokenizing texts one by one, and the online topic model."""
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from keywords import KeywordCounter, keyword_grams
+from topics import DocumentTerms, TopicModel
+
+TEXTS = [
+    "Love the body butter!", None, "love the body butter!", "", "Shipping was slow, body butter leaked",
+    "Need this 😍", "body-butter and lip scrub", "Love the body butter!", float("nan"), "lip scrub lip scrub",
+]
+
+def dense_rows(terms):
+  """Each row of the matrix as a Counter of terms."""
+  rows = []
+  for i in range(len(terms)):
+      start, end = terms.indptr[i], terms.indptr[i + 1]
+      rows.append(Counter(dict(zip(terms.terms[terms.indices[start:end]].tolist(), terms.counts[start:end].tolist()))))
+  return rows
+
+def test_rows_hold_each_texts_grams():
+  terms = DocumentTerms.from_texts(TEXTS)
+  assert len(terms) == len(TEXTS)
+  expected = [Counter(keyword_grams(text)) if isinstance(text, str) else Counter() for text in TEXTS]
+  assert dense_rows(terms) == expected
+  assert terms.texts == sum(isinstance(text, str) for text in TEXTS)
+  assert np.all(np.diff(terms.indptr) >= 0) and terms.indices.dtype == np.int32
+
+def test_keyword_counter_matches_adding_texts():
+  buckets = ["2025-03-03", "2025-03-03", None, "2025-03-10", "2025-03-10", "2025-03-10", "2025-03-17", None, "2025-03-17", "2025-03-17"]
+  expected = KeywordCounter()
+  for text, bucket in zip(TEXTS, buckets):
+      if isinstance(text, str):
+          expected.add(text, bucket)
+  counted = DocumentTerms.from_texts(TEXTS).keyword_counter(buckets)
+  assert counted.texts == expected.texts
+  assert counted.counts == expected.counts
+  assert counted.bucket_counts == expected.bucket_counts
+
+def test_project_and_slice():
+  terms = DocumentTerms.from_texts(TEXTS)
+  vocabulary = {"body": 0, "butter": 1, "scrub": 2}
+  projected = terms.project(np.array([vocabulary.get(term, -1) for term in terms.terms.tolist()]))
+  projected.terms = np.array(list(vocabulary), dtype=object)
+  assert dense_rows(projected) == [Counter({term: n for term, n in row.items() if term in vocabulary}) for row in dense_rows(terms)]
+  assert dense_rows(terms.slice(4, 7)) == dense_rows(terms)[4:7]
+
+@pytest.fixture(scope="module")
+def comments(export_rows):
+  rows = export_rows[export_rows["comment_text"] != ""]
+  sentiments = np.array(["positive", "neutral", "negative"], dtype=object)[np.arange(len(rows)) % 3]
+  return DocumentTerms.from_texts(rows["comment_text"].tolist()), sentiments
+
+def test_topic_model_counts_every_comment(comments):
+  terms, sentiments = comments
+  model = TopicModel.from_terms(terms, topics=4, max_terms=500)
+  model.partial_fit(terms, sentiments, batch_size=1000)
+  assert model.documents == len(terms)
+  assert int(model.counts[:, 0].sum()) + model.unassigned == len(terms)
+  summary = model.summary()
+  assert sum(topic["comments"] for topic in summary) == int(model.counts[:, 0].sum())
+  assert all(len(topic["terms"]) > 0 and 0 <= topic["negative"] <= 100 for topic in summary)
+
+def test_topic_model_continues_and_roundtrips(comments):
+  terms, sentiments = comments
+  half = len(terms) // 2
+  model = TopicModel.from_terms(terms.slice(0, half), topics=4, max_terms=500)
+  model.partial_fit(terms.slice(0, half), sentiments[:half])
+  before = model.copy()
+  model.partial_fit(terms.slice(half, len(terms)), sentiments[half:])
+  assert model.documents == len(terms) and model.batches > before.batches
+  assert before.documents == half # copy() is independent of the continued model
+  assert list(model.vocabulary) == list(before.vocabulary) # The vocabulary is fixed by the first batch
+
+  restored = TopicModel.from_tables(*model.to_tables())
+  assert restored.summary() == model.summary()
+  np.testing.assert_allclose(restored.components, model.components)
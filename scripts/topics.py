@@ -0,0 +1,287 @@
+"""
+Topic modeling of comment texts with online NMF over sparse TF-IDF.
+
+Comments are tokenized like the keyword counts (non-stopword unigrams and adjacent bigrams,
+see keywords.py) into a sparse document-term matrix in CSR form: row pointers, term indices
+and counts, never a dense matrix. Each text is tokenized once per batch of rows however often
+it repeats. The vocabulary is capped by document frequency and fixed when a model starts,
+from its first batch of comments; later comments, chunks and appends are projected onto it.
+
+TopicModel fits non-negative matrix factorization online (mini-batch NMF, after Mairal et al.):
+each mini-batch of TF-IDF rows is explained as a mix of topics with the topics held fixed, the
+batch's sufficient statistics are added to the model's, and the topics are updated from the
+statistics alone. Updating a model with new comments therefore costs as much as those
+comments; nothing is refitted. The first mini-batch is fitted for a few rounds, so topics
+start from a fit instead of random noise. Memory is bounded by the vocabulary times the
+number of topics plus one mini-batch.
+
+Every comment is counted under its dominant topic with its sentiment label when its batch is
+fitted, so per-topic volume and sentiment accumulate with the model.
+"""
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from keywords import KeywordCounter, keyword_grams
+
+MIN_DOCUMENTS = 3 # Terms in fewer comments of the first batch stay out of the vocabulary
+MAX_DOCUMENT_SHARE = 0.5 # ... and so do terms in more than this share of them
+WARMUP_ROUNDS = 10 # Fit rounds over the first mini-batch
+SOLVE_ITERATIONS = 30 # Multiplicative updates of a batch's topic mix
+UPDATE_ITERATIONS = 5 # Multiplicative updates of the topics per batch
+TOPIC_LABELS = ('positive', 'neutral', 'negative')
+EPSILON = 1e-10
+
+class DocumentTerms:
+  """Term counts of a batch of texts as a CSR matrix over the batch's own terms."""
+  def __init__(self, terms, indptr, indices, counts, texts=None):
+    self.terms = terms # Object array of grams; column i is terms[i]
+    self.indptr = indptr # Row i's entries are indices/counts[indptr[i]:indptr[i + 1]]
+    self.indices = indices
+    self.counts = counts
+    self.texts = texts # Rows that had a text, tokenized or not
+
+  @classmethod
+  def from_texts(cls, texts, bigrams=True):
+    """Tokenizes texts (one row each; missing texts are empty rows), each distinct text once."""
+    codes, unique = pd.factorize(pd.Series(texts, dtype=object).reset_index(drop=True))
+    grams = []
+    gram_counts = np.zeros(len(unique), dtype=np.int64)
+    for u, text in enumerate(unique):
+        if isinstance(text, str):
+            text_grams = keyword_grams(text, bigrams)
+            grams.extend(text_grams)
+            gram_counts[u] = len(text_grams)
+    term_ids, terms = pd.factorize(pd.Series(grams, dtype=object))
+    # One entry per (distinct text, term) with its count, sorted by text
+    keys, counts = np.unique(np.repeat(np.arange(len(unique), dtype=np.int64), gram_counts) * max(1, len(terms)) + term_ids, return_counts=True)
+    unique_rows, unique_indices = np.divmod(keys, max(1, len(terms)))
+    lengths = np.bincount(unique_rows, minlength=len(unique))
+
+    # Expand the distinct texts' rows to one row per text
+    has_text = codes >= 0
+    text_codes = np.maximum(codes, 0)
+    row_lengths = np.where(has_text, lengths[text_codes], 0) if len(unique) else np.zeros(len(codes), dtype=np.int64)
+    indptr = np.concatenate([[0], np.cumsum(row_lengths)])
+    row_starts = np.where(has_text, (np.cumsum(lengths) - lengths)[text_codes], 0) if len(unique) else row_lengths
+    positions = np.arange(indptr[-1]) + np.repeat(row_starts - indptr[:-1], row_lengths)
+    return cls(np.asarray(terms, dtype=object), indptr, unique_indices[positions].astype(np.int32), counts[positions].astype(np.int32), int(has_text.sum()))
+
+  def keyword_counter(self, buckets=None, bigrams=True):
+    """
+    Returns the KeywordCounter of the rows (bucketed by buckets[i] if given), counted from the
+    matrix instead of tokenizing again; equal to adding each row's text to a KeywordCounter.
+    """
+    counter = KeywordCounter(bigrams)
+    counter.texts = int(self.texts)
+    counter.counts.update(dict(zip(self.terms.tolist(), np.bincount(self.indices, weights=self.counts, minlength=len(self.terms)).astype(np.int64).tolist())))
+    counter.counts = +counter.counts # Drop terms counted only in rows without a text
+    if buckets is not None:
+        bucket_codes, bucket_values = pd.factorize(pd.Series(buckets, dtype=object).reset_index(drop=True))
+        entry_buckets = bucket_codes[self.row_ids()]
+        with_bucket = entry_buckets >= 0
+        keys = entry_buckets[with_bucket].astype(np.int64) * max(1, len(self.terms)) + self.indices[with_bucket]
+        unique_keys, positions = np.unique(keys, return_inverse=True)
+        sums = np.bincount(positions, weights=self.counts[with_bucket], minlength=len(unique_keys)).astype(np.int64)
+        key_buckets, key_terms = np.divmod(unique_keys, max(1, len(self.terms)))
+        starts = np.flatnonzero(np.diff(key_buckets, prepend=-1))
+        for start, end in zip(starts.tolist(), [*starts[1:].tolist(), len(unique_keys)]):
+            counter.bucket_counts[bucket_values[key_buckets[start]]] = Counter(dict(zip(self.terms[key_terms[start:end]].tolist(), sums[start:end].tolist())))
+    return counter
+
+  def __len__(self):
+    return len(self.indptr) - 1
+
+  def row_ids(self):
+    """Returns the row of every stored entry."""
+    return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.indptr))
+
+  def document_frequencies(self):
+    """Returns the number of rows containing each term."""
+    return np.bincount(self.indices, minlength=len(self.terms))
+
+  def project(self, columns):
+    """Returns the rows over another vocabulary: columns[i] is term i's column there, or -1 to drop it."""
+    mapped = columns[self.indices] if len(self.indices) else np.empty(0, dtype=np.int64)
+    keep = mapped >= 0
+    kept_per_row = np.bincount(self.row_ids()[keep], minlength=len(self))
+    return DocumentTerms(None, np.concatenate([[0], np.cumsum(kept_per_row)]), mapped[keep].astype(np.int32), self.counts[keep])
+
+  def slice(self, start, stop):
+    """Returns rows start to stop (exclusive)."""
+    first, last = self.indptr[start], self.indptr[stop]
+    return DocumentTerms(self.terms, self.indptr[start:stop + 1] - first, self.indices[first:last], self.counts[first:last])
+
+  def nbytes(self):
+    return self.indptr.nbytes + self.indices.nbytes + self.counts.nbytes
+
+class TopicModel:
+  def __init__(self, vocabulary, topics=8, seed=0):
+    self.vocabulary = np.asarray(vocabulary, dtype=object)
+    self.topics = topics
+    self.seed = seed
+    self.components = None # topics x vocabulary term weights, set by the first batch
+    self.topic_statistics = np.zeros((topics, topics)) # Sum over batches of W^T W (W: the batches' topic mixes)
+    self.term_statistics = np.zeros((topics, len(self.vocabulary))) # Sum over batches of W^T X
+    self.document_frequency = np.zeros(len(self.vocabulary), dtype=np.int64)
+    self.documents = 0
+    self.batches = 0
+    self.counts = np.zeros((topics, 1 + len(TOPIC_LABELS)), dtype=np.int64) # Comments and labels per dominant topic
+    self.unassigned = 0 # Comments without a vocabulary term
+    self._columns = None # {term: column}, built on first use
+
+  @classmethod
+  def from_terms(cls, terms, topics=8, max_terms=5000, seed=0):
+    """Starts a model whose vocabulary is the max_terms most frequent terms (by document frequency) of `terms`."""
+    frequency = terms.document_frequencies()
+    eligible = np.flatnonzero((frequency >= MIN_DOCUMENTS) & (frequency <= MAX_DOCUMENT_SHARE * len(terms)))
+    ranked = sorted(zip((-frequency[eligible]).tolist(), terms.terms[eligible].tolist()))[:max_terms]
+    return cls([term for _, term in ranked], topics, seed)
+
+  def copy(self):
+    model = TopicModel(self.vocabulary, self.topics, self.seed)
+    model.components = None if self.components is None else self.components.copy()
+    model.topic_statistics = self.topic_statistics.copy()
+    model.term_statistics = self.term_statistics.copy()
+    model.document_frequency = self.document_frequency.copy()
+    model.documents, model.batches, model.unassigned = self.documents, self.batches, self.unassigned
+    model.counts = self.counts.copy()
+    model._columns = self._columns
+    return model
+
+  def columns(self, terms):
+    """Returns the vocabulary column of each term, -1 for terms outside the vocabulary."""
+    if self._columns is None:
+        self._columns = {term: i for i, term in enumerate(self.vocabulary.tolist())}
+    return np.fromiter((self._columns.get(term, -1) for term in terms.tolist()), dtype=np.int64, count=len(terms))
+
+  def partial_fit(self, terms, sentiments=None, batch_size=2048):
+    """
+    Updates the model with the rows of a DocumentTerms, batch_size rows at a time, and counts
+    each row under its dominant topic with its sentiment label (sentiments[i], or None).
+    """
+    rows = terms.project(self.columns(terms.terms))
+    sentiments = np.full(len(rows), None, dtype=object) if sentiments is None else np.asarray(sentiments, dtype=object)
+    for start in range(0, len(rows), batch_size):
+        stop = min(start + batch_size, len(rows))
+        self._fit_batch(rows.slice(start, stop), sentiments[start:stop])
+    return self
+
+  def _tfidf(self, batch):
+    """Returns the batch's entries as l2-normalized TF-IDF values, with the row of each entry."""
+    idf = np.log((1 + self.documents) / (1 + self.document_frequency)) + 1
+    values = batch.counts * idf[batch.indices]
+    row_ids = batch.row_ids()
+    norms = np.sqrt(np.bincount(row_ids, weights=values ** 2, minlength=len(batch)))
+    return values / norms[row_ids] if len(values) else values, row_ids
+
+  def _fit_batch(self, batch, sentiments):
+    self.document_frequency += np.bincount(batch.indices, minlength=len(self.vocabulary))
+    self.documents += len(batch)
+    values, row_ids = self._tfidf(batch)
+    if self.components is None:
+        self._initialize(batch, values, row_ids)
+    topic_statistics, term_statistics = self.topic_statistics, self.term_statistics
+    for _ in range(WARMUP_ROUNDS if self.batches == 0 else 1):
+        mix = self._solve(batch, values, row_ids)
+        # Every batch's statistics weigh the same; warm-up rounds replace their own batch's
+        self.topic_statistics = topic_statistics + mix.T @ mix
+        self.term_statistics = term_statistics + self._term_products(batch, values, row_ids, mix)
+        for _ in range(UPDATE_ITERATIONS):
+            self.components *= self.term_statistics / (self.topic_statistics @ self.components + EPSILON)
+    self.batches += 1
+    self._count(self._solve(batch, values, row_ids), sentiments)
+
+  def _initialize(self, batch, values, row_ids):
+    """Seeds each topic with one random comment of the first batch, plus a little noise."""
+    rng = np.random.default_rng(self.seed)
+    self.components = rng.random((self.topics, len(self.vocabulary))) * 1e-3
+    with_terms = np.flatnonzero(np.diff(batch.indptr) > 0)
+    for topic, row in enumerate(rng.choice(with_terms, size=min(self.topics, len(with_terms)), replace=False)):
+        entries = slice(batch.indptr[row], batch.indptr[row + 1])
+        self.components[topic, batch.indices[entries]] += values[entries]
+
+  def _solve(self, batch, values, row_ids):
+    """Returns the batch's topic mix W (rows x topics) minimizing |X - W H| with the topics H fixed."""
+    components = self.components
+    products = np.column_stack([np.bincount(row_ids, weights=values * components[topic, batch.indices], minlength=len(batch)) for topic in range(self.topics)]) # X H^T
+    gram = components @ components.T
+    mix = np.maximum(products, EPSILON)
+    for _ in range(SOLVE_ITERATIONS):
+        mix *= products / (mix @ gram + EPSILON)
+    return mix
+
+  def _term_products(self, batch, values, row_ids, mix):
+    """Returns W^T X (topics x vocabulary) for the batch's sparse X."""
+    return np.vstack([np.bincount(batch.indices, weights=values * mix[row_ids, topic], minlength=len(self.vocabulary)) for topic in range(self.topics)])
+
+  def _count(self, mix, sentiments):
+    weights = mix.sum(axis=1)
+    assigned = weights > EPSILON * self.topics * 10
+    dominant = mix.argmax(axis=1)[assigned]
+    self.counts[:, 0] += np.bincount(dominant, minlength=self.topics)
+    for i, label in enumerate(TOPIC_LABELS):
+        self.counts[:, 1 + i] += np.bincount(dominant[sentiments[assigned] == label], minlength=self.topics)
+    self.unassigned += int((~assigned).sum())
+
+  def top_terms(self, topic, n=5):
+    """Returns the n heaviest terms of a topic, letting a bigram stand in for its own words."""
+    weights = self.components[topic]
+    candidates = [self.vocabulary[i] for i in np.argsort(-weights, kind='stable')[:3 * n] if weights[i] > EPSILON]
+    in_phrases = {word for term in candidates if ' ' in term for word in term.split(' ')}
+    return [term for term in candidates if term not in in_phrases][:n]
+
+  def summary(self, n_terms=5):
+    """Returns each topic's top terms, comment volume and sentiment mix, largest topic first."""
+    if self.components is None:
+        return []
+    assigned = max(1, int(self.counts[:, 0].sum()))
+    topics = []
+    for topic in np.argsort(-self.counts[:, 0], kind='stable').tolist():
+        comments = int(self.counts[topic, 0])
+        if comments == 0:
+            continue
+        labeled = max(1, int(self.counts[topic, 1:].sum()))
+        terms = self.top_terms(topic, n_terms)
+        topics.append({
+            "topic": ", ".join(terms[:3]),
+            "terms": terms,
+            "comments": comments,
+            "share": round(comments / assigned * 100, 1),
+            **{label: round(int(self.counts[topic, 1 + i]) / labeled * 100) for i, label in enumerate(TOPIC_LABELS)},
+        })
+    return topics
+
+  def nbytes(self):
+    """Approximate memory of the model's arrays, vocabulary included."""
+    arrays = (self.topic_statistics, self.term_statistics, self.document_frequency, self.counts, self.vocabulary)
+    return sum(array.nbytes for array in arrays) + (self.components.nbytes if self.components is not None else 0) + sum(len(term) for term in self.vocabulary.tolist())
+
+  def to_tables(self):
+    """Returns the model as (terms DataFrame, topics DataFrame, scalars dict) for storage."""
+    components = self.components if self.components is not None else np.zeros((self.topics, len(self.vocabulary)))
+    terms = pd.DataFrame({
+        'term': self.vocabulary,
+        'document_frequency': self.document_frequency,
+        **{f'component_{topic}': components[topic] for topic in range(self.topics)},
+        **{f'statistic_{topic}': self.term_statistics[topic] for topic in range(self.topics)},
+    })
+    topics = pd.DataFrame({
+        **{column: self.counts[:, i] for i, column in enumerate(('comments', *TOPIC_LABELS))},
+        **{f'statistic_{topic}': self.topic_statistics[:, topic] for topic in range(self.topics)},
+    })
+    return terms, topics, {"topics": self.topics, "seed": self.seed, "documents": self.documents, "batches": self.batches, "unassigned": self.unassigned}
+
+  @classmethod
+  def from_tables(cls, terms, topics, scalars):
+    model = cls(terms['term'].astype(object).to_numpy(), scalars["topics"], scalars["seed"])
+    k = model.topics
+    model.document_frequency = terms['document_frequency'].to_numpy(dtype=np.int64)
+    if scalars["batches"]:
+        model.components = terms[[f'component_{topic}' for topic in range(k)]].to_numpy(dtype=float).T.copy()
+    model.term_statistics = terms[[f'statistic_{topic}' for topic in range(k)]].to_numpy(dtype=float).T.copy()
+    model.topic_statistics = topics[[f'statistic_{topic}' for topic in range(k)]].to_numpy(dtype=float)
+    model.counts = topics[['comments', *TOPIC_LABELS]].to_numpy(dtype=np.int64)
+    model.documents, model.batches, model.unassigned = scalars["documents"], scalars["batches"], scalars["unassigned"]
+    return model